@@ -0,0 +1,151 @@
+import time
+import asyncio
+import threading
+from collections import deque
+
+
+def parse_rate_limit_header(value):
+    """Parse a Riot rate limit header such as '20:1,100:120' into [(20, 1), (100, 120)]."""
+    limits = []
+    for part in value.split(","):
+        if ":" not in part:
+            continue
+        first, second = part.split(":", 1)
+        limits.append((int(first), int(second)))
+    return limits
+
+
+class RateLimitWindow:
+    """Sliding log of request times allowing `limit` requests every `seconds` seconds."""
+    def __init__(self, limit, seconds, timestamps=()):
+        self.limit = limit
+        self.seconds = seconds
+        self.timestamps = deque(timestamps)
+
+    def _prune(self, now):
+        while self.timestamps and now - self.timestamps[0] >= self.seconds:
+            self.timestamps.popleft()
+
+    def wait_time(self, now, safety_margin=0):
+        """Seconds until one more request fits in the window."""
+        self._prune(now)
+        allowed = max(self.limit - safety_margin, 1)
+        if len(self.timestamps) < allowed:
+            return 0
+        return self.seconds - (now - self.timestamps[-allowed])
+
+    def record(self, now):
+        self.timestamps.append(now)
+
+    def sync_count(self, count, now):
+        """Catch up with the server's count when other clients share the same API key."""
+        self._prune(now)
+        while len(self.timestamps) < count:
+            self.timestamps.append(now)
+
+
+class RateLimiter:
+    """Multi-window rate limiter for the Riot API.
+
+    Requests are checked against the application limits and, when a method key is given, that
+    method's limits. Limits are learned from the X-App-Rate-Limit / X-Method-Rate-Limit response
+    headers, and a 429 blocks the offending bucket until its Retry-After has elapsed. The clock and
+    sleep functions are injectable so the limiter can be driven by a fake clock.
+
+    One limiter is shared by every event loop in the process (the scheduler thread's and Flask's
+    per-request loops), so its state is guarded by a thread lock that is never held while sleeping.
+    """
+    default_app_limits = ((20, 1), (100, 120))  # 20 requests every 1 sec, 100 requests every 2 mins
+    default_retry_after = 1                     # Seconds to back off on a 429 without Retry-After
+
+    def __init__(self, app_limits=None, clock=time.monotonic, sleep=asyncio.sleep, safety_margin=1):
+        self.clock = clock
+        self.sleep = sleep
+        self.safety_margin = safety_margin
+        self.app_windows = [RateLimitWindow(limit, seconds) for limit, seconds in (app_limits or RateLimiter.default_app_limits)]
+        self.method_windows = {}   # method -> [RateLimitWindow]
+        self.blocked_until = {}    # method (None for the whole application) -> clock time
+        self.requests_issued = 0   # Total requests let through the limiter
+        self.wait_time = 0.0       # Total seconds spent sleeping in the limiter
+        self.lock = threading.Lock()
+
+    def _windows(self, method):
+        return self.app_windows + self.method_windows.get(method, [])
+
+    def _wait_time(self, method, now):
+        wait_time = max((window.wait_time(now, self.safety_margin) for window in self._windows(method)), default=0)
+        for key in (None, method):
+            if key in self.blocked_until:
+                wait_time = max(wait_time, self.blocked_until[key] - now)
+        return wait_time
+
+    async def acquire(self, method=None):
+        """Wait until a request for `method` fits every bucket, then record it.
+
+        The check and the record happen atomically under the thread lock, which keeps concurrent
+        callers on any thread or event loop from overshooting a window. Sleeping happens outside the
+        lock, and the check is repeated after waking up.
+        """
+        while True:
+            with self.lock:
+                now = self.clock()
+                wait_time = self._wait_time(method, now)
+                if wait_time <= 0:
+                    for window in self._windows(method):
+                        window.record(now)
+                    self.requests_issued += 1
+                    return
+                self.wait_time += wait_time
+            if wait_time > 1:
+                print(f"Rate limit reached: Waiting for {wait_time:.2f} seconds.")
+            await self.sleep(wait_time)
+
+    def _resize(self, windows, limits):
+        """Build windows for new limits, carrying over requests already made."""
+        if [(w.limit, w.seconds) for w in windows] == limits:
+            return windows
+        history = max(windows, key=lambda w: w.seconds).timestamps if windows else ()
+        now = self.clock()
+        return [
+            RateLimitWindow(limit, seconds, (t for t in history if now - t < seconds))
+            for limit, seconds in limits
+        ]
+
+    def _sync_counts(self, windows, header_value):
+        now = self.clock()
+        counts = dict((seconds, count) for count, seconds in parse_rate_limit_header(header_value))
+        for window in windows:
+            if window.seconds in counts:
+                window.sync_count(counts[window.seconds], now)
+
+    def update_from_headers(self, method, headers):
+        """Learn the current limits and counts from a Riot API response."""
+        with self.lock:
+            self._update_from_headers(method, headers)
+
+    def _update_from_headers(self, method, headers):
+        app_limits = headers.get("X-App-Rate-Limit")
+        if app_limits:
+            self.app_windows = self._resize(self.app_windows, parse_rate_limit_header(app_limits))
+        method_limits = headers.get("X-Method-Rate-Limit")
+        if method_limits and method is not None:
+            self.method_windows[method] = self._resize(self.method_windows.get(method, []), parse_rate_limit_header(method_limits))
+
+        app_count = headers.get("X-App-Rate-Limit-Count")
+        if app_count:
+            self._sync_counts(self.app_windows, app_count)
+        method_count = headers.get("X-Method-Rate-Limit-Count")
+        if method_count and method in self.method_windows:
+            self._sync_counts(self.method_windows[method], method_count)
+
+    def backoff(self, method, headers):
+        """Block the bucket that returned a 429 until its Retry-After has elapsed; returns the delay."""
+        try:
+            retry_after = float(headers.get("Retry-After", RateLimiter.default_retry_after))
+        except ValueError:
+            retry_after = RateLimiter.default_retry_after
+        # Application limit hits block every method; method and service limits only block the endpoint
+        key = None if headers.get("X-Rate-Limit-Type") == "application" else method
+        with self.lock:
+            self.blocked_until[key] = max(self.blocked_until.get(key, 0), self.clock() + retry_after)
+        return retry_after
@@ -1,81 +1,113 @@
 import os
-import time
 import asyncio
-from collections import deque
+import functools
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from api.exceptions import RiotAPIError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from api.exceptions import RiotAPIError, RateLimitExceededError
+from api.rate_limiter import RateLimiter
+from services.metrics import REGISTRY
+
+request_seconds = REGISTRY.histogram("riot_api_request_seconds", "Riot API response time by endpoint", ("method",))
+responses_total = REGISTRY.counter("riot_api_responses_total", "Riot API responses by endpoint and status code", ("method", "status"))
+errors_total = REGISTRY.counter("riot_api_errors_total", "Riot API requests that got no response", ("method",))
+limiter_wait_seconds = REGISTRY.histogram("riot_api_rate_limiter_wait_seconds", "Time requests waited on the rate limiter", ("method",))
 
 class RiotAPI:
-    max_rate_2mins = (120, 100)    # 100 requests every 2 mins
-    max_rate_1sec = (1, 20)        # 20 requests every 1 sec
-    def __init__(self):
+    default_pool_size = 20         # Keep-alive connections (and worker threads) to the Riot API
+    default_timeout = 10           # Seconds to wait for a connection or a response
+    default_max_retries = 3        # Retries on connection errors and 5xx responses
+    retry_status_codes = (500, 502, 503, 504)
+
+    def __init__(self, pool_size=None, timeout=None, max_retries=None, rate_limiter=None):
         self.api_key = os.getenv("RIOT_API_KEY")
         self.riot_base_url = os.getenv("RIOT_BASE_URL")
-        # self.request_times = deque()
-        self.request_times_2min = deque()  # Track requests for 2-minute window
-        self.request_times_1sec = deque()  # Track requests for 1-second window
-
-    async def _rate_limit(self):
-        """Enforce Riot API's rate limits."""
-        now = time.time()
-
-        # Clear out requests outside the 2-minute window
-        while self.request_times_2min and now - self.request_times_2min[0] > RiotAPI.max_rate_2mins[0]:
-            self.request_times_2min.popleft()
-
-        # Clear out requests outside the 1-second window
-        while self.request_times_1sec and now - self.request_times_1sec[0] > RiotAPI.max_rate_1sec[0]:
-            self.request_times_1sec.popleft()
-
-        # Check for 99 requests in the last 2 minutes
-        if len(self.request_times_2min) >= RiotAPI.max_rate_2mins[1] - 1:
-            wait_time = RiotAPI.max_rate_2mins[0] - (now - self.request_times_2min[0])
-            print(f"2-minute rate limit reached: Waiting for {wait_time:.2f} seconds.")
-            await asyncio.sleep(wait_time)
-
-        # Check for 19 requests in the last 1 second
-        elif len(self.request_times_1sec) >= RiotAPI.max_rate_1sec[1] - 1:
-            wait_time = RiotAPI.max_rate_1sec[0] - (now - self.request_times_1sec[0])
-            print(f"1-second rate limit reached: Waiting for {wait_time:.2f} seconds.")
-            await asyncio.sleep(wait_time)
-
-        # Track current request time in both windows
-        self.request_times_2min.append(time.time())
-        self.request_times_1sec.append(time.time())
-
-
-    async def _make_request(self, endpoint, params=None):
-        """Helper method to make a GET request to Riot API with rate limiting."""
-        await self._rate_limit()  # Enforce rate limit before making request
-
+        self.pool_size = pool_size or int(os.getenv("RIOT_POOL_SIZE", RiotAPI.default_pool_size))
+        self.timeout = timeout or float(os.getenv("RIOT_TIMEOUT", RiotAPI.default_timeout))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("RIOT_MAX_RETRIES", RiotAPI.default_max_retries))
+        self.session = self._create_session()
+        # requests is blocking, so calls run on a pool sized to match the connection pool
+        self.executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="riot-api")
+        self.rate_limiter = rate_limiter or RateLimiter()
+
+    def _create_session(self):
+        """Create a keep-alive session with a connection pool and retry policy."""
+        retry = Retry(
+            total=self.max_retries,
+            backoff_factor=0.5,
+            status_forcelist=RiotAPI.retry_status_codes,
+            allowed_methods=["GET"],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    @property
+    def requests_issued(self):
+        return self.rate_limiter.requests_issued
+
+    @property
+    def rate_limit_wait_time(self):
+        return self.rate_limiter.wait_time
+
+    def close(self):
+        """Release pooled connections and worker threads."""
+        self.session.close()
+        self.executor.shutdown(wait=False)
+
+    async def _make_request(self, endpoint, params=None, method=None):
+        """Helper method to make a GET request to Riot API with rate limiting.
+
+        `method` names the endpoint's rate limit bucket. A 429 backs the bucket off for its
+        Retry-After and the request is retried up to `max_retries` times.
+        """
         if params is None:
             params = {}
         params["api_key"] = self.api_key
         url = f"{self.riot_base_url}{endpoint}"
 
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as err:
-            raise RiotAPIError(f"HTTP error occurred: {err}")
-        except requests.exceptions.RequestException as req_err:
-            raise RiotAPIError(f"Request error occurred: {req_err}")
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            with limiter_wait_seconds.time(method=method):
+                await self.rate_limiter.acquire(method)  # Enforce rate limit before making request
+            try:
+                with request_seconds.time(method=method):
+                    response = await loop.run_in_executor(
+                        self.executor,
+                        functools.partial(self.session.get, url, params=params, timeout=self.timeout)
+                    )
+                responses_total.inc(method=method, status=response.status_code)
+                self.rate_limiter.update_from_headers(method, response.headers)
+                if response.status_code == 429:
+                    retry_after = self.rate_limiter.backoff(method, response.headers)
+                    if attempt == self.max_retries:
+                        raise RateLimitExceededError(retry_after)
+                    continue
+                response.raise_for_status()
+                return response.json()
+            except requests.exceptions.HTTPError as err:
+                raise RiotAPIError(f"HTTP error occurred: {err}")
+            except requests.exceptions.RequestException as req_err:
+                errors_total.inc(method=method)
+                raise RiotAPIError(f"Request error occurred: {req_err}")
 
     async def get_account_by_riot_id(self, game_name, tag_line):
         endpoint = f"/riot/account/v1/accounts/by-riot-id/{game_name}/{tag_line}"
 
-        return await self._make_request(endpoint)
+        return await self._make_request(endpoint, method="account-v1.getByRiotId")
 
-    async def get_list_of_match_ids_by_puuid(self, puuid, start_time=None, count=None):
+    async def get_list_of_match_ids_by_puuid(self, puuid, start_time=None, count=None, start=None):
         endpoint = f"/lol/match/v5/matches/by-puuid/{puuid}/ids"
 
-        params = {"startTime": start_time, "count": count}
+        params = {"startTime": start_time, "count": count, "start": start}
 
-        return await self._make_request(endpoint, params)
+        return await self._make_request(endpoint, params, method="match-v5.getMatchIdsByPUUID")
 
     async def get_match_by_match_id(self, match_id):
         endpoint = f"/lol/match/v5/matches/{match_id}"
-        return await self._make_request(endpoint)
-
+        return await self._make_request(endpoint, method="match-v5.getMatch")
 
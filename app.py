@@ -1,42 +1,240 @@
-from flask import Flask, render_template, request, redirect, url_for
-from services.leaderboard_service import LeaderboardService
+from flask import Flask, render_template, request, redirect, url_for, make_response, jsonify, Response, abort
+from services.leaderboard_service import LeaderboardService, parse_riot_ids
+from services.refresh_scheduler import RefreshScheduler
+from services.metrics import REGISTRY
+from services.page_cache import PageCache
 from api.riot_api import RiotAPI
 from db.dynamo import DynamoClient
 from db.db_constants import DynamoDBTables
+import os
+import threading
+import time
 
 app = Flask(__name__)
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
 
 # Initialize services
 db = DynamoClient()
 riot_api = RiotAPI()
-leaderboard_service = LeaderboardService("main_table", riot_api, db)
+leaderboard_services = {}
+leaderboard_services_lock = threading.Lock()
+# Boards served even before they have players; any other board must already have players in DynamoDB
+configured_leaderboards = {DynamoDBTables.PlayersTable.DEFAULT_LEADERBOARD} | {
+    name.strip() for name in os.getenv('LEADERBOARDS', '').split(',') if name.strip()
+}
+# Leaderboard pages and API responses, rendered and compressed once per change of the ranking they show
+rendered_pages = PageCache(int(os.getenv("PAGE_CACHE_MAX_PAGES", PageCache.default_max_pages)))
+
+
+def get_leaderboard_service(leaderboard_name=None):
+    """Return the service for a leaderboard (by default the one named in the request), creating it on first use.
+
+    Boards share the Riot client, match cache and watermarks, so a player on several boards has their
+    match history fetched once. Services are kept for good, so a board named in a request that is neither
+    configured nor has players is answered with a 404 instead of getting one.
+    """
+    if leaderboard_name is None:
+        leaderboard_name = request.values.get('leaderboard', DynamoDBTables.PlayersTable.DEFAULT_LEADERBOARD)
+        if (leaderboard_name not in leaderboard_services and leaderboard_name not in configured_leaderboards
+                and not db.leaderboard_exists(leaderboard_name)):
+            abort(404, description=f"Unknown leaderboard {leaderboard_name}.")
+    with leaderboard_services_lock:
+        leaderboard_service = leaderboard_services.get(leaderboard_name)
+        if leaderboard_service is None:
+            shared = next(iter(leaderboard_services.values()), None)
+            leaderboard_service = LeaderboardService(
+                leaderboard_name, riot_api, db,
+                match_cache=shared.match_cache if shared else None,
+                account_cache=shared.account_cache if shared else None,
+                watermarks=shared.watermarks if shared else None,
+            )
+            leaderboard_services[leaderboard_name] = leaderboard_service
+    return leaderboard_service
+
+
+get_leaderboard_service(DynamoDBTables.PlayersTable.DEFAULT_LEADERBOARD)
+# Refreshes run on a background thread; leaderboards are scheduled once they have been visited
+refresh_scheduler = RefreshScheduler(db, leaderboard_services)
+# Under the debug reloader, only the child process that serves requests runs the scheduler.
+# REFRESH_SCHEDULER=off serves pages without ever crawling (e.g. read-only replicas, benchmarks)
+if os.getenv('REFRESH_SCHEDULER', 'on') != 'off' and (__name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+    refresh_scheduler.start()
+
+
+def leaderboard_cache_stat(field):
+    return {(name,): service.leaderboard_cache.stats()[field] for name, service in list(leaderboard_services.items())}
+
+
+# The match cache is shared by every leaderboard
+match_cache = leaderboard_services[DynamoDBTables.PlayersTable.DEFAULT_LEADERBOARD].match_cache
+REGISTRY.gauge("leaderboard_cache_hits", "Leaderboard snapshot cache hits", ("leaderboard",), lambda: leaderboard_cache_stat("hits"))
+REGISTRY.gauge("leaderboard_cache_misses", "Leaderboard snapshot cache misses", ("leaderboard",), lambda: leaderboard_cache_stat("misses"))
+REGISTRY.gauge("match_cache_hits", "Match cache hits", (), lambda: {(): match_cache.hits})
+REGISTRY.gauge("match_cache_misses", "Match cache misses", (), lambda: {(): match_cache.misses})
+REGISTRY.gauge("page_cache_hits", "Pre-rendered page cache hits", (), lambda: {(): rendered_pages.hits})
+REGISTRY.gauge("page_cache_misses", "Pre-rendered page cache misses", (), lambda: {(): rendered_pages.misses})
+REGISTRY.gauge("refresh_jobs_queued", "Refresh jobs waiting in this worker", (), lambda: {(): len(refresh_scheduler.queue)})
+
+
+def send_rendered(page):
+    """Respond with a pre-rendered page: gzipped if the client accepts it, and 304 if the client's copy is current"""
+    if request.accept_encodings.quality('gzip') > 0:
+        response = Response(page.gzip_body, mimetype=page.mimetype)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(page.gzip_etag)
+    else:
+        response = Response(page.body, mimetype=page.mimetype)
+        response.set_etag(page.etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Browsers may keep the page but must check its ETag before showing it again
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+def render_index(leaderboard_service, leaderboard, window, error_message=None, job=None):
+    age = leaderboard_service.snapshot_age(window)
+    snapshot_time = None if age is None else time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(time.time() - age))
+    return render_template('index.html', leaderboard=leaderboard, DynamoDBTables=DynamoDBTables,
+                           error_message=error_message, snapshot_time=snapshot_time,
+                           leaderboard_name=leaderboard_service.leaderboard_name, job=job,
+                           window=window, windows=LeaderboardService.windows)
+
 
 @app.route('/')
-def index():
+async def index():
+    leaderboard_service = get_leaderboard_service()
     metric_to_sort = request.args.get('metric', DynamoDBTables.StatsTable.KDA)
-    leaderboard = leaderboard_service.view_leaderboard(metric_to_sort)
+    window = request.args.get('window') or None
+    if window not in LeaderboardService.windows:
+        window = None
     error_message = request.args.get('error_message')
-    return render_template('index.html', leaderboard=leaderboard, DynamoDBTables=DynamoDBTables, error_message=error_message)
+    job_id = request.args.get('job_id')
+    if error_message or job_id:
+        # Pages carrying a message or a job's progress are rendered for this request only
+        leaderboard = await leaderboard_service.view_leaderboard(metric_to_sort, window)
+        job = refresh_scheduler.get_job(job_id) if job_id else None
+        response = make_response(render_index(leaderboard_service, leaderboard, window, error_message, job))
+    else:
+        version = await leaderboard_service.leaderboard_version(window)
+        key = ("index", leaderboard_service.leaderboard_name, metric_to_sort, window)
+        page = rendered_pages.get(key, version)
+        if page is None:
+            leaderboard = await leaderboard_service.view_leaderboard(metric_to_sort, window)
+            page = rendered_pages.put(key, version, render_index(leaderboard_service, leaderboard, window).encode(), 'text/html')
+        response = send_rendered(page)
+    cache_stats = leaderboard_service.leaderboard_cache.stats()
+    response.headers['X-Leaderboard-Cache-Hit-Ratio'] = f"{cache_stats['hit_ratio']:.3f}"
+    response.headers['X-Leaderboard-Snapshot-Age'] = f"{cache_stats['age'] or 0:.1f}"
+    return response
+
+@app.route('/api/leaderboard')
+async def api_leaderboard():
+    leaderboard_service = get_leaderboard_service()
+    metric_to_sort = request.args.get('metric', DynamoDBTables.StatsTable.KDA)
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', API_PAGE_SIZE, type=int)
+    window = request.args.get('window') or None
+    if offset < 0 or not 0 < limit <= API_MAX_PAGE_SIZE:
+        return jsonify({"error": f"offset must be >= 0 and limit between 1 and {API_MAX_PAGE_SIZE}"}), 400
+    if metric_to_sort not in LeaderboardService.metric_fields or (window is not None and window not in LeaderboardService.windows):
+        return jsonify({"error": f"unknown metric {metric_to_sort} or window {window}"}), 400
+    version = await leaderboard_service.leaderboard_version(window)
+    key = ("api", leaderboard_service.leaderboard_name, metric_to_sort, window, offset, limit)
+    rendered = rendered_pages.get(key, version)
+    if rendered is None:
+        rows, total = await leaderboard_service.leaderboard_page(metric_to_sort, offset, limit, window)
+        body = app.json.dumps({
+            "leaderboard": leaderboard_service.leaderboard_name,
+            "metric": metric_to_sort,
+            "window": window,
+            "offset": offset,
+            "limit": limit,
+            "total": total,
+            "players": [{"rank": offset + i + 1, **row} for i, row in enumerate(rows)],
+        })
+        rendered = rendered_pages.put(key, version, body.encode(), 'application/json')
+    return send_rendered(rendered)
+
+@app.route('/api/leaderboard/players/<puuid>')
+async def api_player_rank(puuid):
+    leaderboard_service = get_leaderboard_service()
+    window = request.args.get('window') or None
+    if window not in LeaderboardService.windows and window is not None:
+        return jsonify({"error": f"unknown window {window}"}), 400
+    ranks = {}
+    for metric in LeaderboardService.metric_fields:
+        rank = await leaderboard_service.player_rank(puuid, metric, window)
+        if rank is None:
+            return jsonify({"error": "player not ranked on this leaderboard"}), 404
+        ranks[metric] = rank + 1
+    row = await leaderboard_service.player_row(puuid, window)
+    if row is None:  # removed while the ranks were read
+        return jsonify({"error": "player not ranked on this leaderboard"}), 404
+    return jsonify({"leaderboard": leaderboard_service.leaderboard_name, "window": window, **row, "ranks": ranks})
 
 @app.route('/add_player', methods=['POST'])
 async def add_player():
+    leaderboard_service = get_leaderboard_service()
     game_name = request.form['game_name']
     tag_line = request.form['tag_line']
-    result = await leaderboard_service.add_player(game_name, tag_line)
-    if "does not exist" in result:
-        return redirect(url_for('index', error_message=result))
-    return redirect(url_for('index'))
+    result, player = await leaderboard_service.register_player(game_name, tag_line)
+    if player is None:
+        return redirect(url_for('index', leaderboard=leaderboard_service.leaderboard_name, error_message=result))
+    # Their history is crawled by the scheduler, under the refresh lease, instead of inside this request
+    job_id = refresh_scheduler.enqueue(leaderboard_service.leaderboard_name, RefreshScheduler.BACKFILL, [player.puuid])
+    return redirect(url_for('index', leaderboard=leaderboard_service.leaderboard_name, job_id=job_id))
+
+@app.route('/import_players', methods=['POST'])
+async def import_players():
+    """Bulk add players from a JSON list, a pasted list or an uploaded CSV of name#tag"""
+    leaderboard_service = get_leaderboard_service()
+    if request.is_json:
+        body = request.get_json(silent=True)
+        riot_ids = body.get('players') if isinstance(body, dict) else body
+        if not isinstance(riot_ids, list) or not all(isinstance(riot_id, str) for riot_id in riot_ids):
+            return jsonify({"error": 'expected a list of "name#tag" strings, or {"players": [...]}'}), 400
+    elif 'file' in request.files and request.files['file'].filename:
+        riot_ids = parse_riot_ids(request.files['file'].read().decode('utf-8-sig'))
+    else:
+        riot_ids = parse_riot_ids(request.form.get('players', ''))
+    summary = await leaderboard_service.import_players(riot_ids, backfill=False)
+    summary['job_id'] = None
+    if summary['puuids']:
+        # One backfill job crawls every new player, under the refresh lease, instead of this request
+        summary['job_id'] = refresh_scheduler.enqueue(leaderboard_service.leaderboard_name, RefreshScheduler.BACKFILL, summary['puuids'])
+    if request.is_json:
+        return jsonify(summary)
+    message = f"Added {len(summary['added'])} players."
+    skipped = summary['duplicates'] + summary['not_found'] + summary['invalid']
+    if skipped:
+        message += f" Skipped: {', '.join(skipped)}"
+    return redirect(url_for('index', leaderboard=leaderboard_service.leaderboard_name, error_message=message,
+                            job_id=summary['job_id']))
 
 @app.route('/remove_player', methods=['POST'])
 def remove_player():
+    leaderboard_service = get_leaderboard_service()
     puuid = request.values['puuid']
     leaderboard_service.remove_player_by_puuid(puuid)
-    return redirect(url_for('index'))
+    return redirect(url_for('index', leaderboard=leaderboard_service.leaderboard_name))
 
 @app.route('/update_leaderboard', methods=['POST'])
-async def update_leaderboard():
-    await leaderboard_service.combine_matches()
-    return redirect(url_for('index'))
+def update_leaderboard():
+    leaderboard_service = get_leaderboard_service()
+    job_id = refresh_scheduler.enqueue(leaderboard_service.leaderboard_name)
+    return redirect(url_for('index', leaderboard=leaderboard_service.leaderboard_name, job_id=job_id))
+
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    job = refresh_scheduler.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(job)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,119 @@
+"""Micro-benchmark of the stats Lambda's per-player aggregation.
+
+Compares the original pure-Python dict loop with the columnar StatsAggregator on synthetic matches.
+
+    python -m benchmarks.bench_aggregation --matches 20000 --players 40
+"""
+import argparse
+import random
+import time
+
+from handlers.stats_aggregator import StatsAggregator
+
+
+def generate_matches(number_of_matches, number_of_players, seed=0):
+    """Build projected matches with up to 5 leaderboard players each."""
+    rng = random.Random(seed)
+    now = int(time.time())
+    puuids = [f"puuid-{i}" for i in range(number_of_players)]
+    matches = []
+    for i in range(number_of_matches):
+        participants = []
+        for puuid in rng.sample(puuids, min(rng.randint(1, 5), number_of_players)):
+            participants.append({
+                "puuid": puuid,
+                "timePlayed": rng.randint(900, 2400),
+                "totalMinionsKilled": rng.randint(0, 300),
+                "totalDamageDealtToChampions": rng.randint(2000, 60000),
+                "totalDamageTaken": rng.randint(5000, 50000),
+                "totalTimeSpentDead": rng.randint(0, 400),
+                "wardsPlaced": rng.randint(0, 40),
+                "goldEarned": rng.randint(5000, 20000),
+                "challenges": {"kda": rng.random() * 8, "soloKills": rng.randint(0, 5), "takedowns": rng.randint(0, 30)},
+            })
+        # Spread over the last 30 days, so the stats Lambda writes daily buckets too
+        end_time = now - rng.randint(0, 30 * 24 * 60 * 60)
+        matches.append({"matchId": f"NA1_{i}", "gameEndTimestamp": end_time, "participants": participants})
+    return matches
+
+
+def legacy_aggregate(matches):
+    """The aggregation loop process_games_lambda used before StatsAggregator (bug fixes applied)."""
+    participant_stat_keys = ['totalDamageDealtToChampions', 'totalDamageTaken', 'totalTimeSpentDead', 'wardsPlaced', 'goldEarned']
+    challenges_stat_keys = ['kda', 'soloKills', 'takedowns']
+    calculated_stat_keys = ['csPerMin', 'damageDealtToChampionsRecord']
+    all_stat_keys = participant_stat_keys + challenges_stat_keys + calculated_stat_keys
+
+    processed_matches = []
+    for match in matches:
+        for participant in match["participants"]:
+            csPerMin = participant.get("totalMinionsKilled") / participant.get("timePlayed", 1) * 60
+            entry = {"puuid": participant.get("puuid"), "csPerMin": csPerMin,
+                     "damageDealtToChampionsRecord": participant.get("totalDamageDealtToChampions")}
+            entry.update({key: participant.get(key, 0) for key in participant_stat_keys})
+            entry.update({key: participant["challenges"].get(key, 0) for key in challenges_stat_keys})
+            processed_matches.append(entry)
+
+    grouped_by_puuid = {}
+    for entry in processed_matches:
+        puuid = entry['puuid']
+        if puuid not in grouped_by_puuid:
+            grouped_by_puuid[puuid] = {key: 0 for key in all_stat_keys}
+            grouped_by_puuid[puuid]["numberOfGames"] = 0
+        for key in all_stat_keys:
+            if key == 'damageDealtToChampionsRecord':
+                grouped_by_puuid[puuid][key] = max(grouped_by_puuid[puuid][key], entry[key])
+            else:
+                grouped_by_puuid[puuid][key] += entry.get(key, 0)
+        grouped_by_puuid[puuid]["numberOfGames"] += 1
+
+    for stats in grouped_by_puuid.values():
+        for key in all_stat_keys:
+            if key != 'damageDealtToChampionsRecord':
+                stats[key] = stats[key] / stats["numberOfGames"]
+    return grouped_by_puuid
+
+
+def columnar_aggregate(matches):
+    aggregator = StatsAggregator()
+    for match in matches:
+        for participant in match["participants"]:
+            aggregator.add_participant(participant)
+    return {puuid: totals.averages() for puuid, totals in aggregator.aggregate().items()}
+
+
+def best_of(fn, matches, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(matches)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--matches", type=int, default=20000)
+    parser.add_argument("--players", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    matches = generate_matches(args.matches, args.players)
+    legacy_time, legacy = best_of(legacy_aggregate, matches, args.repeat)
+    columnar_time, columnar = best_of(columnar_aggregate, matches, args.repeat)
+
+    # Both implementations must agree before their timings mean anything
+    for puuid, stats in legacy.items():
+        for key, value in stats.items():
+            if key != "numberOfGames":
+                assert abs(columnar[puuid][key] - value) < 1e-6 * max(1, abs(value)), (puuid, key)
+
+    participants = sum(len(match["participants"]) for match in matches)
+    print(f"{args.matches} matches, {participants} participant rows, {args.players} players")
+    print(f"legacy loop:        {legacy_time * 1000:8.1f} ms")
+    print(f"StatsAggregator:    {columnar_time * 1000:8.1f} ms")
+    print(f"speedup:            {legacy_time / columnar_time:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
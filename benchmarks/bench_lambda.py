@@ -0,0 +1,131 @@
+"""Local latency harness for the stats Lambda (process_games_lambda).
+
+Measures the init phase (importing the handler in a fresh interpreter), the first invocation and
+warm invocations against a fake S3 and DynamoDB, and fails when a budget is exceeded. Needs moto
+(`pip install moto`), which is not a runtime dependency.
+
+    python -m benchmarks.bench_lambda --records 3 --matches 2000 --players 40 --budget-warm-ms 1500
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_aggregation import generate_matches
+from benchmarks.fake_aws import BUCKET, create_resources, fake_aws_environment
+from db.db_constants import DynamoDBTables
+from services.match_batch import MatchBatchWriter
+
+LEADERBOARD = DynamoDBTables.PlayersTable.DEFAULT_LEADERBOARD
+INIT_SNIPPET = (
+    "import time; start = time.perf_counter(); "
+    "import handlers.process_games_lambda; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def measure_init(runs):
+    """Seconds to import the handler module (clients included) in a fresh interpreter, per run."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = fake_aws_environment()
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", INIT_SNIPPET], cwd=root, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return timings
+
+
+def create_fixtures(records, matches, players, work_dir):
+    """Create the tables and bucket, upload `records` batches, and return the S3 event for them."""
+    import boto3
+    create_resources([
+        DynamoDBTables.StatsTable.TABLE_NAME,
+        DynamoDBTables.StatsDailyTable.TABLE_NAME,
+        DynamoDBTables.ProcessingStatusTable.TABLE_NAME,
+    ])
+    s3 = boto3.client("s3")
+
+    event_records = []
+    for i in range(records):
+        path = os.path.join(work_dir, f"bench_{i}.jsonl.gz")
+        with MatchBatchWriter(path) as batch:
+            for match in generate_matches(matches, players, seed=i):
+                batch.write(match)
+        key = f"{LEADERBOARD}/bench_{i}.jsonl.gz"
+        s3.upload_file(path, BUCKET, key)
+        os.remove(path)
+        event_records.append({"s3": {"bucket": {"name": BUCKET}, "object": {"key": key}}})
+    return {"Records": event_records}
+
+
+def measure_invocations(event, warm):
+    """Seconds taken by the first invocation in this process and by each following warm invocation."""
+    import boto3
+    from handlers import process_games_lambda
+    s3 = boto3.client("s3")
+    timings = []
+    for run in range(warm + 1):
+        # The handler skips batches it has already counted, so every run gets copies under keys it has not seen
+        records = []
+        for record in event["Records"]:
+            bucket, key = record["s3"]["bucket"]["name"], record["s3"]["object"]["key"]
+            copy = key.replace(".jsonl.gz", f"_run{run}.jsonl.gz")
+            s3.copy_object(Bucket=bucket, Key=copy, CopySource={"Bucket": bucket, "Key": key})
+            records.append({"s3": {"bucket": {"name": bucket}, "object": {"key": copy}}})
+        start = time.perf_counter()
+        process_games_lambda.lambda_handler({"Records": records}, None)
+        timings.append(time.perf_counter() - start)
+    return timings[0], timings[1:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=3, help="S3 records (uploaded batches) per event")
+    parser.add_argument("--matches", type=int, default=2000, help="matches per batch")
+    parser.add_argument("--players", type=int, default=40)
+    parser.add_argument("--init-runs", type=int, default=5)
+    parser.add_argument("--warm", type=int, default=5)
+    parser.add_argument("--budget-init-ms", type=float, help="fail if the median init phase is slower")
+    parser.add_argument("--budget-first-ms", type=float, help="fail if the first invocation is slower")
+    parser.add_argument("--budget-warm-ms", type=float, help="fail if the median warm invocation is slower")
+    args = parser.parse_args()
+
+    fake_aws_environment()
+    init = statistics.median(measure_init(args.init_runs))
+
+    from moto import mock_aws
+    import tempfile
+    with mock_aws(), tempfile.TemporaryDirectory() as work_dir:
+        event = create_fixtures(args.records, args.matches, args.players, work_dir)
+        # Handler output would drown the report
+        stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+        try:
+            first, warm = measure_invocations(event, args.warm)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+    warm_median = statistics.median(warm) if warm else float("nan")
+
+    print(f"{args.records} records x {args.matches} matches, {args.players} players (fake S3/DynamoDB)")
+    print(f"init (fresh interpreter): {init * 1000:8.1f} ms")
+    print(f"first invocation:         {first * 1000:8.1f} ms")
+    print(f"warm invocation (median): {warm_median * 1000:8.1f} ms")
+
+    over_budget = [
+        name for name, seconds, budget in (
+            ("init", init, args.budget_init_ms),
+            ("first invocation", first, args.budget_first_ms),
+            ("warm invocation", warm_median, args.budget_warm_ms),
+        )
+        if budget is not None and seconds * 1000 > budget
+    ]
+    if over_budget:
+        print(f"Over budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""End-to-end benchmark: leaderboard refresh, stats Lambda and page latency, fully offline.
+
+Each scenario adds N players to a fresh fake S3/DynamoDB (moto), refreshes them from the stub Riot
+server with combine_matches, feeds the uploaded batch to the stats Lambda, then times `/` through
+the Flask test client. Needs moto (`pip install moto`).
+
+    python -m benchmarks.bench_refresh --players 10 100 1000 --latency 0.02 --json results.json
+    python -m benchmarks.bench_refresh --players 10 100 --baseline results.json --tolerance 0.25
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_aws import BUCKET, create_resources, fake_aws_environment
+from benchmarks.riot_stub import DEVELOPMENT_APP_LIMITS, PRODUCTION_APP_LIMITS, RiotFixtures, RiotStubServer
+from db.db_constants import DynamoDBTables
+
+LEADERBOARD = DynamoDBTables.PlayersTable.DEFAULT_LEADERBOARD
+# Metrics where a higher value is a regression, compared against --baseline
+LOWER_IS_BETTER = ("refresh_wall_time", "lambda_aggregate_ms", "lambda_total_ms", "page_p50_ms", "page_p95_ms", "rebuild_p50_ms")
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class Quiet:
+    """Silence the app's progress prints while a phase is timed."""
+    def __enter__(self):
+        self.stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+
+    def __exit__(self, exc_type, exc_value, tb):
+        sys.stdout.close()
+        sys.stdout = self.stdout
+
+
+def run_scenario(players, args, fixtures_dir=None):
+    from moto import mock_aws
+    from api.riot_api import RiotAPI
+    from db.dynamo import DynamoClient
+    from models.player import Player
+    from services.leaderboard_service import LeaderboardService
+
+    fixtures = RiotFixtures.load(fixtures_dir) if fixtures_dir else RiotFixtures.synthesize(players, args.matches_per_player, args.seed)
+    app_limits = DEVELOPMENT_APP_LIMITS if args.dev_key else PRODUCTION_APP_LIMITS
+    result = {"players": len(fixtures.accounts), "matches": len(fixtures.matches)}
+
+    with mock_aws(), tempfile.TemporaryDirectory() as work_dir, \
+            RiotStubServer(fixtures, app_limits, latency=args.latency, jitter=args.jitter, seed=args.seed) as stub:
+        os.environ["RIOT_BASE_URL"] = stub.base_url
+        os.environ["RIOT_API_KEY"] = "bench"
+        # The benchmark invokes the stats Lambda itself, after the refresh, so don't wait for it
+        os.environ["STATS_CONFIRM_TIMEOUT"] = "0"
+        create_resources()
+        db = DynamoClient()
+        for account in fixtures.accounts.values():
+            db.add_player(LEADERBOARD, Player(account["gameName"], account["tagLine"], account["puuid"]))
+
+        # Services keep their match cache, watermarks and batches in the working directory
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        riot_api = RiotAPI()
+        try:
+            service = LeaderboardService(LEADERBOARD, riot_api, db)
+            with Quiet():
+                report = asyncio.run(service.combine_matches())
+            result.update(measure_lambda(report["chunk_keys"]))
+            result.update(measure_page(service, args.page_requests))
+        finally:
+            riot_api.close()
+            os.chdir(cwd)
+        result.update({
+            "refresh_wall_time": report["wall_clock_time"],
+            "requests": report["requests_issued"],
+            "requests_per_second": report["requests_issued"] / report["wall_clock_time"],
+            "limit_requests_per_second": stub.allowed_rate(report["wall_clock_time"]),
+            "rate_limited_responses": stub.rate_limited,
+            "rate_limit_wait_time": report["rate_limit_wait_time"],
+            "refresh_error": report["error"],
+        })
+    return result
+
+
+def measure_lambda(chunk_keys):
+    """Run the stats Lambda on the chunks the refresh uploaded, in one invocation."""
+    from handlers import process_games_lambda
+    event = {"Records": [{"s3": {"bucket": {"name": BUCKET}, "object": {"key": key}}} for key in chunk_keys]}
+    start = time.perf_counter()
+    with Quiet():
+        body = json.loads(process_games_lambda.lambda_handler(event, None)["body"])
+    return {
+        "lambda_total_ms": (time.perf_counter() - start) * 1000,
+        "lambda_aggregate_ms": (body["timings"]["parse"] + body["timings"]["aggregate"]) * 1000,
+    }
+
+
+def measure_page(service, requests):
+    """Latency of `/` when served from the leaderboard cache, and when every request rebuilds it."""
+    os.environ["REFRESH_SCHEDULER"] = "off"
+    import app as web
+    web.leaderboard_services[LEADERBOARD] = service
+    client = web.app.test_client()
+
+    def timed(invalidate):
+        samples = []
+        for _ in range(requests):
+            if invalidate:
+                service.leaderboard_cache.invalidate()
+            start = time.perf_counter()
+            response = client.get(f"/?metric={DynamoDBTables.StatsTable.KDA}")
+            samples.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.status_code
+        return samples
+
+    with Quiet():
+        client.get("/")  # build the snapshot the cached series is served from
+        cached = timed(invalidate=False)
+        rebuilt = timed(invalidate=True)
+    return {
+        "page_p50_ms": percentile(cached, 0.50),
+        "page_p95_ms": percentile(cached, 0.95),
+        "page_p99_ms": percentile(cached, 0.99),
+        "rebuild_p50_ms": percentile(rebuilt, 0.50),
+        "rebuild_p95_ms": percentile(rebuilt, 0.95),
+    }
+
+
+def print_results(results):
+    print(f"{'players':>8} {'matches':>8} {'requests':>9} {'refresh s':>10} {'req/s':>7} {'limit':>6} {'429s':>5} "
+          f"{'lambda ms':>10} {'agg ms':>7} {'page p50':>9} {'p95':>7} {'p99':>7} {'rebuild p50':>12}")
+    for r in results:
+        print(f"{r['players']:>8} {r['matches']:>8} {r['requests']:>9} {r['refresh_wall_time']:>10.2f} "
+              f"{r['requests_per_second']:>7.1f} {r['limit_requests_per_second']:>6.1f} {r['rate_limited_responses']:>5} "
+              f"{r['lambda_total_ms']:>10.1f} {r['lambda_aggregate_ms']:>7.1f} {r['page_p50_ms']:>9.2f} "
+              f"{r['page_p95_ms']:>7.2f} {r['page_p99_ms']:>7.2f} {r['rebuild_p50_ms']:>12.2f}")
+        if r["refresh_error"]:
+            print(f"  refresh error with {r['players']} players: {r['refresh_error']}")
+
+
+def find_regressions(results, baseline, tolerance):
+    """Metrics more than `tolerance` worse than the baseline run with the same number of players."""
+    previous = {r["players"]: r for r in baseline}
+    regressions = []
+    for r in results:
+        old = previous.get(r["players"])
+        if old is None:
+            continue
+        for metric in LOWER_IS_BETTER:
+            if old.get(metric) and r[metric] > old[metric] * (1 + tolerance):
+                regressions.append(f"{r['players']} players: {metric} {old[metric]:.2f} -> {r[metric]:.2f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, nargs="+", default=[10, 100, 1000], help="scenario sizes")
+    parser.add_argument("--matches-per-player", type=int, default=5)
+    parser.add_argument("--fixtures", help="replay a recorded fixture directory instead of synthesizing (one scenario)")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every stub response")
+    parser.add_argument("--jitter", type=float, default=0.01, help="extra random seconds per stub response")
+    parser.add_argument("--dev-key", action="store_true", help="enforce development key limits (20:1,100:120)")
+    parser.add_argument("--page-requests", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    fake_aws_environment()
+    if args.fixtures:
+        results = [run_scenario(None, args, args.fixtures)]
+    else:
+        results = [run_scenario(players, args) for players in args.players]
+    print_results(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Startup benchmark: import `app` and serve the first `/` in a fresh interpreter, against fake AWS.
+
+Each run starts a new Python process that fills moto's DynamoDB with N players and their stats, then
+times `import app` and the first `GET /` through the Flask test client, and counts the DynamoDB calls
+made before that response. All runs share one data directory, so the first run starts cold and later
+runs find the leaderboard snapshot the earlier ones left on disk. Needs moto (`pip install moto`).
+
+    python -m benchmarks.bench_startup --players 1000 --runs 3 --dynamo-latency 0.01
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_aws import create_resources, fake_aws_environment
+from db.db_constants import DynamoDBTables
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEADERBOARD = DynamoDBTables.PlayersTable.DEFAULT_LEADERBOARD
+
+
+def seed_tables(players, seed=0):
+    """Put `players` players on the default leaderboard, each with a row of running sums."""
+    import boto3
+    rng = random.Random(seed)
+    dynamodb = boto3.resource("dynamodb")
+    with dynamodb.Table(DynamoDBTables.PlayersTable.TABLE_NAME).batch_writer() as batch:
+        for i in range(players):
+            batch.put_item(Item={
+                DynamoDBTables.PlayersTable.LEADERBOARD_NAME: LEADERBOARD,
+                DynamoDBTables.PlayersTable.PUUID: f"puuid-{i}",
+                DynamoDBTables.PlayersTable.GAME_NAME: f"player{i}",
+                DynamoDBTables.PlayersTable.TAG_LINE: "NA1",
+            })
+    with dynamodb.Table(DynamoDBTables.StatsTable.TABLE_NAME).batch_writer() as batch:
+        for i in range(players):
+            games = rng.randint(1, 50)
+            item = {
+                DynamoDBTables.StatsTable.PUUID: f"puuid-{i}",
+                DynamoDBTables.StatsTable.NUMBER_OF_GAMES: games,
+                DynamoDBTables.StatsTable.DAMAGE_RECORD: rng.randint(20000, 80000),
+            }
+            for metric in DynamoDBTables.StatsTable.AVERAGED_METRICS:
+                item[metric + DynamoDBTables.StatsTable.SUM_SUFFIX] = games * rng.randint(1, 20000)
+            batch.put_item(Item=item)
+
+
+def child(players, dynamo_latency):
+    """One measured process; prints its timings as JSON on the last line of stdout."""
+    import boto3
+    from moto import mock_aws
+    os.environ["REFRESH_SCHEDULER"] = "off"
+    with mock_aws():
+        create_resources()
+        seed_tables(players)
+        if dynamo_latency:
+            # Moto answers instantly; make every call the app makes cost a network round trip
+            boto3.setup_default_session()
+            boto3.DEFAULT_SESSION.events.register("before-call.dynamodb", lambda **kwargs: time.sleep(dynamo_latency))
+
+        start = time.perf_counter()
+        import app as web
+        imported = time.perf_counter()
+        response = web.app.test_client().get("/")
+        responded = time.perf_counter()
+        assert response.status_code == 200, response.status_code
+
+        from db.dynamo import calls_total
+        print(json.dumps({
+            "import_ms": (imported - start) * 1000,
+            "first_response_ms": (responded - imported) * 1000,
+            "total_ms": (responded - start) * 1000,
+            "dynamodb_calls": sum(value for _, _, _, value in calls_total.samples()),
+        }))
+
+
+def run(players, dynamo_latency, work_dir):
+    env = dict(fake_aws_environment(), PYTHONPATH=ROOT)
+    code = f"from benchmarks.bench_startup import child; child({players}, {dynamo_latency})"
+    output = subprocess.run([sys.executable, "-c", code], cwd=work_dir, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=3, help="processes started one after another on the same data directory")
+    parser.add_argument("--dynamo-latency", type=float, default=0.01, help="seconds added to every DynamoDB call")
+    parser.add_argument("--budget-ms", type=float, help="fail if a run after the first takes longer to its first response")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = [run(args.players, args.dynamo_latency, work_dir) for _ in range(args.runs)]
+
+    print(f"{args.players} players, {args.dynamo_latency * 1000:.0f} ms per DynamoDB call (fake DynamoDB)")
+    print(f"{'run':>4} {'import ms':>10} {'first / ms':>11} {'total ms':>9} {'dynamo calls':>13}")
+    for i, r in enumerate(results):
+        print(f"{i + 1:>4} {r['import_ms']:>10.1f} {r['first_response_ms']:>11.1f} {r['total_ms']:>9.1f} {r['dynamodb_calls']:>13}")
+
+    if args.budget_ms is not None and any(r["total_ms"] > args.budget_ms for r in results[1:]):
+        print(f"Over budget: a warm start took more than {args.budget_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
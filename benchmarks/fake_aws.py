@@ -0,0 +1,55 @@
+"""In-process S3 and DynamoDB for the benchmarks, backed by moto (`pip install moto`)."""
+import os
+
+import boto3
+
+from db.db_constants import DynamoDBTables
+
+BUCKET = "l3-bench-bucket"
+
+# Table -> (key schema as [(attribute, key type)], global secondary indexes as {name: partition key})
+TABLES = {
+    DynamoDBTables.PlayersTable.TABLE_NAME: (
+        [(DynamoDBTables.PlayersTable.LEADERBOARD_NAME, "HASH"), (DynamoDBTables.PlayersTable.PUUID, "RANGE")],
+        {DynamoDBTables.PlayersTable.PUUID_INDEX: DynamoDBTables.PlayersTable.PUUID},
+    ),
+    DynamoDBTables.StatsTable.TABLE_NAME: ([(DynamoDBTables.StatsTable.PUUID, "HASH")], {}),
+    DynamoDBTables.StatsDailyTable.TABLE_NAME: (
+        [(DynamoDBTables.StatsDailyTable.PUUID, "HASH"), (DynamoDBTables.StatsDailyTable.DAY, "RANGE")], {},
+    ),
+    DynamoDBTables.ProcessingStatusTable.TABLE_NAME: ([(DynamoDBTables.ProcessingStatusTable.LEADERBOARD_NAME, "HASH")], {}),
+    DynamoDBTables.LeaseTable.TABLE_NAME: ([(DynamoDBTables.LeaseTable.LEASE_NAME, "HASH")], {}),
+    DynamoDBTables.RefreshJobsTable.TABLE_NAME: ([(DynamoDBTables.RefreshJobsTable.JOB_ID, "HASH")], {}),
+}
+
+
+def fake_aws_environment():
+    """Point boto3 and the app at fake credentials and the benchmark bucket."""
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("REGION_NAME", os.environ["AWS_DEFAULT_REGION"])
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    os.environ["BUCKET_NAME"] = BUCKET
+    return dict(os.environ)
+
+
+def create_resources(tables=None):
+    """Create the app's tables (all of them by default) and the bucket; call inside `mock_aws()`."""
+    dynamodb = boto3.client("dynamodb")
+    for table in tables or TABLES:
+        key_schema, indexes = TABLES[table]
+        attributes = {name for name, _ in key_schema} | set(indexes.values())
+        kwargs = {}
+        if indexes:
+            kwargs["GlobalSecondaryIndexes"] = [
+                {"IndexName": name, "KeySchema": [{"AttributeName": key, "KeyType": "HASH"}], "Projection": {"ProjectionType": "KEYS_ONLY"}}
+                for name, key in indexes.items()
+            ]
+        dynamodb.create_table(
+            TableName=table,
+            KeySchema=[{"AttributeName": name, "KeyType": key_type} for name, key_type in key_schema],
+            AttributeDefinitions=[{"AttributeName": name, "AttributeType": "S"} for name in sorted(attributes)],
+            BillingMode="PAY_PER_REQUEST",
+            **kwargs
+        )
+    boto3.client("s3").create_bucket(Bucket=BUCKET)
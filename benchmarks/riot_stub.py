@@ -0,0 +1,329 @@
+"""Local stand-in for the Riot API that replays recorded (or synthesized) account and match payloads.
+
+The server enforces Riot-style application and method rate limits and reports them in the same
+X-*-Rate-Limit headers, answers with 429 + Retry-After when a limit is hit, and can add latency to
+every response. Record real payloads once with
+
+    python -m benchmarks.riot_stub record --out benchmarks/fixtures/recorded "name#tag" ...
+
+(needs RIOT_API_KEY and RIOT_BASE_URL) and replay them with `RiotFixtures.load`.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+PRODUCTION_APP_LIMITS = ((500, 10), (30000, 600))
+DEVELOPMENT_APP_LIMITS = ((20, 1), (100, 120))
+METHOD_LIMITS = {
+    "account-v1.getByRiotId": ((1000, 60),),
+    "match-v5.getMatchIdsByPUUID": ((2000, 10),),
+    "match-v5.getMatch": ((2000, 10),),
+}
+# Filler stats so synthesized matches are about the size of real match-v5 payloads
+FILLER_CHALLENGES = tuple(f"challenge{i}" for i in range(110))
+
+
+def format_limits(limits):
+    return ",".join(f"{limit}:{seconds}" for limit, seconds in limits)
+
+
+class RiotFixtures:
+    """Accounts and matches served by the stub, indexed the way the Riot endpoints look them up."""
+    def __init__(self, accounts, matches):
+        self.accounts = {(a["gameName"].lower(), a["tagLine"].lower()): a for a in accounts}
+        self.matches = {match["metadata"]["matchId"]: match for match in matches}
+        # puuid -> match ids, newest first, as match-v5 lists them
+        self.match_ids_by_puuid = {}
+        for match_id, match in sorted(self.matches.items(), key=lambda item: -item[1]["info"]["gameEndTimestamp"]):
+            for participant in match["info"]["participants"]:
+                self.match_ids_by_puuid.setdefault(participant["puuid"], []).append(match_id)
+
+    @property
+    def puuids(self):
+        return [account["puuid"] for account in self.accounts.values()]
+
+    @classmethod
+    def load(cls, directory):
+        """Load fixtures saved by `save` or recorded with `record`."""
+        with open(os.path.join(directory, "accounts.json")) as f:
+            accounts = json.load(f)
+        matches = []
+        matches_dir = os.path.join(directory, "matches")
+        for name in sorted(os.listdir(matches_dir)):
+            with open(os.path.join(matches_dir, name)) as f:
+                matches.append(json.load(f))
+        return cls(accounts, matches)
+
+    def save(self, directory):
+        os.makedirs(os.path.join(directory, "matches"), exist_ok=True)
+        with open(os.path.join(directory, "accounts.json"), "w") as f:
+            json.dump(list(self.accounts.values()), f)
+        for match_id, match in self.matches.items():
+            with open(os.path.join(directory, "matches", f"{match_id}.json"), "w") as f:
+                json.dump(match, f)
+
+    @classmethod
+    def synthesize(cls, players, matches_per_player, seed=0):
+        """Build `players` accounts who each played at least `matches_per_player` games.
+
+        Games are shared: each holds one to five of the players, the rest of its ten slots are
+        strangers, the way friend groups queue together.
+        """
+        rng = random.Random(seed)
+        accounts = [
+            {"puuid": f"bench-puuid-{i:05d}", "gameName": f"Bench{i}", "tagLine": "NA1"}
+            for i in range(players)
+        ]
+        remaining = {account["puuid"]: matches_per_player for account in accounts}
+        matches = []
+        end_time = 1_700_000_000_000
+        while remaining:
+            owed = list(remaining)
+            roster_players = rng.sample(owed, min(rng.randint(1, 5), len(owed)))
+            for puuid in roster_players:
+                remaining[puuid] -= 1
+                if not remaining[puuid]:
+                    del remaining[puuid]
+            strangers = [f"stranger-{rng.getrandbits(64):016x}" for _ in range(10 - len(roster_players))]
+            end_time -= rng.randint(1_800_000, 7_200_000)
+            matches.append(cls._synthesize_match(f"NA1_{len(matches) + 1000000}", roster_players + strangers, end_time, rng))
+        return cls(accounts, matches)
+
+    @staticmethod
+    def _synthesize_match(match_id, puuids, end_time, rng):
+        duration = rng.randint(900, 2400)
+        participants = []
+        for puuid in puuids:
+            challenges = {key: rng.random() * 10 for key in FILLER_CHALLENGES}
+            challenges.update({"kda": rng.random() * 8, "soloKills": rng.randint(0, 5), "takedowns": rng.randint(0, 30)})
+            participants.append({
+                "puuid": puuid,
+                "timePlayed": duration,
+                "totalMinionsKilled": rng.randint(0, 300),
+                "totalDamageDealt": rng.randint(20000, 200000),
+                "totalDamageDealtToChampions": rng.randint(2000, 60000),
+                "totalDamageTaken": rng.randint(5000, 50000),
+                "totalTimeSpentDead": rng.randint(0, 400),
+                "wardsPlaced": rng.randint(0, 40),
+                "goldEarned": rng.randint(5000, 20000),
+                "challenges": challenges,
+            })
+        return {
+            "metadata": {"matchId": match_id, "participants": puuids},
+            "info": {
+                "gameCreation": end_time - duration * 1000,
+                "gameDuration": duration,
+                "gameEndTimestamp": end_time,
+                "participants": participants,
+            },
+        }
+
+
+class RateLimitBucket:
+    """Server-side sliding windows for one rate limit bucket."""
+    def __init__(self, limits):
+        self.windows = [(limit, seconds, deque()) for limit, seconds in limits]
+
+    def try_acquire(self, now):
+        """Count a request and return 0, or return the seconds until it would be allowed."""
+        retry_after = 0
+        for limit, seconds, timestamps in self.windows:
+            while timestamps and now - timestamps[0] >= seconds:
+                timestamps.popleft()
+            if len(timestamps) >= limit:
+                retry_after = max(retry_after, seconds - (now - timestamps[0]))
+        if retry_after:
+            return retry_after
+        for _, _, timestamps in self.windows:
+            timestamps.append(now)
+        return 0
+
+    def counts(self):
+        return ",".join(f"{len(timestamps)}:{seconds}" for _, seconds, timestamps in self.windows)
+
+
+class RiotStubServer:
+    """Serve `fixtures` on localhost from a background thread."""
+    routes = (
+        (re.compile(r"^/riot/account/v1/accounts/by-riot-id/([^/]+)/([^/]+)$"), "account-v1.getByRiotId"),
+        (re.compile(r"^/lol/match/v5/matches/by-puuid/([^/]+)/ids$"), "match-v5.getMatchIdsByPUUID"),
+        (re.compile(r"^/lol/match/v5/matches/([^/]+)$"), "match-v5.getMatch"),
+    )
+
+    def __init__(self, fixtures, app_limits=PRODUCTION_APP_LIMITS, method_limits=None, latency=0.0, jitter=0.0, seed=0):
+        self.fixtures = fixtures
+        self.app_limits = tuple(app_limits)
+        self.method_limits = dict(METHOD_LIMITS if method_limits is None else method_limits)
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.app_bucket = RateLimitBucket(self.app_limits)
+        self.method_buckets = {method: RateLimitBucket(limits) for method, limits in self.method_limits.items()}
+        self.requests_served = 0
+        self.rate_limited = 0
+        self.server = None
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def allowed_rate(self, duration):
+        """Highest average requests per second the application limits allow over a run of `duration` seconds."""
+        return min(limit * math.ceil(duration / seconds) for limit, seconds in self.app_limits) / duration
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+            def do_GET(self):
+                stub._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="riot-stub", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.stop()
+
+    def _handle(self, request):
+        url = urlparse(request.path)
+        for pattern, method in RiotStubServer.routes:
+            match = pattern.match(url.path)
+            if match:
+                break
+        else:
+            return self._respond(request, 404, {"status": {"status_code": 404, "message": "Not found"}})
+
+        headers = {"X-App-Rate-Limit": format_limits(self.app_limits)}
+        if method in self.method_limits:
+            headers["X-Method-Rate-Limit"] = format_limits(self.method_limits[method])
+        with self.lock:
+            now = time.monotonic()
+            retry_after = self.app_bucket.try_acquire(now)
+            limit_type = "application"
+            if not retry_after and method in self.method_buckets:
+                retry_after = self.method_buckets[method].try_acquire(now)
+                limit_type = "method"
+            headers["X-App-Rate-Limit-Count"] = self.app_bucket.counts()
+            if method in self.method_buckets:
+                headers["X-Method-Rate-Limit-Count"] = self.method_buckets[method].counts()
+            if retry_after:
+                self.rate_limited += 1
+            else:
+                self.requests_served += 1
+        if retry_after:
+            headers.update({"Retry-After": str(math.ceil(retry_after)), "X-Rate-Limit-Type": limit_type})
+            return self._respond(request, 429, {"status": {"status_code": 429, "message": "Rate limit exceeded"}}, headers)
+
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self.rng.uniform(0, self.jitter))
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        status, body = self._lookup(method, [unquote(group) for group in match.groups()], params)
+        self._respond(request, status, body, headers)
+
+    def _lookup(self, method, args, params):
+        if method == "account-v1.getByRiotId":
+            account = self.fixtures.accounts.get((args[0].lower(), args[1].lower()))
+            return (200, account) if account else (404, {"status": {"status_code": 404, "message": "Data not found"}})
+        if method == "match-v5.getMatch":
+            match = self.fixtures.matches.get(args[0])
+            return (200, match) if match else (404, {"status": {"status_code": 404, "message": "Data not found"}})
+
+        match_ids = self.fixtures.match_ids_by_puuid.get(args[0], [])
+        if "startTime" in params:
+            start_time = int(params["startTime"]) * 1000
+            match_ids = [m for m in match_ids if self.fixtures.matches[m]["info"]["gameCreation"] >= start_time]
+        start = int(params.get("start", 0))
+        count = int(params.get("count", 20))
+        return 200, match_ids[start:start + count]
+
+    @staticmethod
+    def _respond(request, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json;charset=utf-8")
+        request.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(payload)
+
+
+async def record(riot_api, riot_ids, matches_per_player):
+    """Fetch accounts and their recent matches from the real API for later replay."""
+    accounts, matches = [], {}
+    for riot_id in riot_ids:
+        game_name, tag_line = riot_id.split("#", 1)
+        account = await riot_api.get_account_by_riot_id(game_name, tag_line)
+        accounts.append(account)
+        for match_id in await riot_api.get_list_of_match_ids_by_puuid(account["puuid"], count=matches_per_player):
+            if match_id not in matches:
+                matches[match_id] = await riot_api.get_match_by_match_id(match_id)
+    return RiotFixtures(accounts, list(matches.values()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="record real payloads into a fixture directory")
+    record_parser.add_argument("riot_ids", nargs="+", help="players as name#tag")
+    record_parser.add_argument("--out", required=True)
+    record_parser.add_argument("--matches-per-player", type=int, default=20)
+    serve_parser = commands.add_parser("serve", help="serve fixtures until interrupted")
+    serve_parser.add_argument("--fixtures", help="fixture directory; synthesized when omitted")
+    serve_parser.add_argument("--players", type=int, default=10)
+    serve_parser.add_argument("--matches-per-player", type=int, default=20)
+    serve_parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        from dotenv import load_dotenv
+        from api.riot_api import RiotAPI
+        load_dotenv()
+        riot_api = RiotAPI()
+        try:
+            fixtures = asyncio.run(record(riot_api, args.riot_ids, args.matches_per_player))
+        finally:
+            riot_api.close()
+        fixtures.save(args.out)
+        print(f"Recorded {len(fixtures.accounts)} accounts and {len(fixtures.matches)} matches to {args.out}")
+    else:
+        fixtures = RiotFixtures.load(args.fixtures) if args.fixtures else RiotFixtures.synthesize(args.players, args.matches_per_player)
+        with RiotStubServer(fixtures, latency=args.latency) as stub:
+            print(f"Serving {len(fixtures.accounts)} accounts and {len(fixtures.matches)} matches at {stub.base_url}")
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                pass
+
+
+if __name__ == "__main__":
+    main()
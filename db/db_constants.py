@@ -1,6 +1,11 @@
 class DynamoDBTables:
     class PlayersTable:
-        TABLE_NAME = "players"
+        # Partitioned per leaderboard: leaderboard_name (partition key) + puuid (sort key)
+        TABLE_NAME = "leaderboard_players"
+        LEGACY_TABLE_NAME = "players"  # single-leaderboard table keyed by game_name + tag_line
+        PUUID_INDEX = "puuid-index"    # GSI on puuid, to find every leaderboard a player is on
+        LEADERBOARD_NAME = "leaderboard_name"
+        DEFAULT_LEADERBOARD = "main_table"
         GAME_NAME = "game_name"
         TAG_LINE = "tag_line"
         PUUID = "puuid"
@@ -15,9 +20,37 @@ class DynamoDBTables:
         DAMAGE_RECORD = "damageDealtToChampionsRecord"
         AVERAGE_GOLD_EARNED = "goldEarned"
         AVERAGE_TIME_SPENT_DEAD = "totalTimeSpentDead"
+        # Averages are derived at read time from running sums stored as "<metric>Sum"
+        SUM_SUFFIX = "Sum"
+        AVERAGED_METRICS = (KDA, CS_PER_MIN, AVERAGE_DAMAGE_DEALT_TO_CHAMPIONS, AVERAGE_GOLD_EARNED, AVERAGE_TIME_SPENT_DEAD)
+
+    class StatsDailyTable:
+        # Per-player, per-day (UTC) running sums; rolling-window leaderboards merge a few of these
+        TABLE_NAME = "stats_daily"
+        PUUID = "puuid"
+        DAY = "day"                # "YYYY-MM-DD" sort key
+        EXPIRES_AT = "expires_at"  # TTL attribute, so buckets older than the longest window are dropped
 
     class ProcessingStatusTable:
         TABLE_NAME = "processing_status"
         LEADERBOARD_NAME = "leaderboard_name"
-        PROCESSING = "processing"
+        PROCESSING = "processing"  # Boolean written by earlier versions of the stats Lambda
+        IN_FLIGHT = "in_flight"    # String set of '<start epoch>:<request id>', one per running invocation
+        IN_FLIGHT_STALE_AFTER = 900  # Lambda's maximum timeout; an older entry belongs to a killed invocation
 
+
+    class LeaseTable:
+        # Lets one process at a time hold a named lease until expires_at (epoch seconds)
+        TABLE_NAME = "leases"
+        LEASE_NAME = "lease_name"
+        OWNER = "owner"
+        EXPIRES_AT = "expires_at"
+        REFRESH_LEASE = "refresh"  # held while crawling the Riot API
+
+    class RefreshJobsTable:
+        TABLE_NAME = "refresh_jobs"
+        JOB_ID = "job_id"
+        LEADERBOARD_NAME = "leaderboard_name"
+        STATUS = "status"
+        RECORD = "record"          # the whole job as JSON
+        EXPIRES_AT = "expires_at"  # TTL attribute
@@ -1,23 +1,169 @@
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from boto3.dynamodb.conditions import Key
 from models.player import Player
 from decimal import Decimal
-from collections import OrderedDict
+from models.roster import Roster
+from concurrent.futures import ThreadPoolExecutor
 from db.db_constants import DynamoDBTables
+from services.metrics import REGISTRY
+import asyncio
+import functools
+import json
 import os
+import threading
+import time
+
+call_seconds = REGISTRY.histogram("dynamodb_call_seconds", "DynamoDB API call latency by operation", ("operation",))
+calls_total = REGISTRY.counter("dynamodb_calls_total", "DynamoDB API calls by operation and outcome", ("operation", "status"))
+consumed_capacity_total = REGISTRY.counter(
+    "dynamodb_consumed_capacity_units_total", "Capacity units consumed by operation and table", ("operation", "table")
+)
+
+
+def _request_consumed_capacity(params, model, **kwargs):
+    """Ask every call that supports it to report the capacity it consumed."""
+    if 'ReturnConsumedCapacity' in model.input_shape.members:
+        params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+
+
+def _start_call_timer(context, **kwargs):
+    context['metrics_started_at'] = time.perf_counter()
+
+
+def _record_call(http_response, parsed, model, context, **kwargs):
+    started_at = context.get('metrics_started_at')
+    if started_at is not None:
+        call_seconds.observe(time.perf_counter() - started_at, operation=model.name)
+    calls_total.inc(operation=model.name, status=http_response.status_code)
+    consumed = parsed.get('ConsumedCapacity')
+    for capacity in consumed if isinstance(consumed, list) else [consumed] if consumed else []:
+        consumed_capacity_total.inc(capacity.get('CapacityUnits', 0), operation=model.name, table=capacity.get('TableName', ''))
+
+
+def instrument_client(client):
+    """Time every call a DynamoDB client makes and record its status and consumed capacity."""
+    events = client.meta.events
+    events.register('before-parameter-build.dynamodb', _request_consumed_capacity)
+    events.register('before-call.dynamodb', _start_call_timer)
+    events.register('after-call.dynamodb', _record_call)
+
 
 class DynamoClient:
-    def __init__(self):
-        self.dynamodb = boto3.resource('dynamodb', region_name=os.getenv("REGION_NAME"))
-        self.players_table = self.dynamodb.Table(DynamoDBTables.PlayersTable.TABLE_NAME)
-        self.processing_status_table = self.dynamodb.Table(DynamoDBTables.ProcessingStatusTable.TABLE_NAME)
-        self.stats_table = self.dynamodb.Table(DynamoDBTables.StatsTable.TABLE_NAME)
-        
-    def add_player(self, player: Player):
-        """Add a player to DynamoDB."""
+    default_pool_size = 10      # Connections to DynamoDB (and worker threads for async callers)
+    batch_get_limit = 100       # Max keys per BatchGetItem request
+    max_batch_get_retries = 5   # Attempts at fetching UnprocessedKeys
+    player_attributes = (
+        DynamoDBTables.PlayersTable.GAME_NAME,
+        DynamoDBTables.PlayersTable.TAG_LINE,
+        DynamoDBTables.PlayersTable.PUUID,
+    )
+    # Only what the leaderboard reads: sums and game counts, legacy averages and the damage record
+    stats_attributes = (
+        DynamoDBTables.StatsTable.PUUID,
+        DynamoDBTables.StatsTable.NUMBER_OF_GAMES,
+        DynamoDBTables.StatsTable.DAMAGE_RECORD,
+    ) + DynamoDBTables.StatsTable.AVERAGED_METRICS + tuple(
+        metric + DynamoDBTables.StatsTable.SUM_SUFFIX for metric in DynamoDBTables.StatsTable.AVERAGED_METRICS
+    )
+
+    def __init__(self, pool_size=None):
+        self.pool_size = pool_size or int(os.getenv("AWS_POOL_SIZE", DynamoClient.default_pool_size))
+        # boto3 is blocking, so async callers run calls on a pool sized to match the connection pool
+        self.executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="dynamo")
+        # The boto3 resource and tables are created on first use, so importing the app never waits on them
+        self._tables = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._tables is None:
+            with self._lock:
+                if self._tables is None:
+                    dynamodb = boto3.resource(
+                        'dynamodb',
+                        region_name=os.getenv("REGION_NAME"),
+                        config=Config(max_pool_connections=self.pool_size)
+                    )
+                    instrument_client(dynamodb.meta.client)
+                    self._tables = {
+                        "resource": dynamodb,
+                        "players": dynamodb.Table(DynamoDBTables.PlayersTable.TABLE_NAME),
+                        "processing_status": dynamodb.Table(DynamoDBTables.ProcessingStatusTable.TABLE_NAME),
+                        "stats": dynamodb.Table(DynamoDBTables.StatsTable.TABLE_NAME),
+                    }
+        return self._tables
+
+    @property
+    def dynamodb(self):
+        return self._connect()["resource"]
+
+    @property
+    def players_table(self):
+        return self._connect()["players"]
+
+    @property
+    def processing_status_table(self):
+        return self._connect()["processing_status"]
+
+    @property
+    def stats_table(self):
+        return self._connect()["stats"]
+
+    async def _run(self, fn, *args, **kwargs):
+        """Run a blocking call on the DynamoDB pool without stalling the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    @staticmethod
+    def _projection(attributes):
+        """Build ProjectionExpression arguments, aliasing names so reserved words are safe."""
+        names = {f"#a{i}": attribute for i, attribute in enumerate(attributes)}
+        return {
+            'ProjectionExpression': ", ".join(names),
+            'ExpressionAttributeNames': names,
+        }
+
+    def _batch_get_chunk(self, table_name, keys, attributes=None):
+        """Fetch up to batch_get_limit items by key with BatchGetItem, retrying unprocessed keys."""
+        items = []
+        request = {table_name: dict({'Keys': keys}, **(self._projection(attributes) if attributes else {}))}
+        for attempt in range(DynamoClient.max_batch_get_retries):
+            # The resource's client is thread-safe, so chunks can be fetched from the pool
+            response = self.dynamodb.meta.client.batch_get_item(RequestItems=request)
+            items.extend(response.get('Responses', {}).get(table_name, []))
+            request = response.get('UnprocessedKeys')
+            if not request:
+                return items
+            time.sleep(min(0.05 * 2 ** attempt, 1))
+        raise RuntimeError(f"Unprocessed keys remain in {table_name} after {DynamoClient.max_batch_get_retries} attempts")
+
+    @staticmethod
+    def _chunks(keys):
+        return [keys[i:i + DynamoClient.batch_get_limit] for i in range(0, len(keys), DynamoClient.batch_get_limit)]
+
+    async def _batch_get_async(self, table_name, keys, attributes=None):
+        """Fetch items by key with BatchGetItem, all chunks at once."""
+        chunks = await asyncio.gather(*(
+            self._run(self._batch_get_chunk, table_name, chunk, attributes) for chunk in self._chunks(keys)
+        ))
+        return [item for chunk in chunks for item in chunk]
+
+    def _query_all(self, table, **kwargs):
+        """Run a query to the end, following LastEvaluatedKey."""
+        response = table.query(**kwargs)
+        items = response.get('Items', [])
+        while 'LastEvaluatedKey' in response:
+            response = table.query(ExclusiveStartKey=response['LastEvaluatedKey'], **kwargs)
+            items.extend(response.get('Items', []))
+        return items
+
+    def add_player(self, leaderboard_name, player: Player):
+        """Add a player to a leaderboard in DynamoDB."""
         try:
             self.players_table.put_item(
                 Item={
+                    DynamoDBTables.PlayersTable.LEADERBOARD_NAME: leaderboard_name,
                     DynamoDBTables.PlayersTable.GAME_NAME: player.game_name,
                     DynamoDBTables.PlayersTable.TAG_LINE: player.tag_line,
                     DynamoDBTables.PlayersTable.PUUID: player.puuid
@@ -26,29 +172,78 @@ class DynamoClient:
         except ClientError as e:
             print(e.response['Error']['Message'])
     
-    def remove_player(self, puuid, game_name, tag_line):
-        """Remove a player from DynamoDB."""
+    def add_players(self, leaderboard_name, players):
+        """Add several players to a leaderboard in DynamoDB with batched writes.
+
+        Returns True if every player was written.
+        """
+        try:
+            # batch_writer sends 25 items per BatchWriteItem and resends unprocessed items
+            with self.players_table.batch_writer(overwrite_by_pkeys=[
+                DynamoDBTables.PlayersTable.LEADERBOARD_NAME, DynamoDBTables.PlayersTable.PUUID
+            ]) as batch:
+                for player in players:
+                    batch.put_item(
+                        Item={
+                            DynamoDBTables.PlayersTable.LEADERBOARD_NAME: leaderboard_name,
+                            DynamoDBTables.PlayersTable.GAME_NAME: player.game_name,
+                            DynamoDBTables.PlayersTable.TAG_LINE: player.tag_line,
+                            DynamoDBTables.PlayersTable.PUUID: player.puuid
+                        }
+                    )
+        except ClientError as e:
+            print(e.response['Error']['Message'])
+            return False
+        return True
+
+    def remove_player(self, leaderboard_name, puuid):
+        """Remove a player from a leaderboard in DynamoDB.
+
+        Stats are shared between leaderboards, so they are only deleted once the player is on no
+        leaderboard at all. Returns True if the stats were deleted.
+        """
         try:
             self.players_table.delete_item(
                 Key={
-                    DynamoDBTables.PlayersTable.GAME_NAME: game_name,
-                    DynamoDBTables.PlayersTable.TAG_LINE: tag_line
+                    DynamoDBTables.PlayersTable.LEADERBOARD_NAME: leaderboard_name,
+                    DynamoDBTables.PlayersTable.PUUID: puuid
                 }
             )
+            if self.get_player_leaderboards(puuid):
+                return False
             self.stats_table.delete_item(
                 Key={
                     DynamoDBTables.StatsTable.PUUID: puuid
                 }
             )
+            return True
         except ClientError as e:
             print(e.response['Error']['Message'])
+            return False
+
+    def leaderboard_exists(self, leaderboard_name):
+        """Whether a leaderboard has at least one player, read with a single one-item query."""
+        try:
+            response = self.players_table.query(
+                KeyConditionExpression=Key(DynamoDBTables.PlayersTable.LEADERBOARD_NAME).eq(leaderboard_name),
+                ProjectionExpression="#puuid",
+                ExpressionAttributeNames={"#puuid": DynamoDBTables.PlayersTable.PUUID},
+                Limit=1
+            )
+            return bool(response.get('Items'))
+        except ClientError as e:
+            print(f"Error checking leaderboard {leaderboard_name}: {e}")
+            return False
 
-    def get_all_players(self):
-        """Get all players from DynamoDB as a dictionary."""
+    def get_all_players(self, leaderboard_name):
+        """Get all players of a leaderboard from DynamoDB as a Roster (a dictionary keyed by puuid)."""
         try:
-            response = self.players_table.scan()
-            items = response.get('Items', [])
-            players = OrderedDict()
+            items = self._query_all(
+                self.players_table,
+                KeyConditionExpression=Key(DynamoDBTables.PlayersTable.LEADERBOARD_NAME).eq(leaderboard_name),
+                **self._projection(DynamoClient.player_attributes)
+            )
+            players = Roster()
 
             for item in items:
                 player = Player(**item)
@@ -57,15 +252,25 @@ class DynamoClient:
             return players
         except ClientError as e:
             print(e.response['Error']['Message'])
-            return {}
+            return Roster()
+
+    def get_player_leaderboards(self, puuid):
+        """Get the names of every leaderboard a player is on."""
+        items = self._query_all(
+            self.players_table,
+            IndexName=DynamoDBTables.PlayersTable.PUUID_INDEX,
+            KeyConditionExpression=Key(DynamoDBTables.PlayersTable.PUUID).eq(puuid),
+            **self._projection((DynamoDBTables.PlayersTable.LEADERBOARD_NAME,))
+        )
+        return [item[DynamoDBTables.PlayersTable.LEADERBOARD_NAME] for item in items]
 
-    def update_player_damage(self, game_name, tag_line, avg_damage):
+    def update_player_damage(self, leaderboard_name, puuid, avg_damage):
         """Update a player's information in DB."""
         try:
             self.players_table.update_item(
                 Key={
-                    DynamoDBTables.PlayersTable.GAME_NAME: game_name,
-                    DynamoDBTables.PlayersTable.TAG_LINE: tag_line
+                    DynamoDBTables.PlayersTable.LEADERBOARD_NAME: leaderboard_name,
+                    DynamoDBTables.PlayersTable.PUUID: puuid
                 },
                 UpdateExpression='SET avg_damage = :val1',
                 ExpressionAttributeValues={
@@ -76,34 +281,131 @@ class DynamoClient:
             print(e.response['Error']['Message'])
             return []
 
-    def get_all_player_stats_from_dynamodb(self):
+    async def get_player_stats_async(self, puuids):
+        """Get the stats of the given players by key, fetching every BatchGetItem chunk concurrently."""
         try:
-            response = self.stats_table.scan()
-            data = response['Items']
+            keys = [{DynamoDBTables.StatsTable.PUUID: puuid} for puuid in puuids]
+            return await self._batch_get_async(DynamoDBTables.StatsTable.TABLE_NAME, keys, DynamoClient.stats_attributes)
 
-            while 'LastEvaluatedKey' in response:
-                response = self.stats_table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
-                data.extend(response['Items'])
+        except Exception as e:
+            print(f"Error retrieving data: {e}")
+            return None
 
-            return data
+    async def get_player_daily_stats_async(self, puuids, days):
+        """Get the daily stat buckets of the given players for the given days ("YYYY-MM-DD"); days without games have no bucket."""
+        try:
+            keys = [
+                {DynamoDBTables.StatsDailyTable.PUUID: puuid, DynamoDBTables.StatsDailyTable.DAY: day}
+                for puuid in puuids for day in days
+            ]
+            return await self._batch_get_async(DynamoDBTables.StatsDailyTable.TABLE_NAME, keys, DynamoClient.stats_attributes)
 
         except Exception as e:
             print(f"Error retrieving data: {e}")
             return None
 
+    async def get_all_players_async(self, leaderboard_name):
+        return await self._run(self.get_all_players, leaderboard_name)
+
+    async def add_player_async(self, leaderboard_name, player: Player):
+        return await self._run(self.add_player, leaderboard_name, player)
+
+    async def add_players_async(self, leaderboard_name, players):
+        return await self._run(self.add_players, leaderboard_name, players)
+
+    async def check_processing_status_async(self, leaderboard_name):
+        return await self._run(self.check_processing_status, leaderboard_name)
+
     def check_processing_status(self, leaderboard_name):
-        """Returns processing status"""
+        """Returns whether an invocation of the stats Lambda is running for the leaderboard, or None if it never ran"""
+        status = DynamoDBTables.ProcessingStatusTable
         try:
-            response = self.processing_status_table.scan()
-            items = response['Items']
-
-            for item in items:
-                if item[DynamoDBTables.ProcessingStatusTable.LEADERBOARD_NAME] == leaderboard_name:
-                    return items[0].get(DynamoDBTables.ProcessingStatusTable.PROCESSING, False)
-            else:
+            response = self.processing_status_table.get_item(
+                Key={status.LEADERBOARD_NAME: leaderboard_name},
+                ProjectionExpression="#in_flight, #processing",
+                ExpressionAttributeNames={"#in_flight": status.IN_FLIGHT, "#processing": status.PROCESSING}
+            )
+            if 'Item' not in response:
                 # If no matching leaderboard_name is found
                 return None
+            item = response['Item']
+            if status.IN_FLIGHT not in item:
+                # DynamoDB drops the set with its last entry; a row from an earlier Lambda may still hold the boolean
+                return item.get(status.PROCESSING, False)
+            started_after = time.time() - status.IN_FLIGHT_STALE_AFTER
+            return any(int(entry.split(":", 1)[0]) > started_after for entry in item[status.IN_FLIGHT])
         except ClientError as e:
             print(f"Error querying table: {e}")
             return None
 
+    def acquire_lease(self, lease_name, owner, duration):
+        """Take, or renew, a lease for `duration` seconds. Returns False while another owner holds it."""
+        now = int(time.time())
+        try:
+            # The resource's client is thread-safe; the scheduler calls this from its own thread
+            self.dynamodb.meta.client.put_item(
+                TableName=DynamoDBTables.LeaseTable.TABLE_NAME,
+                Item={
+                    DynamoDBTables.LeaseTable.LEASE_NAME: lease_name,
+                    DynamoDBTables.LeaseTable.OWNER: owner,
+                    DynamoDBTables.LeaseTable.EXPIRES_AT: now + duration,
+                },
+                ConditionExpression="attribute_not_exists(#name) OR #expires_at < :now OR #owner = :owner",
+                ExpressionAttributeNames={
+                    "#name": DynamoDBTables.LeaseTable.LEASE_NAME,
+                    "#expires_at": DynamoDBTables.LeaseTable.EXPIRES_AT,
+                    "#owner": DynamoDBTables.LeaseTable.OWNER,
+                },
+                ExpressionAttributeValues={":now": now, ":owner": owner}
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                print(f"Error acquiring lease '{lease_name}': {e}")
+            return False
+
+    def release_lease(self, lease_name, owner):
+        """Give up a lease, if it is still held by `owner`."""
+        try:
+            self.dynamodb.meta.client.delete_item(
+                TableName=DynamoDBTables.LeaseTable.TABLE_NAME,
+                Key={DynamoDBTables.LeaseTable.LEASE_NAME: lease_name},
+                ConditionExpression="#owner = :owner",
+                ExpressionAttributeNames={"#owner": DynamoDBTables.LeaseTable.OWNER},
+                ExpressionAttributeValues={":owner": owner}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                print(f"Error releasing lease '{lease_name}': {e}")
+
+    def put_refresh_job(self, job, ttl):
+        """Store a refresh job so any worker can report its status, expiring `ttl` seconds from now."""
+        try:
+            self.dynamodb.meta.client.put_item(
+                TableName=DynamoDBTables.RefreshJobsTable.TABLE_NAME,
+                Item={
+                    DynamoDBTables.RefreshJobsTable.JOB_ID: job["job_id"],
+                    DynamoDBTables.RefreshJobsTable.LEADERBOARD_NAME: job["leaderboard_name"],
+                    DynamoDBTables.RefreshJobsTable.STATUS: job["status"],
+                    DynamoDBTables.RefreshJobsTable.RECORD: json.dumps(job),
+                    DynamoDBTables.RefreshJobsTable.EXPIRES_AT: int(time.time()) + ttl,
+                }
+            )
+        except ClientError as e:
+            print(f"Error saving refresh job {job['job_id']}: {e}")
+
+    def get_refresh_job(self, job_id):
+        """Get a refresh job by id, or None if it does not exist (or has expired)."""
+        try:
+            response = self.dynamodb.meta.client.get_item(
+                TableName=DynamoDBTables.RefreshJobsTable.TABLE_NAME,
+                Key={DynamoDBTables.RefreshJobsTable.JOB_ID: job_id},
+                ProjectionExpression="#record",
+                ExpressionAttributeNames={"#record": DynamoDBTables.RefreshJobsTable.RECORD}
+            )
+        except ClientError as e:
+            print(f"Error querying table: {e}")
+            return None
+        if 'Item' not in response:
+            return None
+        return json.loads(response['Item'][DynamoDBTables.RefreshJobsTable.RECORD])
@@ -0,0 +1,33 @@
+"""One-shot migration that copies the single-leaderboard `players` table into `leaderboard_players`.
+
+Every legacy player is added to the default leaderboard. Existing rows are overwritten with the same
+values, so the script can be re-run. Run from the L3 root directory with
+`python -m db.migrate_players_to_leaderboards`.
+"""
+import os
+import boto3
+from dotenv import load_dotenv
+from db.db_constants import DynamoDBTables
+
+
+def migrate(dynamodb):
+    players = DynamoDBTables.PlayersTable
+    copied = 0
+    paginator = dynamodb.meta.client.get_paginator('scan')
+    table = dynamodb.Table(players.TABLE_NAME)
+    with table.batch_writer() as batch:
+        for page in paginator.paginate(TableName=players.LEGACY_TABLE_NAME):
+            for item in page.get('Items', []):
+                batch.put_item(Item={
+                    players.LEADERBOARD_NAME: players.DEFAULT_LEADERBOARD,
+                    players.PUUID: item[players.PUUID],
+                    players.GAME_NAME: item[players.GAME_NAME],
+                    players.TAG_LINE: item[players.TAG_LINE],
+                })
+                copied += 1
+    print(f"Copied {copied} players into '{players.DEFAULT_LEADERBOARD}'.")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    migrate(boto3.resource('dynamodb', region_name=os.getenv("REGION_NAME")))
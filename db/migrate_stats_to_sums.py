@@ -0,0 +1,40 @@
+"""One-shot migration that adds running sums to stats rows written as rounded averages.
+
+Safe to run while the stats Lambda is live: each row is only updated if it has not changed since it
+was scanned, and rows that already hold sums are skipped. Run from the L3 root directory with
+`python -m db.migrate_stats_to_sums`.
+"""
+import os
+import boto3
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+from db.db_constants import DynamoDBTables
+from handlers.stats_aggregator import SUMS_MARKER, legacy_migration_update
+
+
+def migrate(dynamodb):
+    migrated, skipped, conflicted = 0, 0, 0
+    paginator = dynamodb.get_paginator('scan')
+    for page in paginator.paginate(TableName=DynamoDBTables.StatsTable.TABLE_NAME):
+        for item in page.get('Items', []):
+            if SUMS_MARKER in item:
+                skipped += 1
+                continue
+            try:
+                dynamodb.update_item(
+                    TableName=DynamoDBTables.StatsTable.TABLE_NAME,
+                    Key={DynamoDBTables.StatsTable.PUUID: item[DynamoDBTables.StatsTable.PUUID]},
+                    **legacy_migration_update(item)
+                )
+                migrated += 1
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                # The Lambda migrated or updated the row in the meantime
+                conflicted += 1
+    print(f"Migrated {migrated} rows, {skipped} already had sums, {conflicted} changed during the migration.")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    migrate(boto3.client('dynamodb', region_name=os.getenv("REGION_NAME")))
@@ -1,148 +1,408 @@
+import io
+import gzip
 import json
+import os
+import threading
+import time
+import uuid
+from urllib.parse import unquote_plus
+from concurrent.futures import ThreadPoolExecutor
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
+# NumPy is only imported by the aggregator on its first aggregate(), keeping it out of the init phase
+from handlers.stats_aggregator import StatsAggregator, SUMS_MARKER, sum_attribute, legacy_migration_update
 
-s3_client = boto3.client('s3')
-dynamodb = boto3.client('dynamodb')
+# Everything below is created once per execution environment and reused by warm invocations
+STATS_TABLE = os.environ.get('STATS_TABLE', 'stats')
+PROCESSING_STATUS_TABLE = os.environ.get('PROCESSING_STATUS_TABLE', 'processing_status')
+# Per-player, per-day (UTC) totals that rolling-window leaderboards are merged from
+STATS_DAILY_TABLE = os.environ.get('STATS_DAILY_TABLE', 'stats_daily')
+# Daily buckets expire (via DynamoDB TTL on expires_at) this many days after their day; older games only count all-time
+BUCKET_RETENTION_DAYS = int(os.environ.get('STATS_BUCKET_RETENTION_DAYS', 35))
+SECONDS_PER_DAY = 24 * 60 * 60
+DEFAULT_LEADERBOARD = 'main_table'  # owner of legacy batches uploaded at the bucket root
+MAX_WRITE_RETRIES = 5       # Attempts at adding to a row that first needs migrating to running sums
+# Chunk keys a row remembers, newest first, so a chunk delivered again is not counted twice; the older half is
+# dropped once a row holds more. A chunk is only delivered again within hours of its upload.
+PROCESSED_CHUNKS_KEPT = 100
+WRITE_CONCURRENCY = int(os.environ.get('WRITE_CONCURRENCY', 16))  # Concurrent UpdateItem calls
+# Object tag set on a batch once its stats are written; the uploader waits for it before moving watermarks
+PROCESSED_TAG = 'stats-processed'
+MANIFEST_NAME = 'manifest.json'  # lists the chunks of a batch; holds no matches
 
+# One connection per writer thread, so writes never queue for the default pool of 10
+aws_config = Config(max_pool_connections=WRITE_CONCURRENCY)
+s3_client = boto3.client('s3', config=aws_config)
+dynamodb = boto3.client('dynamodb', config=aws_config)
+write_executor = None
 
-def lambda_handler(event, context):
-    def set_processing_flag(value):
-        """Set the processing status tables."""
+# Logs are one JSON object per line so CloudWatch Logs Insights can filter and aggregate on fields
+log_context = {}
+invocation_counters = {}
+counters_lock = threading.Lock()
+
+
+def log(message, level="INFO", **fields):
+    print(json.dumps({"level": level, "message": message, **log_context, **fields}, default=str))
+
+
+def count(name, amount=1):
+    """Add to a counter reported in the invocation's summary log line."""
+    with counters_lock:
+        invocation_counters[name] = invocation_counters.get(name, 0) + amount
+
+
+def update_stats_item(table_name=STATS_TABLE, **kwargs):
+    """UpdateItem on a stats table, counting calls and consumed capacity."""
+    count('dynamodb_update_calls')
+    try:
+        response = dynamodb.update_item(TableName=table_name, ReturnConsumedCapacity='TOTAL', **kwargs)
+    except ClientError as e:
+        if is_conditional_check_failure(e):
+            count('conditional_check_failures')
+        raise
+    count('consumed_write_capacity', response.get('ConsumedCapacity', {}).get('CapacityUnits', 0))
+    return response
+
+
+def iter_match_participants(body, key):
+    """Yield (end time in epoch seconds, participant list) for each match in an uploaded batch.
+
+    Batches are gzip-compressed JSON lines and are decompressed and parsed one match at a time.
+    Legacy `.json` uploads hold a single object of full Riot matches keyed by match id.
+    """
+    if key.endswith('.jsonl.gz'):
+        with io.TextIOWrapper(gzip.GzipFile(fileobj=body), encoding="utf-8") as lines:
+            for line in lines:
+                if line.strip():
+                    match = json.loads(line)
+                    yield match.get("gameEndTimestamp", 0), match["participants"]
+    else:
+        for match in json.loads(body.read().decode("utf-8")).values():
+            info = match["info"]
+            end_ms = info.get("gameEndTimestamp") or info.get("gameCreation", 0) + info.get("gameDuration", 0) * 1000
+            yield end_ms // 1000, info["participants"]
+
+
+def get_leaderboard_name(key):
+    """Batches are uploaded as '<leaderboard_name>/<file>'."""
+    return key.split('/', 1)[0] if '/' in key else DEFAULT_LEADERBOARD
+
+
+def set_in_flight(leaderboard_name, entry, running):
+    """Add this invocation's entry to, or remove it from, the leaderboard's set of running invocations.
+
+    Entries are '<start epoch>:<request id>', so invocations that overlap on a leaderboard each clear only
+    their own, and readers can ignore the entry of one that was killed before it could remove it. The
+    single boolean written by earlier versions is removed along the way.
+    """
+    try:
+        dynamodb.update_item(
+            TableName=PROCESSING_STATUS_TABLE,
+            Key={'leaderboard_name': {'S': leaderboard_name}},
+            UpdateExpression=('ADD' if running else 'DELETE') + ' in_flight :entry REMOVE processing',
+            ExpressionAttributeValues={':entry': {'SS': [entry]}},
+        )
+        log("in-flight entry updated", leaderboard=leaderboard_name, entry=entry, running=running)
+    except ClientError as e:
+        log("in-flight entry update failed", level="ERROR", leaderboard=leaderboard_name, entry=entry, running=running, error=str(e))
+
+
+def is_conditional_check_failure(error):
+    return error.response['Error']['Code'] == 'ConditionalCheckFailedException'
+
+
+def migrate_legacy_row(puuid, item):
+    """Add running sums to a player's row that still only holds rounded averages."""
+    if SUMS_MARKER in item:
+        return
+    try:
+        update_stats_item(Key={'puuid': {'S': puuid}}, **legacy_migration_update(item))
+        count('legacy_rows_migrated')
+    except ClientError as e:
+        if not is_conditional_check_failure(e):
+            raise
+
+
+def add_totals_update(totals, chunk_key):
+    """UpdateExpression and values that ADD a chunk's game count and sums onto a row and record the chunk on it.
+
+    Pair it with NOT_YET_COUNTED as the condition, so a chunk the row already counted is not added again.
+    """
+    expression_values = {
+        ':numberOfGames': {'N': str(totals.number_of_games)},
+        ':chunk': {'S': chunk_key},
+        ':chunks': {'SS': [chunk_key]},
+    }
+    expression_values.update({f":{sum_attribute(key)}": {'N': repr(value)} for key, value in totals.sums.items()})
+    update_expression = "ADD numberOfGames :numberOfGames, processed_chunks :chunks, " + ", ".join(
+        f"{sum_attribute(key)} :{sum_attribute(key)}" for key in totals.sums
+    )
+    return update_expression, expression_values
+
+
+NOT_YET_COUNTED = "NOT contains(processed_chunks, :chunk)"
+
+
+def is_counted(item, chunk_key):
+    """Whether a row (low-level item format) already holds a chunk's games."""
+    return chunk_key in (item or {}).get('processed_chunks', {}).get('SS', [])
+
+
+def forget_old_chunks(table_name, key, response):
+    """Drop the older half of a row's chunk keys once it remembers more than PROCESSED_CHUNKS_KEPT."""
+    chunk_keys = response.get('Attributes', {}).get('processed_chunks', {}).get('SS', [])
+    if len(chunk_keys) <= PROCESSED_CHUNKS_KEPT:
+        return
+    # Keys are '<leaderboard>/<UTC timestamp>-<id>/<chunk>', so past the leaderboard they sort in upload order
+    oldest = sorted(chunk_keys, key=lambda chunk_key: chunk_key.split('/', 1)[-1])[:-(PROCESSED_CHUNKS_KEPT // 2)]
+    try:
+        update_stats_item(
+            table_name,
+            Key=key,
+            UpdateExpression="DELETE processed_chunks :oldest",
+            ExpressionAttributeValues={':oldest': {'SS': oldest}}
+        )
+        count('chunk_keys_forgotten', len(oldest))
+    except ClientError as e:
+        # The keys are dropped on a later write instead
+        log("old chunk keys not dropped", level="WARNING", key=key, error=str(e))
+
+
+def raise_records(table_name, key, totals):
+    """Raise each record on a row with a SET that only applies when the new value is higher."""
+    for attribute, value in totals.maxes.items():
         try:
-            print(f"attempting to change processing flag")
-            # Use PutItem to create or update the row with the partition key "main_table"
-            dynamodb.put_item(
-                TableName='processing_status',
-                Item={
-                    'leaderboard_name': {'S': 'main_table'},
-                    'processing': {'BOOL': value}
-                }
+            update_stats_item(
+                table_name,
+                Key=key,
+                UpdateExpression=f"SET {attribute} = :value",
+                ConditionExpression=f"attribute_not_exists({attribute}) OR {attribute} < :value",
+                ExpressionAttributeValues={':value': {'N': repr(value)}}
             )
-            print(f"Set processing flag to: {value} in 'processing_status' table.")
         except ClientError as e:
-            print(f"Error updating processing flag: {e}")
-            
-    print(f"starting up Lambda...")
-    set_processing_flag(True)
-
-    srcBucket = event['Records'][0]['s3']['bucket']['name']
-    srcKey = event['Records'][0]['s3']['object']['key']
-    bucket_content = s3_client.get_object(Bucket=srcBucket, Key=srcKey)
-    
-    json_file = bucket_content['Body'].read().decode("utf-8")
-    
-    data = json.loads(json_file)
-    
-    # pull all the player puuid from db -> dictionary
-    # iterate over json keys (matches), if we find a match with past puuid, update that row
-    # else calculate average for newcomer and insert a new row for them 
-    
-    # iterate over the json keys 
-    # find person in db, grab avg there and recalc then put back in
-    
-    key_list = []
-    processed_matches = []
-    grouped_by_puuid = {}
-    
-    for key, body in data.items():
-        key_list.append(key)
-        
-    # participant_stat_keys ignores puuid
-    participant_stat_keys = ['totalDamageDealtToChampions', 'totalDamageTaken', 'totalTimeSpentDead', 'wardsPlaced', 'goldEarned']
-    challenges_stat_keys = ['kda', 'soloKills', 'takedowns']
-    calculated_stat_keys = ['csPerMin', 'damageDealtToChampionsRecord']
-    all_stat_keys = participant_stat_keys + challenges_stat_keys + calculated_stat_keys
-    
-    damageRecord = 0
-
-    # getting all raw entries    
-    for key in key_list:
-        for participant in data[key]["info"]["participants"]:
-            # Calcuate cs per min
-            timePlayed = participant.get("timePlayed", 1)
-            minionsKilled = participant.get("totalMinionsKilled")
-            csPerMin = minionsKilled / timePlayed * 60
-            
-            damageRecord = participant.get("totalDamageDealtToChampions")
-
-            entry = {"puuid": participant.get("puuid"), "csPerMin": csPerMin, "damageDealtToChampionsRecord": damageRecord}
-            entry.update({key: participant.get(key, 0) for key in participant_stat_keys})
-            entry.update({key: participant["challenges"].get(key, 0) for key in challenges_stat_keys})
-        processed_matches.append(entry)
-    
-    # grouping entries by puuid and getting total along with # of games 
-    for entry in processed_matches:
-        puuid = entry['puuid']
-        if puuid not in grouped_by_puuid:
-            grouped_by_puuid[puuid] = {key: 0 for key in all_stat_keys}
-            grouped_by_puuid[puuid]["numberOfGames"] = 0
-            
-        for key in all_stat_keys:
-            grouped_by_puuid[puuid][key] += entry.get(key, 0)
-
-        grouped_by_puuid[puuid]["numberOfGames"] += 1
-    
-    # calculate averages
-    for stats in grouped_by_puuid.values():
-        for key in all_stat_keys:
-            if key != 'damageDealtToChampionsRecord':
-                stats[key] = stats[key] / stats["numberOfGames"] if stats["numberOfGames"] > 0 else 0
-            
-    # new function that does it all 
-    for puuid, stats in grouped_by_puuid.items():
+            if not is_conditional_check_failure(e):
+                raise
+
+
+def write_player_stats(puuid, chunk_key, totals):
+    """Add a chunk's totals to a player's row without reading it first.
+
+    Game counts and sums are applied with an atomic ADD, and each record is raised with a SET
+    that only applies when the new value is higher, so concurrent invocations never lose updates.
+    The ADD also records the chunk on the row and only applies if it is not there yet, so a chunk
+    delivered again, or a write retried after its ADD went through, counts its games once.
+    """
+    key = {'puuid': {'S': puuid}}
+    update_expression, expression_values = add_totals_update(totals, chunk_key)
+
+    for attempt in range(MAX_WRITE_RETRIES):
         try:
-            # Fetch the existing data from DynamoDB for the current puuid
-            response = dynamodb.get_item(
-                TableName='stats',
-                Key={'puuid': {'S': puuid}}
+            response = update_stats_item(
+                Key=key,
+                UpdateExpression=update_expression,
+                # Adding onto a legacy row would mix sums with averages, so migrate it first
+                ConditionExpression=f"(attribute_not_exists(numberOfGames) OR attribute_exists({SUMS_MARKER})) AND {NOT_YET_COUNTED}",
+                ExpressionAttributeValues=expression_values,
+                ReturnValues='UPDATED_NEW',
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
             )
-            
-            # Check if the player exists in the database
-            if 'Item' in response:
-                existing_item = response['Item']
-                existing_number_of_games = int(existing_item['numberOfGames']['N']) if 'numberOfGames' in existing_item else 0
-                total_games = existing_number_of_games + stats['numberOfGames']
-                updated_stats = {}
-                
-                # For each key, get existing stats from DynamoDB, calculate and round new values
-                for key in all_stat_keys:
-                    existing_value = float(existing_item[key]['N']) if key in existing_item else 0
-                    new_value = (existing_value * existing_number_of_games + stats[key] * stats['numberOfGames']) / total_games
-                    updated_stats[key] = round(new_value, 2)
-                
-                # Get max damage record
-                existing_damage_record = float(existing_item['damageDealtToChampionsRecord']['N']) if 'damageDealtToChampionsRecord' in existing_item else 0
-                updated_stats['damageDealtToChampionsRecord'] = round(max(damageRecord, existing_damage_record), 2)
-                
-                updated_stats['numberOfGames'] = total_games
-
-                # Update the item in DynamoDB
-                update_expression = "SET " + ", ".join(f"{key} = :{key}" for key in updated_stats)
-                expression_values = {f":{key}": {'N': str(round(value, 2))} for key, value in updated_stats.items()}
-
-                dynamodb.update_item(
-                    TableName='stats',  
-                    Key={'puuid': {'S': puuid}}, 
-                    UpdateExpression=update_expression,
-                    ExpressionAttributeValues=expression_values,
-                    ReturnValues="UPDATED_NEW"
-                )
-            else:
-                # If the player does not exist, create new items for them
-                item = {key: {'N': str(round(value, 2))} for key, value in stats.items()}
-                item['puuid'] = {'S': puuid}
-                item['numberOfGames'] = {'N': str(stats['numberOfGames'])}
-                
-                # Insert the new player record into DynamoDB
-                dynamodb.put_item(TableName='stats', Item=item)
-                
+            forget_old_chunks(STATS_TABLE, key, response)
+            break
         except ClientError as e:
-            print(f"Error processing player {puuid}: {e}")
+            if not is_conditional_check_failure(e):
+                raise
+            item = e.response.get('Item', {})
+            if is_counted(item, chunk_key):
+                count('chunks_already_counted')
+                break
+            migrate_legacy_row(puuid, item)
+    else:
+        raise RuntimeError(f"gave up migrating the row of {puuid} after {MAX_WRITE_RETRIES} attempts")
+
+    # Raising a record again is harmless, so a retry after the ADD went through only does this part
+    raise_records(STATS_TABLE, key, totals)
+
+
+def write_daily_stats(puuid, chunk_key, day_number, totals):
+    """Add a player's totals for one UTC day to that day's bucket, the same way as write_player_stats."""
+    key = {'puuid': {'S': puuid}, 'day': {'S': time.strftime('%Y-%m-%d', time.gmtime(day_number * SECONDS_PER_DAY))}}
+    update_expression, expression_values = add_totals_update(totals, chunk_key)
+    expression_values[':expiresAt'] = {'N': str((day_number + BUCKET_RETENTION_DAYS) * SECONDS_PER_DAY)}
+    try:
+        response = update_stats_item(
+            STATS_DAILY_TABLE,
+            Key=key,
+            UpdateExpression=update_expression + " SET expires_at = :expiresAt",
+            ConditionExpression=NOT_YET_COUNTED,
+            ExpressionAttributeValues=expression_values,
+            ReturnValues='UPDATED_NEW'
+        )
+        forget_old_chunks(STATS_DAILY_TABLE, key, response)
+    except ClientError as e:
+        if not is_conditional_check_failure(e):
+            raise
+        count('chunks_already_counted')
+    raise_records(STATS_DAILY_TABLE, key, totals)
+
+
+def is_processed(bucket, key):
+    """Whether a batch was already counted, e.g. when S3 delivers the same event twice."""
+    try:
+        tags = s3_client.get_object_tagging(Bucket=bucket, Key=key)['TagSet']
+    except ClientError as e:
+        log("batch tags unreadable", level="WARNING", key=key, error=str(e))
+        return False
+    return any(tag['Key'] == PROCESSED_TAG for tag in tags)
+
+
+def mark_processed(bucket, key):
+    """Tag a batch as counted; returns False if the tag could not be set."""
+    try:
+        s3_client.put_object_tagging(
+            Bucket=bucket, Key=key,
+            Tagging={'TagSet': [{'Key': PROCESSED_TAG, 'Value': str(int(time.time()))}]}
+        )
+    except ClientError as e:
+        log("batch could not be marked processed", level="ERROR", key=key, error=str(e))
+        return False
+    return True
+
+
+def get_write_executor():
+    """Writer threads, started on the first invocation and kept for warm ones."""
+    global write_executor
+    if write_executor is None:
+        write_executor = ThreadPoolExecutor(max_workers=WRITE_CONCURRENCY)
+    return write_executor
+
+
+def group_records(event):
+    """Group the S3 records of an event by the leaderboard their batch belongs to, as {name: [(bucket, key)]}."""
+    batches = {}
+    for record in event.get('Records', []):
+        bucket = record['s3']['bucket']['name']
+        # Object keys arrive URL-encoded in S3 notifications
+        key = unquote_plus(record['s3']['object']['key'])
+        if key.rsplit('/', 1)[-1] == MANIFEST_NAME:
+            continue
+        batches.setdefault(get_leaderboard_name(key), []).append((bucket, key))
+    return batches
+
+
+def lambda_handler(event, context):
+    log_context.clear()
+    log_context['request_id'] = getattr(context, 'aws_request_id', None)
+    invocation_counters.clear()
+
+    timings = {'download': 0.0, 'parse': 0.0}
+    batches = group_records(event)
+    log("invocation started", records=sum(len(objects) for objects in batches.values()), leaderboards=sorted(batches))
+    in_flight_entry = f"{int(time.time())}:{log_context['request_id'] or uuid.uuid4()}"
+    for leaderboard_name in batches:
+        set_in_flight(leaderboard_name, in_flight_entry, True)
+
+    try:
+        # Read every record before writing anything, so a failed download leaves no partial update
+        # behind for the retried invocation to add twice
+        aggregators = {}  # (chunk key, UTC day number) -> StatsAggregator of the chunk's games that ended that day
+        read = []
+        for leaderboard_name, objects in batches.items():
+            for srcBucket, srcKey in objects:
+                if is_processed(srcBucket, srcKey):
+                    count('batches_already_processed')
+                    continue
+                read.append((srcBucket, srcKey))
+                phase_start = time.perf_counter()
+                bucket_content = s3_client.get_object(Bucket=srcBucket, Key=srcKey)
+                timings['download'] += time.perf_counter() - phase_start
+                count('bytes_downloaded', bucket_content.get('ContentLength', 0))
+
+                # matches are streamed from the response body, one line at a time
+                phase_start = time.perf_counter()
+                for end_timestamp, participants in iter_match_participants(bucket_content['Body'], srcKey):
+                    day_number = end_timestamp // SECONDS_PER_DAY
+                    aggregator = aggregators.get((srcKey, day_number))
+                    if aggregator is None:
+                        aggregator = aggregators[srcKey, day_number] = StatsAggregator()
+                    for participant in participants:
+                        aggregator.add_participant(participant)
+                timings['parse'] += time.perf_counter() - phase_start
+
+        # sums, counts and maxima for every player in one pass per chunk and day
+        phase_start = time.perf_counter()
+        totals_by_chunk = {}  # (puuid, chunk key) -> all-time totals
+        daily_totals = []  # (puuid, chunk key, day number, totals) of the days that still have a bucket
+        oldest_bucket = int(time.time()) // SECONDS_PER_DAY - BUCKET_RETENTION_DAYS + 1
+        for (chunk_key, day_number), aggregator in aggregators.items():
+            for puuid, totals in aggregator.aggregate().items():
+                # Each chunk is written on its own, since rows record which chunks they have counted
+                previous = totals_by_chunk.get((puuid, chunk_key))
+                totals_by_chunk[puuid, chunk_key] = previous.merge(totals) if previous else totals
+                if day_number >= oldest_bucket:
+                    daily_totals.append((puuid, chunk_key, day_number, totals))
+        players = len({puuid for puuid, _ in totals_by_chunk})
+        timings['aggregate'] = time.perf_counter() - phase_start
+
+        def write(puuid, chunk_key, totals):
+            try:
+                write_player_stats(puuid, chunk_key, totals)
+                return True
+            except (ClientError, RuntimeError) as e:
+                count('players_failed')
+                log("player stats write failed", level="ERROR", puuid=puuid, key=chunk_key, error=str(e))
+                return False
+
+        def write_daily(puuid, chunk_key, day_number, totals):
+            try:
+                write_daily_stats(puuid, chunk_key, day_number, totals)
+                return True
+            except ClientError as e:
+                count('daily_buckets_failed')
+                log("daily stats write failed", level="ERROR", puuid=puuid, key=chunk_key, day_number=day_number, error=str(e))
+                return False
+
+        phase_start = time.perf_counter()
+        executor = get_write_executor()
+        pending = [(write, (puuid, chunk_key, totals)) for (puuid, chunk_key), totals in totals_by_chunk.items()]
+        pending += [(write_daily, bucket) for bucket in daily_totals]
+        for attempt in range(MAX_WRITE_RETRIES):
+            if attempt:
+                count('write_retries', len(pending))
+                time.sleep(0.1 * 2 ** attempt)
+            futures = [(task, executor.submit(task[0], *task[1])) for task in pending]
+            # Only the writes that failed are tried again; one whose ADD went through before it failed skips it
+            pending = [task for task, future in futures if not future.result()]
+            if not pending:
+                break
+        count('daily_buckets_written', len(daily_totals))
+        timings['write'] = time.perf_counter() - phase_start
+
+        if pending:
+            # The tag is the uploader's confirmation that every game was counted, so a partly written batch must
+            # not get it: the invocation fails and S3 retries it. The retry skips the writes that went through,
+            # since their rows already record the chunk.
+            log("batch not marked processed", level="ERROR", failed_writes=len(pending), keys=[key for _, key in read])
+            raise RuntimeError(f"{len(pending)} stats writes failed; the batch is left unprocessed for a retry")
+        # A tag that could not be set fails the invocation too: the retry finds every write applied and only tags
+        untagged = [srcKey for srcBucket, srcKey in read if not mark_processed(srcBucket, srcKey)]
+        if untagged:
+            raise RuntimeError(f"{len(untagged)} batches could not be marked processed; the invocation fails for a retry")
+    finally:
+        for leaderboard_name in batches:
+            set_in_flight(leaderboard_name, in_flight_entry, False)
+
+    timings = {phase: round(seconds, 4) for phase, seconds in timings.items()}
+    log("invocation finished", players=players, timings=timings, counters=dict(invocation_counters))
 
-    set_processing_flag(False)
-    
     return {
         'statusCode': 200,
-        'body': json.dumps('Player stats updated in DynamoDB!')
+        'body': json.dumps({
+            'message': 'Player stats updated in DynamoDB!',
+            'records': sum(len(objects) for objects in batches.values()),
+            'leaderboards': sorted(batches),
+            'players': players,
+            'timings': timings
+        })
     }
@@ -0,0 +1,150 @@
+from array import array
+
+# participant_stat_keys ignores puuid
+PARTICIPANT_STAT_KEYS = ['totalDamageDealtToChampions', 'totalDamageTaken', 'totalTimeSpentDead', 'wardsPlaced', 'goldEarned']
+CHALLENGES_STAT_KEYS = ['kda', 'soloKills', 'takedowns']
+CS_PER_MIN = 'csPerMin'
+DAMAGE_RECORD = 'damageDealtToChampionsRecord'
+NUMBER_OF_GAMES = 'numberOfGames'
+
+# Stats averaged over games, and stats kept as the best single game
+AVERAGED_STAT_KEYS = PARTICIPANT_STAT_KEYS + CHALLENGES_STAT_KEYS + [CS_PER_MIN]
+MAX_STAT_KEYS = {DAMAGE_RECORD: 'totalDamageDealtToChampions'}
+
+# Averaged stats are stored as running sums in '<stat>Sum' attributes next to numberOfGames
+SUM_SUFFIX = 'Sum'
+SUMS_MARKER = 'kda' + SUM_SUFFIX  # rows without it still hold rounded averages
+
+
+def sum_attribute(key):
+    return key + SUM_SUFFIX
+
+
+class PlayerTotals:
+    """Exact running totals for one player: games played, per-stat sums and per-stat maxima."""
+    __slots__ = ('number_of_games', 'sums', 'maxes')
+
+    def __init__(self, number_of_games=0, sums=None, maxes=None):
+        self.number_of_games = number_of_games
+        self.sums = sums or {key: 0.0 for key in AVERAGED_STAT_KEYS}
+        self.maxes = maxes or {key: 0.0 for key in MAX_STAT_KEYS}
+
+    def merge(self, other):
+        """Return the totals of both sets of games combined."""
+        return PlayerTotals(
+            self.number_of_games + other.number_of_games,
+            {key: self.sums.get(key, 0.0) + other.sums.get(key, 0.0) for key in AVERAGED_STAT_KEYS},
+            {key: max(self.maxes.get(key, 0.0), other.maxes.get(key, 0.0)) for key in MAX_STAT_KEYS},
+        )
+
+    def averages(self):
+        """Per-game averages of the summed stats, plus the maxima as-is."""
+        games = self.number_of_games
+        stats = {key: (self.sums[key] / games if games else 0.0) for key in AVERAGED_STAT_KEYS}
+        stats.update(self.maxes)
+        return stats
+
+
+def legacy_row_totals(item):
+    """Rebuild running totals from a stats row that still holds rounded averages (low-level item format)."""
+    number_of_games = int(item[NUMBER_OF_GAMES]['N']) if NUMBER_OF_GAMES in item else 0
+    sums = {key: float(item[key]['N']) * number_of_games if key in item else 0.0 for key in AVERAGED_STAT_KEYS}
+    maxes = {key: float(item[key]['N']) if key in item else 0.0 for key in MAX_STAT_KEYS}
+    return PlayerTotals(number_of_games, sums, maxes)
+
+
+def legacy_migration_update(item):
+    """UpdateItem arguments that add running sums to a legacy averages row.
+
+    The update is conditional on the row being unchanged since it was read, so it can run safely
+    alongside the stats Lambda.
+    """
+    totals = legacy_row_totals(item)
+    values = {f":{sum_attribute(key)}": {'N': repr(value)} for key, value in totals.sums.items()}
+    if NUMBER_OF_GAMES in item:
+        games_condition = "numberOfGames = :expectedGames"
+        values[':expectedGames'] = item[NUMBER_OF_GAMES]
+    else:
+        games_condition = "attribute_not_exists(numberOfGames)"
+    return {
+        'UpdateExpression': "SET " + ", ".join(f"{sum_attribute(key)} = :{sum_attribute(key)}" for key in totals.sums),
+        'ConditionExpression': f"attribute_not_exists({SUMS_MARKER}) AND {games_condition}",
+        'ExpressionAttributeValues': values,
+    }
+
+
+class StatsAggregator:
+    """Columnar per-player aggregation of match participants.
+
+    Participants are appended to flat typed buffers (a row index per participant and a row-major
+    block of stat values, one column per stat), then sums, counts and maxima for every player and
+    every stat are computed in a single vectorized pass once all matches have been read.
+    """
+    def __init__(self):
+        self.puuid_index = {}  # puuid -> row index
+        self.puuids = []
+        self.rows = array('l')
+        self.values = array('d')  # len(AVERAGED_STAT_KEYS) values per participant
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add_participant(self, participant):
+        """Record one participant's stats for one game."""
+        puuid = participant.get("puuid")
+        row = self.puuid_index.get(puuid)
+        if row is None:
+            row = self.puuid_index[puuid] = len(self.puuids)
+            self.puuids.append(puuid)
+        self.rows.append(row)
+
+        # Values must follow the order of AVERAGED_STAT_KEYS
+        challenges = participant.get("challenges", {})
+        time_played = participant.get("timePlayed") or 1
+        get = participant.get
+        self.values.extend((
+            get('totalDamageDealtToChampions') or 0,
+            get('totalDamageTaken') or 0,
+            get('totalTimeSpentDead') or 0,
+            get('wardsPlaced') or 0,
+            get('goldEarned') or 0,
+            challenges.get('kda') or 0,
+            challenges.get('soloKills') or 0,
+            challenges.get('takedowns') or 0,
+            (get('totalMinionsKilled') or 0) / time_played * 60,
+        ))
+
+    def aggregate(self):
+        """Return {puuid: PlayerTotals} for every player seen."""
+        if not self.rows:
+            return {}
+        # Imported on first use: NumPy is the bulk of the stats Lambda's cold-start import time
+        import numpy as np
+        rows = np.frombuffer(self.rows, dtype=np.dtype('l'))
+        n_players = len(self.puuids)
+        values = np.frombuffer(self.values, dtype=np.float64).reshape(len(rows), len(AVERAGED_STAT_KEYS))
+        counts = np.bincount(rows, minlength=n_players)
+        sums = {
+            key: np.bincount(rows, weights=values[:, column], minlength=n_players)
+            for column, key in enumerate(AVERAGED_STAT_KEYS)
+        }
+
+        # Maxima per player: sort rows into contiguous groups, then reduce each group
+        order = np.argsort(rows, kind='stable')
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        maxes = {
+            key: np.maximum.reduceat(values[order, AVERAGED_STAT_KEYS.index(source)], starts)
+            for key, source in MAX_STAT_KEYS.items()
+        }
+
+        sums_lists = {key: column.tolist() for key, column in sums.items()}
+        maxes_lists = {key: column.tolist() for key, column in maxes.items()}
+        counts_list = counts.tolist()
+        return {
+            puuid: PlayerTotals(
+                counts_list[i],
+                {key: column[i] for key, column in sums_lists.items()},
+                {key: column[i] for key, column in maxes_lists.items()},
+            )
+            for i, puuid in enumerate(self.puuids)
+        }
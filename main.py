@@ -1,10 +1,15 @@
+import argparse
 import asyncio
 from api.riot_api import RiotAPI
 from db.dynamo import DynamoClient
-from services.leaderboard_service import LeaderboardService
+from services.leaderboard_service import LeaderboardService, parse_riot_ids
+from services.refresh_scheduler import RefreshLease, RefreshScheduler
 from db.db_constants import DynamoDBTables
 from dotenv import load_dotenv
+import os
 import re
+import socket
+import sys
 
 # Menu Options Constants
 MENU_OPTIONS = {
@@ -34,6 +39,45 @@ def display_metrics() -> None:
     for key, (name, _) in METRICS.items():
         print(f"{key}. {name}")
         
+def display_leaderboard(leaderboard: list[dict]) -> None:
+    if not leaderboard:
+        print("No statistics to show")
+        return
+
+    # Find the longest player name for consistent formatting
+    longest_name_length = max(len(f"{row['game_name']}#{row['tag_line']}") for row in leaderboard)
+
+    # Column widths for consistent formatting
+    long_width = 17
+    medium_width = 10
+    short_width = 5
+
+    # Display leaderboard header
+    print(
+        f"{'Player':<{longest_name_length + 4}} | "
+        f"{'KDA':<{short_width}} | "
+        f"{'CS/min':<{medium_width}} | "
+        f"{'Damage Record':<{long_width}} | "
+        f"{'AVG Damage':<{medium_width}} | "
+        f"{'AVG Gold':<{medium_width}} | "
+        f"{'AVG Time Dead (s)':<{long_width}} | "
+    )
+    print("-" * (longest_name_length + 4 + short_width + medium_width + long_width + medium_width + medium_width + long_width + 20))
+
+    # Display leaderboard rows
+    for count, row in enumerate(leaderboard, start=1):
+        name = f"{row['game_name']}#{row['tag_line']}"
+        name_width = longest_name_length + 1 if count < 10 else longest_name_length
+        print(
+            f"{count}) {name:<{name_width}} | "
+            f"{round(row['kda'], 2):<{short_width}} | "
+            f"{round(row['cs_per_min'], 2):<{medium_width}} | "
+            f"{round(row['damage_record'], 0):<{long_width}} | "
+            f"{round(row['avg_damage'], 0):<{medium_width}} | "
+            f"{round(row['avg_gold'], 0):<{medium_width}} | "
+            f"{round(row['avg_time_dead'], 0):<{long_width}} | "
+        )
+
 def validate_name_input(game_name: str) -> bool:
     """
     Validate nput for game name.
@@ -84,7 +128,7 @@ async def handle_view_leaderboard(leaderboard_service: LeaderboardService, db: D
 
     try:
         print("\n--- Leaderboard ---")
-        leaderboard_service.view_leaderboard(metric_to_sort)
+        display_leaderboard(await leaderboard_service.view_leaderboard(metric_to_sort))
     except Exception as e:
         print(f"An error occurred while fetching the leaderboard: {e}")
 
@@ -106,7 +150,10 @@ async def handle_add_player(leaderboard_service: LeaderboardService) -> None:
         return
 
     try:
-        print(await leaderboard_service.add_player(game_name, tag_line))
+        message, player = await leaderboard_service.register_player(game_name, tag_line)
+        print(message)
+        if player is not None:
+            await run_crawl(leaderboard_service, lambda: leaderboard_service.combine_matches([player.puuid]))
     except Exception as e:
         print(f"An error occurred while adding the player: {e}")
 
@@ -132,17 +179,57 @@ async def handle_remove_player(leaderboard_service: LeaderboardService) -> None:
 
 async def handle_update_leaderboard(leaderboard_service: LeaderboardService) -> None:
     try:
-        await leaderboard_service.combine_matches()
+        await run_crawl(leaderboard_service, leaderboard_service.combine_matches)
     except Exception as e:
         print(f"An error occurred while updating the leaderboard: {e}")
 
+async def handle_import_players(leaderboard_service: LeaderboardService, path: str) -> None:
+    if path == "-":
+        text = sys.stdin.read()
+    else:
+        with open(path, newline="") as f:
+            text = f.read()
+
+    summary = await leaderboard_service.import_players(parse_riot_ids(text), backfill=False)
+    print(f"Added {len(summary['added'])} players: {', '.join(summary['added']) or '-'}")
+    for key, label in (("duplicates", "Already on the leaderboard"), ("not_found", "Not found"), ("invalid", "Not a name#tag")):
+        if summary[key]:
+            print(f"{label}: {', '.join(summary[key])}")
+    if summary["puuids"]:
+        puuids = summary["puuids"]
+        await run_crawl(leaderboard_service, lambda: leaderboard_service.combine_matches(puuids, puuids=puuids))
+
+async def run_crawl(leaderboard_service: LeaderboardService, crawl) -> bool:
+    """Run a crawl under the refresh lease the web app's scheduler uses; skip it while another process holds the lease."""
+    lease_duration = int(os.getenv("REFRESH_LEASE_SECONDS", RefreshScheduler.default_lease_duration))
+    lease = RefreshLease(leaderboard_service.db, f"cli:{socket.gethostname()}:{os.getpid()}", lease_duration)
+    if not await asyncio.to_thread(lease.acquire):
+        print("Another process is refreshing the leaderboards. Matches were not fetched; update the leaderboard once it finishes.")
+        return False
+    try:
+        await lease.hold_while(crawl())
+        return True
+    finally:
+        await asyncio.to_thread(lease.release)
+
 async def main() -> None:
+    parser = argparse.ArgumentParser(description="Leaderboard Manager")
+    parser.add_argument("--leaderboard", default=DynamoDBTables.PlayersTable.DEFAULT_LEADERBOARD,
+                        help="name of the leaderboard to manage")
+    parser.add_argument("--import-players", metavar="FILE",
+                        help="add every name#tag in a CSV or text file ('-' for stdin) and exit")
+    args = parser.parse_args()
+
     load_dotenv()
     db = DynamoClient()
     riot_api = RiotAPI()
-    leaderboard_name = "main_table"
+    leaderboard_name = args.leaderboard
     leaderboard_service = LeaderboardService(leaderboard_name, riot_api, db)
 
+    if args.import_players:
+        await handle_import_players(leaderboard_service, args.import_players)
+        return
+
     while True:
         display_menu()
         choice = get_input("Choose an option: ")
@@ -1,8 +1,18 @@
 # models/player.py
 from dataclasses import dataclass
 
-@dataclass
+
+def normalize_riot_id(game_name, tag_line):
+    """Riot IDs are case-insensitive, so compare them by one normalized "name#tag" key."""
+    return f"{game_name.strip().casefold()}#{tag_line.strip().casefold()}"
+
+
+@dataclass(slots=True)
 class Player:
     game_name: str
     tag_line: str
-    puuid: str
\ No newline at end of file
+    puuid: str
+
+    @property
+    def riot_id_key(self):
+        return normalize_riot_id(self.game_name, self.tag_line)
@@ -0,0 +1,55 @@
+# models/roster.py
+from models.player import normalize_riot_id
+
+
+class Roster(dict):
+    """A leaderboard's players keyed by puuid, and also indexed by normalized Riot ID.
+
+    The methods that change the roster are overridden so both indexes always hold the same players,
+    which makes duplicate checks and name lookups O(1).
+    """
+    def __init__(self, players=()):
+        super().__init__()
+        self.by_riot_id = {}
+        self.update(players)
+
+    def __setitem__(self, puuid, player):
+        old = self.get(puuid)
+        if old is not None:
+            self.by_riot_id.pop(old.riot_id_key, None)
+        super().__setitem__(puuid, player)
+        self.by_riot_id[player.riot_id_key] = player
+
+    def __delitem__(self, puuid):
+        player = self[puuid]
+        super().__delitem__(puuid)
+        self.by_riot_id.pop(player.riot_id_key, None)
+
+    def pop(self, puuid, *default):
+        if puuid not in self:
+            return super().pop(puuid, *default)
+        player = self[puuid]
+        del self[puuid]
+        return player
+
+    def update(self, players=(), **kwargs):
+        for puuid, player in (players.items() if hasattr(players, "items") else players):
+            self[puuid] = player
+
+    def setdefault(self, puuid, player=None):
+        if puuid not in self:
+            self[puuid] = player
+        return self[puuid]
+
+    def popitem(self):
+        puuid, player = super().popitem()
+        self.by_riot_id.pop(player.riot_id_key, None)
+        return puuid, player
+
+    def clear(self):
+        super().clear()
+        self.by_riot_id.clear()
+
+    def find(self, game_name, tag_line):
+        """The player with this Riot ID, in any letter case, or None."""
+        return self.by_riot_id.get(normalize_riot_id(game_name, tag_line))
@@ -0,0 +1,53 @@
+import sqlite3
+import threading
+import time
+from models.player import Player, normalize_riot_id
+
+
+class AccountCache:
+    """SQLite store of resolved Riot accounts (Riot ID <-> puuid).
+
+    A Riot ID can be renamed or passed on, so a mapping is only trusted for `ttl` seconds after it
+    was resolved; after that the account is looked up again.
+    """
+    default_ttl = 7 * 24 * 60 * 60  # Seconds a resolved Riot ID is reused
+
+    def __init__(self, db_path, ttl=None, clock=time.time):
+        self.ttl = ttl or AccountCache.default_ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS accounts ("
+            "riot_id TEXT PRIMARY KEY, puuid TEXT NOT NULL, game_name TEXT NOT NULL, tag_line TEXT NOT NULL, "
+            "resolved_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS accounts_puuid ON accounts (puuid)")
+
+    def get(self, game_name, tag_line):
+        """Return the cached Player for a Riot ID, or None if it is unknown or expired."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT game_name, tag_line, puuid FROM accounts WHERE riot_id = ? AND resolved_at >= ?",
+                (normalize_riot_id(game_name, tag_line), self.clock() - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return Player(*row)
+
+    def put(self, player):
+        """Remember a resolved account; an older Riot ID of the same account is dropped."""
+        with self.lock:
+            self.conn.execute("DELETE FROM accounts WHERE puuid = ?", (player.puuid,))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO accounts (riot_id, puuid, game_name, tag_line, resolved_at) VALUES (?, ?, ?, ?, ?)",
+                (player.riot_id_key, player.puuid, player.game_name, player.tag_line, self.clock())
+            )
+
+    def close(self):
+        self.conn.close()
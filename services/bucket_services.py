@@ -1,14 +1,46 @@
 import os
+import asyncio
+import functools
+import threading
 import boto3
 import logging
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 load_dotenv()
 
 class BucketService:
+    default_pool_size = 10  # Connections to S3 (and worker threads for async callers)
+    PROCESSED_TAG = "stats-processed"  # Set by the stats Lambda on batches it has counted
+    min_part_bytes = 5 * 1024 * 1024  # S3 rejects multipart parts smaller than this, except the last
+    # A batch chunk (BATCH_CHUNK_BYTES of JSON, gzipped) is normally smaller than one part, so it goes up in a single
+    # PUT and chunks are uploaded concurrently instead. Only a chunk that compresses to more than one part is split,
+    # into parts of the smallest size so that as many of them as possible are uploaded at once.
+    transfer_config = TransferConfig(multipart_threshold=min_part_bytes, multipart_chunksize=min_part_bytes, max_concurrency=4)
+
+    # One client and pool per process: clients are thread-safe and expensive to create
+    _client = None
+    _executor = None
+    _lock = threading.Lock()
+
     def __init__(self):
         self.bucket_name = os.getenv("BUCKET_NAME")
+        self.pool_size = int(os.getenv("AWS_POOL_SIZE", BucketService.default_pool_size))
+        with BucketService._lock:
+            if BucketService._executor is None:
+                BucketService._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="s3")
+
+    @property
+    def s3_client(self):
+        """The process's S3 client, created on first use so that constructing the service costs nothing"""
+        if BucketService._client is None:
+            with BucketService._lock:
+                if BucketService._client is None:
+                    BucketService._client = boto3.client('s3', config=Config(max_pool_connections=self.pool_size))
+        return BucketService._client
 
     def upload_file(self, file_name, object_name=None):
         """Upload a file to an S3 bucket
@@ -20,11 +52,56 @@ class BucketService:
         if object_name is None:
             object_name = os.path.basename(file_name)
         # Upload the file
-        s3_client = boto3.client('s3')
         try:
-            s3_client.upload_file(file_name, self.bucket_name, object_name)
-            print(f"Please wait a moment for the leaderboard to update.")
+            self.s3_client.upload_file(file_name, self.bucket_name, object_name, Config=BucketService.transfer_config)
+        except ClientError as e:
+            logging.error(e)
+            return False
+        return True
+
+    def put_object(self, object_name, body):
+        """Write a small object, e.g. a batch manifest
+        :return: True if the object was written, else False
+        """
+        try:
+            self.s3_client.put_object(Bucket=self.bucket_name, Key=object_name, Body=body)
         except ClientError as e:
             logging.error(e)
             return False
         return True
+
+    def object_exists(self, object_name):
+        """Check whether an object is in the bucket"""
+        try:
+            self.s3_client.head_object(Bucket=self.bucket_name, Key=object_name)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+        return True
+
+    def is_processed(self, object_name):
+        """Check whether the stats Lambda has tagged a batch as counted"""
+        try:
+            tags = self.s3_client.get_object_tagging(Bucket=self.bucket_name, Key=object_name)['TagSet']
+        except ClientError as e:
+            logging.error(e)
+            return False
+        return any(tag['Key'] == BucketService.PROCESSED_TAG for tag in tags)
+
+    async def _run_async(self, func, *args):
+        """Run a blocking S3 call on the S3 pool without stalling the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(BucketService._executor, functools.partial(func, *args))
+
+    async def upload_file_async(self, file_name, object_name=None):
+        return await self._run_async(self.upload_file, file_name, object_name)
+
+    async def put_object_async(self, object_name, body):
+        return await self._run_async(self.put_object, object_name, body)
+
+    async def object_exists_async(self, object_name):
+        return await self._run_async(self.object_exists, object_name)
+
+    async def is_processed_async(self, object_name):
+        return await self._run_async(self.is_processed, object_name)
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+import time
+
+
+class LeaderboardCache:
+    """In-process read-through cache of the assembled leaderboard.
+
+    Holds one snapshot (the leaderboard sorted on every metric, e.g. a LeaderboardIndex) that is rebuilt on a miss, when
+    it is older than `ttl` seconds, or after `invalidate()`. Concurrent misses share a single rebuild.
+    """
+    default_ttl = 60  # Seconds a snapshot is served before it is rebuilt
+
+    def __init__(self, ttl=None, clock=time.monotonic):
+        self.ttl = ttl or LeaderboardCache.default_ttl
+        self.clock = clock
+        self.snapshot = None
+        self.built_at = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def is_fresh(self):
+        return self.snapshot is not None and self.clock() - self.built_at < self.ttl
+
+    def get(self, build):
+        """Return the cached snapshot, calling `build()` to replace it if it is missing or stale."""
+        if self.is_fresh():
+            self.hits += 1
+            return self.snapshot
+        with self.lock:
+            # Another thread may have rebuilt the snapshot while this one waited
+            if self.is_fresh():
+                self.hits += 1
+                return self.snapshot
+            self.misses += 1
+            snapshot = build()
+            self.snapshot, self.built_at = snapshot, self.clock()
+            return snapshot
+
+    async def get_async(self, build):
+        """Like `get`, for a coroutine `build`; waiting on a rebuild in another thread does not block the event loop."""
+        if self.is_fresh():
+            self.hits += 1
+            return self.snapshot
+        await asyncio.to_thread(self.lock.acquire)
+        try:
+            if self.is_fresh():
+                self.hits += 1
+                return self.snapshot
+            self.misses += 1
+            snapshot = await build()
+            self.snapshot, self.built_at = snapshot, self.clock()
+            return snapshot
+        finally:
+            self.lock.release()
+
+    def preload(self, snapshot, age):
+        """Start from a snapshot built `age` seconds ago elsewhere, e.g. one restored from disk."""
+        self.snapshot, self.built_at = snapshot, self.clock() - age
+
+    def invalidate(self):
+        self.snapshot = None
+
+    def age(self):
+        """Seconds since the current snapshot was built, or None if there is none."""
+        return None if self.snapshot is None else self.clock() - self.built_at
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "age": self.age(),
+        }
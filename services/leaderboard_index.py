@@ -0,0 +1,80 @@
+import threading
+from bisect import bisect_left, insort
+
+
+class LeaderboardIndex:
+    """Leaderboard rows kept sorted on every metric, updated row by row.
+
+    Each metric has a list of (-value, puuid) keys in rank order, so a page is a slice of that list and a
+    player's rank is a binary search for their key. `sync` applies a fresh set of rows by touching only the
+    players whose stats changed, joined or left. `version` goes up with every change, so anything derived
+    from the index (e.g. a rendered page) can tell whether it is still current.
+    """
+    def __init__(self, metric_fields):
+        self.metric_fields = dict(metric_fields)  # metric -> row field it is ranked on
+        self.rows = {}                            # puuid -> row
+        self.keys = {metric: [] for metric in self.metric_fields}
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _key(self, row, field):
+        return (-row[field], row["puuid"])
+
+    def _unlink(self, row):
+        for metric, field in self.metric_fields.items():
+            keys = self.keys[metric]
+            del keys[bisect_left(keys, self._key(row, field))]
+
+    def _link(self, row):
+        for metric, field in self.metric_fields.items():
+            insort(self.keys[metric], self._key(row, field))
+
+    def upsert(self, row):
+        with self.lock:
+            old = self.rows.get(row["puuid"])
+            if old == row:
+                return False
+            if old is not None:
+                self._unlink(old)
+            self.rows[row["puuid"]] = row
+            self._link(row)
+            self.version += 1
+            return True
+
+    def remove(self, puuid):
+        with self.lock:
+            row = self.rows.pop(puuid, None)
+            if row is not None:
+                self._unlink(row)
+                self.version += 1
+            return row is not None
+
+    def sync(self, rows):
+        """Make the index hold exactly `rows`; returns the number of players added, changed or removed."""
+        rows = {row["puuid"]: row for row in rows}
+        changed = sum(self.remove(puuid) for puuid in set(self.rows) - set(rows))
+        changed += sum(self.upsert(row) for row in rows.values())
+        return changed
+
+    def page(self, metric, offset=0, limit=None):
+        """Rows ranked `offset` to `offset + limit` on a metric, best first."""
+        with self.lock:
+            keys = self.keys[metric]
+            end = len(keys) if limit is None else offset + limit
+            return [self.rows[puuid] for _, puuid in keys[offset:end]]
+
+    def get(self, puuid):
+        """A player's row, or None if they are not on the leaderboard."""
+        with self.lock:
+            return self.rows.get(puuid)
+
+    def rank(self, metric, puuid):
+        """A player's zero-based rank on a metric, or None if they are not on the leaderboard."""
+        with self.lock:
+            row = self.rows.get(puuid)
+            if row is None:
+                return None
+            return bisect_left(self.keys[metric], self._key(row, self.metric_fields[metric]))
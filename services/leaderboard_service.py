@@ -1,143 +1,357 @@
 
-from models.player import Player
+from models.player import Player, normalize_riot_id
 from services.bucket_services import BucketService
+from services.match_cache import MatchCache
+from services.account_cache import AccountCache
+from services.watermarks import WatermarkStore
+from services.match_batch import ChunkedMatchBatchWriter, project_match
+from services.leaderboard_cache import LeaderboardCache
+from services.leaderboard_index import LeaderboardIndex
+from services.refresh_checkpoint import RefreshCheckpoint
+from services.metrics import REGISTRY
 from db.db_constants import DynamoDBTables
 import asyncio
+import csv
+import io
 import json
 import pickle
+import threading
 import time
 import os
 import traceback
+import uuid
+
+refresh_seconds = REGISTRY.histogram("refresh_seconds", "Wall-clock time of leaderboard refreshes", ("leaderboard",))
+refresh_matches_total = REGISTRY.counter(
+    "refresh_matches_total",
+    "Matches handled by refreshes: uploaded, served from the match cache or a resumed checkpoint, or skipped because their players failed",
+    ("leaderboard", "outcome"),
+)
+refresh_players_total = REGISTRY.counter("refresh_players_total", "Players refreshed, by outcome", ("leaderboard", "outcome"))
+refresh_stuck_batches_total = REGISTRY.counter(
+    "refresh_stuck_batches_total",
+    "Refreshes held up by a batch the stats Lambda still had not confirmed after every resend",
+    ("leaderboard",),
+)
+
+def parse_riot_ids(text):
+    """Read "name#tag" Riot IDs from CSV or plain text, one or more per line; blank cells are skipped."""
+    return [cell.strip() for row in csv.reader(io.StringIO(text)) for cell in row if cell.strip()]
+
 
 class LeaderboardService:
-    def __init__(self, leaderboard_name, riot_api, db):
+    default_max_concurrency = 10  # Max Riot API requests in flight during a refresh
+    processing_check_interval = 5 # Seconds between checks of the stats Lambda's processing flag
+    roster_ttl = 30               # Seconds before the in-memory roster is reloaded from DynamoDB
+    match_page_size = 100         # Max match ids Riot returns per listing call
+    backfill_match_count = 20     # Recent matches fetched for a player without a watermark
+    default_stats_confirm_timeout = 120  # Seconds a refresh waits for the stats Lambda to confirm its batch
+    default_stats_resend_interval = 900  # Seconds before chunks the stats Lambda has not confirmed are uploaded again
+    default_stats_max_resends = 3        # Uploads again before an unconfirmed batch is reported as stuck
+    default_batch_chunk_bytes = 4 * 1024 * 1024  # Uncompressed JSON per uploaded chunk, and so per Lambda invocation
+    manifest_name = "manifest.json"      # Lists a batch's chunks; the stats Lambda ignores it
+    # Leaderboard row field each sortable metric is read from
+    metric_fields = {
+        DynamoDBTables.StatsTable.KDA: "kda",
+        DynamoDBTables.StatsTable.CS_PER_MIN: "cs_per_min",
+        DynamoDBTables.StatsTable.DAMAGE_RECORD: "damage_record",
+        DynamoDBTables.StatsTable.AVERAGE_DAMAGE_DEALT_TO_CHAMPIONS: "avg_damage",
+        DynamoDBTables.StatsTable.AVERAGE_GOLD_EARNED: "avg_gold",
+        DynamoDBTables.StatsTable.AVERAGE_TIME_SPENT_DEAD: "avg_time_dead",
+    }
+
+    # Rolling windows the leaderboard can be ranked over, in UTC days including today
+    windows = {"1d": 1, "7d": 7, "30d": 30}
+
+    def __init__(self, leaderboard_name, riot_api, db, max_concurrency=None, match_cache=None, leaderboard_cache=None, watermarks=None,
+                 account_cache=None):
         self.riot_api = riot_api
         self.db = db
-        self.leaderboard = self.db.get_all_players()
+        self.leaderboard_name = leaderboard_name
+        # The roster is loaded on first use, so constructing the service never waits on DynamoDB
+        self._leaderboard = None
+        self.roster_loaded_at = float("-inf")
         self.ec2_volume = "/app/data/"
-        self.combined_json = "combined.json"
-        self.latest_update_time = "last_update_time"
+        self.refresh_checkpoint = f"{leaderboard_name}_refresh_checkpoint.jsonl"
+        self.leaderboard_snapshot = f"{leaderboard_name}_leaderboard_snapshot.json"
+        self.latest_update_time = f"{leaderboard_name}_last_update_time"
+        # Written by releases with a single leaderboard, which is now the default one
+        self.legacy_latest_update_time = "last_update_time" if leaderboard_name == DynamoDBTables.PlayersTable.DEFAULT_LEADERBOARD else None
+        self.match_cache_db = "match_cache.db"
+        self.account_cache_db = "account_cache.db"
+        self.watermarks_json = "watermarks.json"
         self.update_lock = asyncio.Lock()  # Lock for single-process control
+        self.refresh_lock = threading.Lock()  # Refreshes of a leaderboard share its checkpoint, so they take turns
+        self.batch_chunk_bytes = int(os.getenv("BATCH_CHUNK_BYTES", LeaderboardService.default_batch_chunk_bytes))
+        self.stats_confirm_timeout = int(os.getenv("STATS_CONFIRM_TIMEOUT", LeaderboardService.default_stats_confirm_timeout))
+        self.stats_resend_interval = int(os.getenv("STATS_RESEND_INTERVAL", LeaderboardService.default_stats_resend_interval))
+        self.stats_max_resends = int(os.getenv("STATS_MAX_RESENDS", LeaderboardService.default_stats_max_resends))
         self.cooldown = 120  # Cooldown period in seconds
-        self.leaderboard_name = leaderboard_name
+        self.max_concurrency = max_concurrency or int(os.getenv("REFRESH_MAX_CONCURRENCY", LeaderboardService.default_max_concurrency))
+        self.last_refresh_report = None
+        self.bucket_service = BucketService()
+        # Match history and accounts are per player, so watermarks and both caches can be shared between leaderboards
+        self.watermarks = watermarks or WatermarkStore(self.get_file_path(self.watermarks_json))
+        self.match_cache = match_cache or MatchCache(
+            self.get_file_path(self.match_cache_db),
+            int(os.getenv("MATCH_CACHE_MAX_BYTES", MatchCache.default_max_bytes))
+        )
+        self.account_cache = account_cache or AccountCache(
+            self.get_file_path(self.account_cache_db),
+            int(os.getenv("ACCOUNT_CACHE_TTL", AccountCache.default_ttl))
+        )
+        self.leaderboard_cache = leaderboard_cache or LeaderboardCache(
+            int(os.getenv("LEADERBOARD_CACHE_TTL", LeaderboardCache.default_ttl))
+        )
+        self.leaderboard_index = LeaderboardIndex(LeaderboardService.metric_fields)
+        self.window_views = {}  # window -> (LeaderboardCache, LeaderboardIndex), created on first use
+        self._processing = None
+        self._processing_checked_at = float("-inf")
+        self.revalidating = False
+        self.revalidate_lock = threading.Lock()
+        self.snapshot_restored = self._restore_leaderboard_snapshot()
+
+    @property
+    def leaderboard(self):
+        if self._leaderboard is None:
+            self.refresh_roster(force=True)
+        return self._leaderboard
+
+    @leaderboard.setter
+    def leaderboard(self, roster):
+        self._leaderboard = roster
+
+    def refresh_roster(self, force=False):
+        """Reload the players from DynamoDB if the in-memory roster is older than the roster TTL.
+
+        The roster is kept coherent with this process's own adds and removes, so the reload only
+        exists to pick up changes made by other processes.
+        """
+        if force or time.monotonic() - self.roster_loaded_at >= LeaderboardService.roster_ttl:
+            self.leaderboard = self.db.get_all_players(self.leaderboard_name)
+            self.roster_loaded_at = time.monotonic()
+        return self.leaderboard
 
     def is_leaderboard_empty(self):
-        self.leaderboard = self.db.get_all_players()
-        return not self.leaderboard
-
-    def view_leaderboard(self, metric_to_sort):
-        """Query database for calculated statistics and display based on specified order"""
-        data = self.db.get_all_player_stats_from_dynamodb()
-
-        if not data or len(data) == 0:
-            print("No statistics to show")
-            return []
-
-        sort_idx = self._get_sort_index(metric_to_sort)
-        if sort_idx == -1:
-            print("Sorting on incorrect metric")
+        return not self.refresh_roster()
+
+    async def refresh_roster_async(self, force=False):
+        """`refresh_roster` without blocking the event loop on DynamoDB"""
+        if force or time.monotonic() - self.roster_loaded_at >= LeaderboardService.roster_ttl:
+            self.leaderboard = await self.db.get_all_players_async(self.leaderboard_name)
+            self.roster_loaded_at = time.monotonic()
+        return self.leaderboard
+
+    async def view_leaderboard(self, metric_to_sort, window=None):
+        """Get the leaderboard sorted on the specified metric, all-time or over a rolling window, served from the leaderboard cache"""
+        if metric_to_sort not in LeaderboardService.metric_fields or not self._is_window(window):
             return []
-        
-        sorted_data = self._sort_data(data, sort_idx)
+        return (await self._get_leaderboard_index(window)).page(metric_to_sort)
 
-        # Find the longest player name for consistent formatting
-        longest_name_length = max(
-            len(f"{self.leaderboard.get(item[0]).game_name}#{self.leaderboard.get(item[0]).tag_line}")
-            for item in sorted_data if self.leaderboard.get(item[0])
-        )
+    async def leaderboard_page(self, metric_to_sort, offset=0, limit=None, window=None):
+        """One page of the leaderboard sorted on a metric, and the number of ranked players, or None for an unknown metric or window"""
+        if metric_to_sort not in LeaderboardService.metric_fields or not self._is_window(window):
+            return None
+        index = await self._get_leaderboard_index(window)
+        return index.page(metric_to_sort, offset, limit), len(index)
 
-        count = 1
-        # Column widths for consistent formatting
-        long_width = 17
-        medium_width = 10
-        short_width = 5
+    async def leaderboard_version(self, window=None):
+        """The version of the leaderboard's index, after syncing it with DynamoDB if its cache missed; it changes whenever the ranking does"""
+        if not self._is_window(window):
+            return None
+        return (await self._get_leaderboard_index(window)).version
 
-        # ============================= Display leaderboard in CLI =============================
-        # Display leaderboard header
-        print(
-            f"{'Player':<{longest_name_length + 4}} | "
-            f"{'KDA':<{short_width}} | "
-            f"{'CS/min':<{medium_width}} | "
-            f"{'Damage Record':<{long_width}} | "
-            f"{'AVG Damage':<{medium_width}} | "
-            f"{'AVG Gold':<{medium_width}} | "
-            f"{'AVG Time Dead (s)':<{long_width}} | "
-        )
-        print("-" * (longest_name_length + 4 + short_width + medium_width + long_width + medium_width + medium_width + long_width + 20))
+    async def player_rank(self, puuid, metric_to_sort, window=None):
+        """A player's zero-based rank on a metric, or None if they are unranked or the metric or window is unknown"""
+        if metric_to_sort not in LeaderboardService.metric_fields or not self._is_window(window):
+            return None
+        return (await self._get_leaderboard_index(window)).rank(metric_to_sort, puuid)
 
-        # Display leaderboard rows
-        leaderboard = []
-        for puuid, kda, cs, damage_record, avg_dmg, avg_gold, avg_dead in sorted_data:
-            player = self.leaderboard.get(puuid)
+    async def player_row(self, puuid, window=None):
+        """A player's leaderboard row, or None if they are unranked or the window is unknown"""
+        if not self._is_window(window):
+            return None
+        return (await self._get_leaderboard_index(window)).get(puuid)
+
+    def snapshot_age(self, window=None):
+        """Seconds since the window's leaderboard was last rebuilt, or None if it has not been built"""
+        cache, _ = self._get_view(window)
+        return cache.age()
+
+    def _is_window(self, window):
+        return window is None or window in LeaderboardService.windows
+
+    def _get_view(self, window):
+        """The cache and index a window's leaderboard is served from; window None is all-time."""
+        if window is None:
+            return self.leaderboard_cache, self.leaderboard_index
+        view = self.window_views.get(window)
+        if view is None:
+            view = self.window_views.setdefault(window, (
+                LeaderboardCache(self.leaderboard_cache.ttl), LeaderboardIndex(LeaderboardService.metric_fields)
+            ))
+        return view
+
+    def _views(self):
+        return [self._get_view(None)] + list(self.window_views.values())
+
+    def _invalidate_views(self):
+        for cache, _ in self._views():
+            cache.invalidate()
+
+    def _remove_from_views(self, puuid):
+        for _, index in self._views():
+            index.remove(puuid)
+
+    async def _get_leaderboard_index(self, window=None):
+        """The leaderboard index of a window, synced with DynamoDB when its cache misses
+
+        The processing flag and the roster are read concurrently, then every chunk of stats at once.
+        """
+        cache, index = self._get_view(window)
+        if window is None and self.snapshot_restored and cache.snapshot is not None:
+            # A fresh process serves the leaderboard it restored from disk at once and rebuilds it in the background
+            self._revalidate_in_background()
+            return index
+        # A rebuild will need the roster, so load it while the processing flag is read
+        roster = asyncio.create_task(self.refresh_roster_async()) if not cache.is_fresh() else None
+        await self._check_processing_finished()
+        if roster is not None:
+            await roster
+        return await cache.get_async(lambda: self._build_leaderboard_snapshot(window))
+
+    async def _check_processing_finished(self):
+        """Invalidate the leaderboard caches when the stats Lambda finishes, polling the flag at most every few seconds"""
+        now = time.monotonic()
+        if now - self._processing_checked_at < LeaderboardService.processing_check_interval:
+            return
+        self._processing_checked_at = now
+        processing = await self.db.check_processing_status_async(self.leaderboard_name)
+        if self._processing and processing is False:
+            self._invalidate_views()
+        self._processing = processing
+
+    async def _build_leaderboard_snapshot(self, window=None):
+        """Query database for calculated statistics and apply them to the window's sorted index; only changed rows are re-sorted"""
+        puuids = list((await self.refresh_roster_async()).keys())
+        if window is None:
+            data = await self.db.get_player_stats_async(puuids) or []
+        else:
+            data = self._merge_daily_buckets(await self.db.get_player_daily_stats_async(puuids, self._window_days(window)) or [])
 
+        rows = []
+        for item in data:
+            player = self.leaderboard.get(item["puuid"])
             if player:  # Ensure player exists
-                name = f"{player.game_name}#{player.tag_line}"
-                if count < 10:
-                    print(
-                        f"{count}) {name:<{longest_name_length + 1}} | "
-                        f"{round(kda, 2):<{short_width}} | "
-                        f"{round(cs, 2):<{medium_width}} | "
-                        f"{round(damage_record, 0):<{long_width}} | "
-                        f"{round(avg_dmg, 0):<{medium_width}} | "
-                        f"{round(avg_gold, 0):<{medium_width}} | "
-                        f"{round(avg_dead, 0):<{long_width}} | "
-                    )
-                else:
-                    print(
-                        f"{count}) {name:<{longest_name_length}} | "
-                        f"{round(kda, 2):<{short_width}} | "
-                        f"{round(cs, 2):<{medium_width}} | "
-                        f"{round(damage_record, 0):<{long_width}} | "
-                        f"{round(avg_dmg, 0):<{medium_width}} | "
-                        f"{round(avg_gold, 0):<{medium_width}} | "
-                        f"{round(avg_dead, 0):<{long_width}} | "
-                    )
-                count += 1
-                # ============================= build and return leaderabord for front-end =============================
-                leaderboard.append({
+                stats = self._derive_stats(item)
+                rows.append({
                     "puuid": player.puuid,
                     "game_name": player.game_name,
                     "tag_line": player.tag_line,
-                    "kda": kda,
-                    "cs_per_min": cs,
-                    "damage_record": damage_record,
-                    "avg_damage": avg_dmg,
-                    "avg_gold": avg_gold,
-                    "avg_time_dead": avg_dead
+                    "kda": stats[DynamoDBTables.StatsTable.KDA],
+                    "cs_per_min": stats[DynamoDBTables.StatsTable.CS_PER_MIN],
+                    "damage_record": stats[DynamoDBTables.StatsTable.DAMAGE_RECORD],
+                    "avg_damage": stats[DynamoDBTables.StatsTable.AVERAGE_DAMAGE_DEALT_TO_CHAMPIONS],
+                    "avg_gold": stats[DynamoDBTables.StatsTable.AVERAGE_GOLD_EARNED],
+                    "avg_time_dead": stats[DynamoDBTables.StatsTable.AVERAGE_TIME_SPENT_DEAD]
                 })
 
-        return leaderboard
-
-    def _get_sort_index(self, metric_to_sort):
-        """Get the index to sort the data by the specified metric"""
-        sort_indices = {
-            DynamoDBTables.StatsTable.KDA: 1,
-            DynamoDBTables.StatsTable.CS_PER_MIN: 2,
-            DynamoDBTables.StatsTable.DAMAGE_RECORD: 3,
-            DynamoDBTables.StatsTable.AVERAGE_DAMAGE_DEALT_TO_CHAMPIONS: 4,
-            DynamoDBTables.StatsTable.AVERAGE_GOLD_EARNED: 5,
-            DynamoDBTables.StatsTable.AVERAGE_TIME_SPENT_DEAD: 6,
-        }
-        return sort_indices.get(metric_to_sort, -1)
-
-    def _sort_data(self, data, sort_idx):
-        """Sort the data based on the specified index"""
-        return sorted(
-            [(item["puuid"],
-              item[DynamoDBTables.StatsTable.KDA],
-              item[DynamoDBTables.StatsTable.CS_PER_MIN],
-              item[DynamoDBTables.StatsTable.DAMAGE_RECORD], 
-              item[DynamoDBTables.StatsTable.AVERAGE_DAMAGE_DEALT_TO_CHAMPIONS],
-              item[DynamoDBTables.StatsTable.AVERAGE_GOLD_EARNED],
-              item[DynamoDBTables.StatsTable.AVERAGE_TIME_SPENT_DEAD])
-             for item in data],
-            key=lambda x: x[sort_idx],  # Sort by the metric value
-            reverse=True
-        )
+        _, index = self._get_view(window)
+        index.sync(rows)
+        if window is None:
+            await asyncio.to_thread(self._save_leaderboard_snapshot, rows)
+            self.snapshot_restored = False
+        return index
+
+    def _save_leaderboard_snapshot(self, rows):
+        """Write the all-time leaderboard rows to the data volume for the next process to start from"""
+        path = self.get_file_path(self.leaderboard_snapshot)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"saved_at": time.time(), "rows": rows}, f, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not save the leaderboard snapshot: {e}")
+
+    def _restore_leaderboard_snapshot(self):
+        """Load the leaderboard saved by an earlier process into the all-time index; returns whether there was one"""
+        try:
+            with open(self.get_file_path(self.leaderboard_snapshot)) as f:
+                saved = json.load(f)
+            self.leaderboard_index.sync(saved["rows"])
+        except FileNotFoundError:
+            return False
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring unreadable leaderboard snapshot: {e}")
+            return False
+        # Its age is that of the saved rows, so pages say how old the stats they show are
+        self.leaderboard_cache.preload(self.leaderboard_index, max(time.time() - saved["saved_at"], 0))
+        return True
+
+    def _revalidate_in_background(self):
+        """Rebuild the restored all-time leaderboard from DynamoDB on a thread, once, if it is stale"""
+        with self.revalidate_lock:
+            if self.revalidating:
+                return
+            self.revalidating = True
+
+        async def rebuild():
+            await self._check_processing_finished()
+            return await self.leaderboard_cache.get_async(self._build_leaderboard_snapshot)
+
+        def revalidate():
+            try:
+                asyncio.run(rebuild())
+            except Exception:
+                traceback.print_exc()
+            finally:
+                # Revalidate once; after that requests take the usual path, processing check and TTL included
+                self.snapshot_restored = False
+                self.revalidating = False
+
+        threading.Thread(target=revalidate, name=f"revalidate-{self.leaderboard_name}", daemon=True).start()
+
+    @staticmethod
+    def _window_days(window, now=None):
+        """The UTC days ("YYYY-MM-DD") a rolling window covers, today included"""
+        today = int(time.time() if now is None else now) // 86400
+        return [time.strftime("%Y-%m-%d", time.gmtime((today - offset) * 86400)) for offset in range(LeaderboardService.windows[window])]
+
+    @staticmethod
+    def _merge_daily_buckets(buckets):
+        """Combine each player's daily buckets into one stats item: games and sums add up, the damage record is the highest"""
+        merged = {}
+        sum_attributes = [metric + DynamoDBTables.StatsTable.SUM_SUFFIX for metric in DynamoDBTables.StatsTable.AVERAGED_METRICS]
+        for bucket in buckets:
+            item = merged.get(bucket["puuid"])
+            if item is None:
+                merged[bucket["puuid"]] = dict(bucket)
+                continue
+            item[DynamoDBTables.StatsTable.NUMBER_OF_GAMES] = item.get(DynamoDBTables.StatsTable.NUMBER_OF_GAMES, 0) + bucket.get(DynamoDBTables.StatsTable.NUMBER_OF_GAMES, 0)
+            for attribute in sum_attributes:
+                item[attribute] = item.get(attribute, 0) + bucket.get(attribute, 0)
+            item[DynamoDBTables.StatsTable.DAMAGE_RECORD] = max(
+                item.get(DynamoDBTables.StatsTable.DAMAGE_RECORD, 0), bucket.get(DynamoDBTables.StatsTable.DAMAGE_RECORD, 0)
+            )
+        return list(merged.values())
+
+    def _derive_stats(self, item):
+        """Derive a player's averages from their running sums; rows not yet migrated still hold averages"""
+        number_of_games = item.get(DynamoDBTables.StatsTable.NUMBER_OF_GAMES, 0)
+        stats = {}
+        for metric in DynamoDBTables.StatsTable.AVERAGED_METRICS:
+            total = item.get(metric + DynamoDBTables.StatsTable.SUM_SUFFIX)
+            if total is not None and number_of_games:
+                stats[metric] = round(float(total) / float(number_of_games), 2)
+            else:
+                stats[metric] = float(item.get(metric, 0))
+        stats[DynamoDBTables.StatsTable.DAMAGE_RECORD] = float(item.get(DynamoDBTables.StatsTable.DAMAGE_RECORD, 0))
+        return stats
 
     def get_leaderboard_players(self):
-        """Query the database for all players in the leaderboard."""
-        self.leaderboard = self.db.get_all_players()
+        """List all players in the leaderboard."""
+        self.refresh_roster()
         if not self.leaderboard:
             print("Leaderboard is currently empty.")
             return None
@@ -148,65 +362,144 @@ class LeaderboardService:
         return leaderboard_str
 
     async def add_player(self, game_name, tag_line):
-        """Add a player to the leaderboard."""
-        self.leaderboard = self.db.get_all_players()
+        """Add a player to the leaderboard and backfill their recent matches."""
+        message, player = await self.register_player(game_name, tag_line)
+        if player is not None:
+            await self.combine_matches([player.puuid])
+        return message
+
+    async def register_player(self, game_name, tag_line):
+        """Add a player to the leaderboard without crawling their matches; returns a message and the new Player, or None if nobody was added.
+
+        The caller backfills their history, e.g. through a refresh job.
+        """
+        await self.refresh_roster_async()
         tag_line = tag_line.upper()
 
         # check for duplicate player
-        for player in self.leaderboard.values():
-            if player.game_name.upper() == game_name.upper() and player.tag_line == tag_line:
-                return f"Player {game_name}#{tag_line} is already on the leaderboard."
-
-        try:
-            response = await self.riot_api.get_account_by_riot_id(game_name, tag_line)
-            puuid = response.get("puuid")
-            game_name = response.get("gameName")
-            tag_line = response.get("tagLine")
-            if not puuid or not game_name or not tag_line:
-                return "Player does not exist."
-        except:
-            return "Player does not exist."
+        if self.leaderboard.find(game_name, tag_line):
+            return f"Player {game_name}#{tag_line} is already on the leaderboard.", None
 
-        player = Player(game_name=game_name, tag_line=tag_line, puuid=puuid)
+        player = await self._resolve_account(game_name, tag_line)
+        if player is None:
+            return "Player does not exist.", None
+        if player.puuid in self.leaderboard:
+            # Their account is listed under another Riot ID
+            return f"Player {player.game_name}#{player.tag_line} is already on the leaderboard.", None
 
         # Add to cache
         self.leaderboard[player.puuid] = player
 
         # Add to DB
-        self.db.add_player(player)
+        await self.db.add_player_async(self.leaderboard_name, player)
+        self._invalidate_views()
+
+        return f"Player {player.game_name}#{player.tag_line} added to leaderboard.", player
+
+    async def _resolve_account(self, game_name, tag_line, semaphore=None):
+        """Look up the Player behind a Riot ID, from the account cache when possible; None if it does not exist."""
+        player = self.account_cache.get(game_name, tag_line)
+        if player is not None:
+            return player
+        try:
+            if semaphore is None:
+                response = await self.riot_api.get_account_by_riot_id(game_name, tag_line)
+            else:
+                async with semaphore:
+                    response = await self.riot_api.get_account_by_riot_id(game_name, tag_line)
+        except Exception:
+            return None
+        if not response.get("puuid") or not response.get("gameName") or not response.get("tagLine"):
+            return None
+        player = Player(game_name=response["gameName"], tag_line=response["tagLine"], puuid=response["puuid"])
+        self.account_cache.put(player)
+        return player
+
+    async def import_players(self, riot_ids, backfill=True):
+        """Add many players at once from a list of "name#tag" Riot IDs.
+
+        IDs are resolved from the account cache or concurrently under the rate limiter, the new players are written with batched
+        writes, and their histories are backfilled by a single crawl, so a match shared by several of
+        them is fetched once. Returns the lists of added, duplicate, unknown and malformed IDs, the
+        added players' puuids, and the crawl's report. With `backfill=False` nothing is crawled and the
+        caller backfills the added puuids itself.
+        """
+        await self.refresh_roster_async()
+        summary = {"added": [], "duplicates": [], "not_found": [], "invalid": [], "puuids": [], "report": None}
+
+        to_resolve = {}
+        for riot_id in riot_ids:
+            if not riot_id.strip():
+                continue
+            game_name, _, tag_line = riot_id.strip().rpartition("#")
+            game_name, tag_line = game_name.strip(), tag_line.strip().upper()
+            if not game_name or not tag_line:
+                summary["invalid"].append(riot_id)
+            elif self.leaderboard.find(game_name, tag_line) or normalize_riot_id(game_name, tag_line) in to_resolve:
+                summary["duplicates"].append(f"{game_name}#{tag_line}")
+            else:
+                to_resolve[normalize_riot_id(game_name, tag_line)] = (game_name, tag_line)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        resolved = await asyncio.gather(*(
+            self._resolve_account(game_name, tag_line, semaphore) for game_name, tag_line in to_resolve.values()
+        ))
+        players = {}
+        for (game_name, tag_line), player in zip(to_resolve.values(), resolved):
+            if player is None:
+                summary["not_found"].append(f"{game_name}#{tag_line}")
+            elif player.puuid in self.leaderboard or player.puuid in players:
+                # Another spelling of an account that is already listed
+                summary["duplicates"].append(f"{game_name}#{tag_line}")
+            else:
+                players[player.puuid] = player
 
-        await self.combine_matches(puuid)
+        if not players:
+            return summary
+        if not await self.db.add_players_async(self.leaderboard_name, list(players.values())):
+            raise RuntimeError("Failed to write the imported players to DynamoDB.")
+        self.leaderboard.update(players)
+        self._invalidate_views()
+        summary["added"] = [f"{player.game_name}#{player.tag_line}" for player in players.values()]
+        summary["puuids"] = list(players)
 
-        return f"Player {game_name}#{tag_line} added to leaderboard."
+        if backfill:
+            summary["report"] = await self.combine_matches(list(players), puuids=list(players))
+        return summary
 
     def remove_player(self, index):
         """Remove a player from the leaderboard."""
-        self.leaderboard = self.db.get_all_players()
+        # The index refers to the roster as last listed by get_leaderboard_players, so don't reload it here
         if not self.leaderboard:
             return "Leaderboard is currently empty."
 
         for idx, player in enumerate(self.leaderboard.values(), start=1):
             if idx == index:
                 # Remove from DB
-                self.db.remove_player(player.puuid, player.game_name, player.tag_line)
+                if self.db.remove_player(self.leaderboard_name, player.puuid):
+                    # Their stats are deleted, so a re-added player starts from a fresh backfill
+                    self.watermarks.remove(player.puuid)
                 # Remove from cache
                 self.leaderboard.pop(player.puuid)
+                self._remove_from_views(player.puuid)
                 return f"Player {player.game_name}#{player.tag_line} removed from the leaderboard."
 
         return f"No player found in the leaderboard."
 
     def remove_player_by_puuid(self, puuid):
         """Remove a player from the leaderboard by puuid."""
-        self.leaderboard = self.db.get_all_players()
+        self.refresh_roster()
         if not self.leaderboard:
             return "Leaderboard is currently empty."
 
         player = self.leaderboard.get(puuid)
         if player:
             # Remove from DB
-            self.db.remove_player(player.puuid, player.game_name, player.tag_line)
+            if self.db.remove_player(self.leaderboard_name, player.puuid):
+                self.watermarks.remove(player.puuid)
             # Remove from cache
             self.leaderboard.pop(player.puuid)
+            self._remove_from_views(player.puuid)
             return f"Player {player.game_name}#{player.tag_line} removed from the leaderboard."
 
         return f"No player found in the leaderboard."
@@ -214,7 +507,7 @@ class LeaderboardService:
     async def update_leaderboard(self, start_time, count):
         """Update leaderboard stats if the cooldown has passed."""
         current_time = time.time()
-        if current_time - self.get_last_update_time() < self.cooldown:
+        if current_time - (self.get_last_update_time() or 0) < self.cooldown:
             print("Cooldown active. Skipping redundant update.")
             return
 
@@ -242,7 +535,7 @@ class LeaderboardService:
         
         avg_damage = total_damage / num_matches
         
-        # self.db.update_player_damage(player.game_name, player.tag_line, avg_damage)
+        # self.db.update_player_damage(self.leaderboard_name, player.puuid, avg_damage)
 
         print("Average Damage in past", num_matches, "games: ", avg_damage)
 
@@ -263,53 +556,335 @@ class LeaderboardService:
             pickle.dump(int(time.time()), f)
 
     def get_last_update_time(self):
-        """get the last updated epoch time"""
+        """get the legacy leaderboard-wide last updated epoch time, or None if it was never saved"""
+        for filename in (self.latest_update_time, self.legacy_latest_update_time):
+            if filename is None:
+                continue
+            try:
+                with open(self.get_file_path(filename), 'rb') as f:
+                    return pickle.load(f)
+            except FileNotFoundError:
+                pass
+        return None
+
+    def _get_start_time(self, puuid, new_puuids, legacy_update_time):
+        """get the epoch time to list a player's matches from, or None to backfill their recent history"""
+        watermark = self.watermarks.get(puuid)
+        if watermark and WatermarkStore.END_TIMESTAMP in watermark:
+            return watermark[WatermarkStore.END_TIMESTAMP]
+        if puuid in new_puuids:
+            return None
+        # Players refreshed before per-player watermarks existed continue from the old global time
+        return legacy_update_time
+
+    async def _list_new_match_ids(self, puuid, start_time, semaphore):
+        """list a player's match ids newer than their watermark, newest first, paginating as needed"""
+        watermark = self.watermarks.get(puuid)
+        last_match_id = watermark.get(WatermarkStore.LAST_MATCH_ID) if watermark else None
+        # Without a start time only backfill recent games, not the player's entire history
+        limit = LeaderboardService.backfill_match_count if start_time is None else None
+        page_size = min(limit or LeaderboardService.match_page_size, LeaderboardService.match_page_size)
+
+        match_ids = []
+        start = 0
+        while True:
+            async with semaphore:
+                page = await self.riot_api.get_list_of_match_ids_by_puuid(puuid, start_time=start_time, count=page_size, start=start)
+            for match_id in page:
+                if match_id == last_match_id:
+                    return match_ids
+                match_ids.append(match_id)
+            if len(page) < page_size or (limit and len(match_ids) >= limit):
+                return match_ids[:limit] if limit else match_ids
+            start += page_size
+
+    async def combine_matches(self, new_puuids=(), puuids=None):
+        """get matches of all players in leaderboard since their watermark, combine them into a single compressed batch, and upload file to S3 bucket
+
+        `puuids` limits the refresh to those players (in that order); by default the whole roster is
+        refreshed. Players in `new_puuids` were just added: they are refreshed first and, without a
+        watermark, get their recent history backfilled. Returns the refresh report.
+
+        Matches are projected down to the fields the stats Lambda reads as soon as they arrive, and the
+        batch is streamed to disk as gzip-compressed JSON lines.
+
+        A match only carries the players whose own match list returned it as new, so a game is never
+        counted twice for a player. A player whose listing or matches fail keeps their old watermark
+        and is left out of the upload, so the next refresh picks them up exactly where they stopped.
+
+        The refresh is checkpointed on the data volume (see RefreshCheckpoint). Watermarks only advance
+        once the stats Lambda has tagged the uploaded batch as processed. A refresh that was interrupted
+        reuses the matches it had already fetched, and one whose batch is still unconfirmed checks on it
+        instead of crawling again until the batch is confirmed (see _settle_checkpointed_batch).
+        """
+        await asyncio.to_thread(self.refresh_lock.acquire)
         try:
-            latest_update_time = self.get_file_path(self.latest_update_time)
-            with open(latest_update_time,'rb') as f:
-                last_update_time=pickle.load(f)
-        except:
-            last_update_time = ""
-        return last_update_time
-
-    async def combine_matches(self, new_puuid=None):
-        """get matches of all players in leaderboard since the last update, combine them into a single json file, and upload file to S3 bucket"""
-        combined = {}
-        new_matches_found = False
-        combined_json_path = self.get_file_path(self.combined_json)
-        puuids = [new_puuid] + list(self.leaderboard.keys()) if new_puuid else list(self.leaderboard.keys())
-        last_update_time = self.get_last_update_time()
+            return await self._combine_matches(new_puuids, puuids)
+        finally:
+            self.refresh_lock.release()
+
+    async def _combine_matches(self, new_puuids, puuids):
+        matches_uploaded = 0
+        matches_resumed = 0
+        roster = list(self.leaderboard.keys()) if puuids is None else list(puuids)
+        puuids = list(dict.fromkeys(list(new_puuids) + roster))
+        new_puuids = set(new_puuids)
+        legacy_update_time = self.get_last_update_time()
+        checkpoint = RefreshCheckpoint(self.get_file_path(self.refresh_checkpoint))
+
+        started_at = time.perf_counter()
+        requests_before = self.riot_api.requests_issued
+        wait_before = self.riot_api.rate_limit_wait_time
+        hits_before = self.match_cache.hits
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        in_flight = {}      # match_id -> task, so a match shared by several players is only fetched once
+        player_matches = {} # puuid -> new match ids, newest first
+        failed_puuids = set()
+        match_players = {}  # match_id -> puuids the match is new for
+        batch_key = None
+        chunk_keys = None
+        held_puuids = []
+        awaiting_stats = False
+        stats_failed_chunks = None
+        error = None
+
+        async def fetch_match(match_id):
+            nonlocal matches_resumed
+            match = checkpoint.matches.get(match_id)
+            if match is not None:
+                matches_resumed += 1
+                return match
+            # SQLite reads and writes block, so they run on a worker thread rather than the event loop
+            match = await asyncio.to_thread(self.match_cache.get, match_id)
+            if match is None:
+                async with semaphore:
+                    match = await self.riot_api.get_match_by_match_id(match_id)
+                await asyncio.to_thread(self.match_cache.put, match_id, match)
+            # Every participant is kept: the roster may change before a checkpointed match is used, and the
+            # batch only keeps the players each match is new for anyway
+            match = project_match(match_id, match)
+            checkpoint.add_match(match)
+            return match
+
+        async def fetch_player_matches(puuid):
+            start_time = self._get_start_time(puuid, new_puuids, legacy_update_time)
+            try:
+                match_ids = await self._list_new_match_ids(puuid, start_time, semaphore)
+            except Exception as e:
+                print(f"\nAn error occurred while listing matches for {puuid}: {e}")
+                failed_puuids.add(puuid)
+                return
+            player_matches[puuid] = match_ids
+            for match_id in match_ids:
+                if match_id not in in_flight:
+                    in_flight[match_id] = asyncio.create_task(fetch_match(match_id))
 
         try:
-            for puuid in puuids:
-                # For new players (if puuid given), fetch all matches (no start_time)
-                current_start_time = "" if puuid == new_puuid else last_update_time
-
-                match_ids = await self.riot_api.get_list_of_match_ids_by_puuid(puuid, start_time=current_start_time)
-
-                for match_id in match_ids:
-                    if match_id in combined:
-                        continue
-
-                    match = await self.riot_api.get_match_by_match_id(match_id)
-                    # Filter participants to include only leaderboard players
-                    match["info"]["participants"] = [
-                        participant for participant in match["info"]["participants"]
-                        if participant["puuid"] in self.leaderboard
+            if checkpoint.batch is not None:
+                # Crawling again from the old watermarks would send the batch's games a second time
+                batch_key = checkpoint.batch["key"]
+                chunk_keys = [chunk["key"] for chunk in checkpoint.batch["chunks"]]
+                settled, stats_failed_chunks = await self._settle_checkpointed_batch(checkpoint)
+                awaiting_stats = not settled
+
+            if not awaiting_stats:
+                # Players whose games are in another leaderboard's unconfirmed batch wait for it to settle
+                self.watermarks.reload()
+                held_puuids = [puuid for puuid in puuids if self.watermarks.pending_batch(puuid)]
+                if held_puuids:
+                    print(f"\n{len(held_puuids)} players wait for another leaderboard's batch to be confirmed.")
+                await asyncio.gather(*(fetch_player_matches(puuid) for puuid in puuids if puuid not in held_puuids))
+                results = dict(zip(in_flight.keys(), await asyncio.gather(*in_flight.values(), return_exceptions=True)))
+
+                for puuid, match_ids in player_matches.items():
+                    if any(isinstance(results[match_id], Exception) for match_id in match_ids):
+                        print(f"\nAn error occurred while fetching matches for {puuid}, they will be retried next update.")
+                        failed_puuids.add(puuid)
+
+                for puuid, match_ids in player_matches.items():
+                    if puuid not in failed_puuids:
+                        for match_id in match_ids:
+                            match_players.setdefault(match_id, set()).add(puuid)
+
+                refreshed = {puuid: match_ids for puuid, match_ids in player_matches.items() if puuid not in failed_puuids}
+                watermarks = {
+                    puuid: [match_ids[0], results[match_ids[0]]["gameEndTimestamp"]]
+                    for puuid, match_ids in refreshed.items() if match_ids
+                }
+                checked = [puuid for puuid, match_ids in refreshed.items() if not match_ids]
+
+                if match_players:
+                    # Keys sort in upload order: a timestamped batch id, then the chunk number
+                    batch_id = f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}-{uuid.uuid4().hex[:8]}"
+                    with ChunkedMatchBatchWriter(self.get_file_path(f"{self.leaderboard_name}_{batch_id}_"), self.batch_chunk_bytes) as batch:
+                        for match_id, owners in match_players.items():
+                            match = results[match_id]
+                            # Keep only leaderboard players the match is new for
+                            batch.write({**match, "participants": [
+                                participant for participant in match["participants"]
+                                if participant["puuid"] in owners
+                            ]})
+                    matches_uploaded = batch.count
+                    # Under the leaderboard's prefix so the stats Lambda knows whose flag to set
+                    chunks = [
+                        {"key": f"{self.leaderboard_name}/{batch_id}/{number:05d}.jsonl.gz", "path": path}
+                        for number, path in enumerate(batch.paths)
                     ]
-                    combined[match_id] = match
-                    new_matches_found = True 
-
-            if new_matches_found:
-                with open(combined_json_path, "w") as f:
-                    json.dump(combined, f)
-                # upload json to S3
-                BucketService().upload_file(combined_json_path, self.combined_json)
-            else:
-                print("\nAll games are up-to-date.")
+                    batch_key = f"{self.leaderboard_name}/{batch_id}/{LeaderboardService.manifest_name}"
+                    chunk_keys = [chunk["key"] for chunk in chunks]
+                    self.watermarks.hold(watermarks, batch_key)
+                    checkpoint.set_batch(batch_key, RefreshCheckpoint.UPLOADING, watermarks, checked, chunks)
+                    settled, _ = await self._settle_checkpointed_batch(checkpoint, resume=False)
+                    awaiting_stats = not settled
+                    print(f"Please wait a moment for the leaderboard to update.")
+                else:
+                    print("\nAll games are up-to-date.")
+                    self.watermarks.advance({}, checked=checked)
+                    if not failed_puuids:
+                        checkpoint.clear()
 
         except Exception as e:
+            for task in in_flight.values():
+                task.cancel()
             print(f"\nAn error occurred while processing matches: {e}")
             traceback.print_exc()
-
-        self.save_last_update_time()
\ No newline at end of file
+            error = str(e)
+        finally:
+            checkpoint.close()
+        if stats_failed_chunks and error is None:
+            error = (f"the stats Lambda never confirmed {len(stats_failed_chunks)} chunks of {batch_key}: "
+                     f"{', '.join(stats_failed_chunks)}; invoke it for them, refreshes of this leaderboard wait until then")
+
+        self.last_refresh_report = {
+            "players": len(puuids),
+            "players_failed": len(failed_puuids),
+            "players_held": len(held_puuids),
+            "matches_fetched": matches_uploaded,
+            "matches_cached": self.match_cache.hits - hits_before,
+            "matches_resumed": matches_resumed,
+            "matches_skipped": len(in_flight) - len(match_players),
+            "requests_issued": self.riot_api.requests_issued - requests_before,
+            "rate_limit_wait_time": self.riot_api.rate_limit_wait_time - wait_before,
+            "wall_clock_time": time.perf_counter() - started_at,
+            "batch_key": batch_key,
+            "chunk_keys": chunk_keys,
+            "awaiting_stats": awaiting_stats,
+            "stats_failed_chunks": stats_failed_chunks,
+            "error": error,
+        }
+        self._record_refresh_metrics()
+        self._print_refresh_report()
+        return self.last_refresh_report
+
+    async def _settle_checkpointed_batch(self, checkpoint, resume=True):
+        """Upload the checkpointed batch if needed, advance its watermarks once the stats Lambda has processed every chunk, then clear the checkpoint
+
+        Returns (settled, failed chunk keys). A batch uploaded by this call is waited on for up to
+        `stats_confirm_timeout` seconds; one uploaded earlier is only checked, so a refresh never sits on
+        the lease waiting for a Lambda that already had its chance. Chunks still unconfirmed
+        `stats_resend_interval` seconds after they were sent are uploaded again, which triggers the Lambda
+        anew, up to `stats_max_resends` times. After that the batch is stuck: the unconfirmed chunk keys are
+        returned for the report, and its watermarks and checkpoint stay as they are, so the batch settles
+        as soon as someone has the Lambda process those chunks.
+        """
+        batch = checkpoint.batch
+        # Also holds the players of a checkpoint written before batches held them
+        self.watermarks.hold(batch["watermarks"], batch["key"])
+        timeout = 0
+        if batch["state"] == RefreshCheckpoint.UPLOADING:
+            if not await self._upload_batch(batch, resume):
+                raise RuntimeError(f"upload of the match batch {batch['key']} failed; it will be retried next update")
+            checkpoint.set_batch(batch["key"], RefreshCheckpoint.UPLOADED, batch["watermarks"], batch["checked"], batch["chunks"],
+                                 sent_at=time.time(), resends=batch.get("resends", 0))
+            batch = checkpoint.batch
+            timeout = self.stats_confirm_timeout
+
+        unconfirmed = await self._wait_for_stats([chunk["key"] for chunk in batch["chunks"]], timeout)
+        if unconfirmed:
+            sent_at = batch.get("sent_at") or time.time()
+            if time.time() - sent_at < self.stats_resend_interval:
+                print(f"\nThe stats Lambda has not processed {len(unconfirmed)} chunks of {batch['key']} yet; watermarks will advance once it has.")
+                return False, None
+            if batch.get("resends", 0) < self.stats_max_resends:
+                paths = {chunk["key"]: chunk["path"] for chunk in batch["chunks"]}
+                # An upload over the same key sends the Lambda a new event for it; a chunk whose local copy is
+                # gone can't be sent again, but the attempt still counts towards the limit
+                await asyncio.gather(*(
+                    self.bucket_service.upload_file_async(paths[key], key) for key in unconfirmed if os.path.exists(paths[key])
+                ))
+                checkpoint.set_batch(batch["key"], batch["state"], batch["watermarks"], batch["checked"], batch["chunks"],
+                                     sent_at=time.time(), resends=batch.get("resends", 0) + 1)
+                print(f"\nSent {len(unconfirmed)} unconfirmed chunks of {batch['key']} to the stats Lambda again (attempt {checkpoint.batch['resends']} of {self.stats_max_resends}).")
+                return False, None
+            print(f"\nThe stats Lambda never confirmed {len(unconfirmed)} chunks of {batch['key']}: {', '.join(unconfirmed)}")
+            return False, unconfirmed
+
+        self.watermarks.advance(batch["watermarks"], checked=batch["checked"], batch_key=batch["key"])
+        checkpoint.clear()
+        # The batch's stats are in DynamoDB, so the next request rebuilds the leaderboard and its pages
+        self._invalidate_views()
+        for chunk in batch["chunks"]:
+            try:
+                os.remove(chunk["path"])
+            except FileNotFoundError:
+                pass
+        return True, None
+
+    async def _wait_for_stats(self, chunk_keys, timeout):
+        """Poll the chunks' processed tags for up to `timeout` seconds; returns the keys still unconfirmed"""
+        unconfirmed = list(chunk_keys)
+        deadline = time.monotonic() + timeout
+        while True:
+            processed = await asyncio.gather(*(self.bucket_service.is_processed_async(key) for key in unconfirmed))
+            unconfirmed = [key for key, done in zip(unconfirmed, processed) if not done]
+            remaining = deadline - time.monotonic()
+            if not unconfirmed or remaining <= 0:
+                return unconfirmed
+            await asyncio.sleep(min(LeaderboardService.processing_check_interval, remaining))
+
+    async def _upload_batch(self, batch, resume):
+        """Upload a batch's chunks concurrently, then its manifest; returns False if any upload failed
+
+        Each chunk is processed by its own stats Lambda invocation as soon as it lands. When resuming,
+        chunks already in S3 are not uploaded again, since the Lambda may have counted them.
+        """
+        async def upload_chunk(chunk):
+            if resume and await self.bucket_service.object_exists_async(chunk["key"]):
+                return True
+            return await self.bucket_service.upload_file_async(chunk["path"], chunk["key"])
+
+        if not all(await asyncio.gather(*(upload_chunk(chunk) for chunk in batch["chunks"]))):
+            return False
+        manifest = {"leaderboard": self.leaderboard_name, "chunks": [chunk["key"] for chunk in batch["chunks"]]}
+        return await self.bucket_service.put_object_async(batch["key"], json.dumps(manifest))
+
+    def _record_refresh_metrics(self):
+        report = self.last_refresh_report
+        name = self.leaderboard_name
+        refresh_seconds.observe(report["wall_clock_time"], leaderboard=name)
+        refresh_matches_total.inc(report["matches_fetched"], leaderboard=name, outcome="uploaded")
+        refresh_matches_total.inc(report["matches_cached"], leaderboard=name, outcome="cached")
+        refresh_matches_total.inc(report["matches_resumed"], leaderboard=name, outcome="resumed")
+        refresh_matches_total.inc(report["matches_skipped"], leaderboard=name, outcome="skipped")
+        refreshed = report["players"] - report["players_failed"] - report["players_held"]
+        refresh_players_total.inc(refreshed, leaderboard=name, outcome="refreshed")
+        refresh_players_total.inc(report["players_failed"], leaderboard=name, outcome="failed")
+        refresh_players_total.inc(report["players_held"], leaderboard=name, outcome="held")
+        if report["stats_failed_chunks"]:
+            refresh_stuck_batches_total.inc(leaderboard=name)
+
+    def _print_refresh_report(self):
+        """Print a summary of the last refresh"""
+        report = self.last_refresh_report
+        print(
+            f"Refreshed {report['players']} players in {report['wall_clock_time']:.2f}s: "
+            f"{report['matches_fetched']} matches fetched ({report['matches_cached']} from cache), "
+            f"{report['requests_issued']} requests issued, {report['players_failed']} players failed, "
+            f"{report['rate_limit_wait_time']:.2f}s waiting on the rate limiter."
+        )
+        if report["matches_resumed"]:
+            print(f"Resumed {report['matches_resumed']} matches from the last interrupted refresh.")
+        if report["stats_failed_chunks"]:
+            print(f"Batch {report['batch_key']} is stuck; the stats Lambda never confirmed {len(report['stats_failed_chunks'])} chunks.")
+        elif report["awaiting_stats"]:
+            print(f"Batch {report['batch_key']} is waiting on the stats Lambda.")
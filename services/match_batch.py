@@ -0,0 +1,96 @@
+import gzip
+import json
+
+# Only the fields process_games_lambda reads are shipped in a batch
+PARTICIPANT_FIELDS = (
+    "puuid",
+    "timePlayed",
+    "totalMinionsKilled",
+    "totalDamageDealtToChampions",
+    "totalDamageTaken",
+    "totalTimeSpentDead",
+    "wardsPlaced",
+    "goldEarned",
+)
+CHALLENGE_FIELDS = ("kda", "soloKills", "takedowns")
+
+
+def get_match_end_timestamp(match):
+    """get the epoch time in seconds a raw Riot match ended"""
+    info = match["info"]
+    if info.get("gameEndTimestamp"):
+        return info["gameEndTimestamp"] // 1000
+    return (info.get("gameCreation", 0) + info.get("gameDuration", 0) * 1000) // 1000
+
+
+def project_match(match_id, match, puuids=None):
+    """Reduce a raw Riot match to the fields the stats Lambda consumes, for the given players only (default: everyone)."""
+    participants = []
+    for participant in match["info"]["participants"]:
+        if puuids is not None and participant["puuid"] not in puuids:
+            continue
+        # Missing fields stay missing so the Lambda's own defaults still apply
+        projected = {field: participant[field] for field in PARTICIPANT_FIELDS if field in participant}
+        challenges = participant.get("challenges", {})
+        projected["challenges"] = {field: challenges[field] for field in CHALLENGE_FIELDS if field in challenges}
+        participants.append(projected)
+    return {
+        "matchId": match_id,
+        "gameEndTimestamp": get_match_end_timestamp(match),
+        "participants": participants,
+    }
+
+
+class MatchBatchWriter:
+    """Stream projected matches to a gzip-compressed, newline-delimited JSON file."""
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.count = 0
+        self.size = 0  # uncompressed bytes written
+        self.file = None
+
+    def __enter__(self):
+        self.file = gzip.open(self.file_path, "wt", encoding="utf-8")
+        return self
+
+    def write(self, match):
+        line = json.dumps(match, separators=(",", ":")) + "\n"
+        self.file.write(line)
+        self.count += 1
+        self.size += len(line)
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.file.close()
+
+
+class ChunkedMatchBatchWriter:
+    """Stream projected matches into numbered gzip chunks of about `max_bytes` of uncompressed JSON each.
+
+    Chunks are written to `<path_prefix>00000.jsonl.gz`, `<path_prefix>00001.jsonl.gz`, ... and listed in `paths`.
+    """
+    def __init__(self, path_prefix, max_bytes):
+        self.path_prefix = path_prefix
+        self.max_bytes = max_bytes
+        self.paths = []
+        self.count = 0
+        self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def write(self, match):
+        if self.writer is None or self.writer.size >= self.max_bytes:
+            self._close_chunk()
+            path = f"{self.path_prefix}{len(self.paths):05d}.jsonl.gz"
+            self.paths.append(path)
+            self.writer = MatchBatchWriter(path).__enter__()
+        self.writer.write(match)
+        self.count += 1
+
+    def _close_chunk(self):
+        if self.writer is not None:
+            self.writer.__exit__(None, None, None)
+            self.writer = None
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._close_chunk()
@@ -0,0 +1,74 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class MatchCache:
+    """Size-bounded SQLite store of compressed match payloads, keyed by match id.
+
+    Finished matches never change, so a payload only ever needs to be downloaded from Riot once.
+    When the store grows past `max_bytes` the least recently used matches are evicted.
+    """
+    default_max_bytes = 512 * 1024 * 1024  # 512 MB of compressed payloads
+
+    def __init__(self, db_path, max_bytes=None):
+        self.max_bytes = max_bytes or MatchCache.default_max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS matches ("
+            "match_id TEXT PRIMARY KEY, payload BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS matches_last_access ON matches (last_access)")
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM matches").fetchone()[0]
+
+    def get(self, match_id):
+        """Return the cached match, or None on a miss."""
+        with self.lock:
+            row = self.conn.execute("SELECT payload FROM matches WHERE match_id = ?", (match_id,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE matches SET last_access = ? WHERE match_id = ?", (time.time(), match_id))
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, match_id, match):
+        """Store a match payload, evicting the least recently used matches if over budget."""
+        payload = zlib.compress(json.dumps(match, separators=(",", ":")).encode("utf-8"))
+        with self.lock:
+            row = self.conn.execute("SELECT size FROM matches WHERE match_id = ?", (match_id,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO matches (match_id, payload, size, last_access) VALUES (?, ?, ?, ?)",
+                (match_id, payload, len(payload), time.time())
+            )
+            self.total_bytes += len(payload) - (row[0] if row else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used matches until the store is back under 90% of its budget."""
+        target = self.max_bytes * 0.9
+        rows = self.conn.execute("SELECT match_id, size FROM matches ORDER BY last_access").fetchall()
+        evicted = []
+        for match_id, size in rows:
+            if self.total_bytes <= target:
+                break
+            evicted.append((match_id,))
+            self.total_bytes -= size
+        self.conn.executemany("DELETE FROM matches WHERE match_id = ?", evicted)
+
+    def stats(self):
+        """Return hit/miss counters and the current size of the store."""
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": self.total_bytes}
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,51 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class RenderedPage:
+    """A response body rendered once, compressed once, with a strong ETag for each encoding."""
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.gzip_body = gzip.compress(body, compresslevel=9)
+        self.gzip_etag = f"{self.etag}-gzip"
+
+
+class PageCache:
+    """Pre-rendered pages keyed by what they show, kept until the leaderboard they were rendered from changes.
+
+    Each page is stored with the version of the leaderboard index it was rendered from, so it is rendered
+    again only when the ranking actually changed, not when the leaderboard cache merely expired. The least
+    recently served pages are dropped beyond `max_pages`.
+    """
+    default_max_pages = 256
+
+    def __init__(self, max_pages=None):
+        self.max_pages = max_pages or PageCache.default_max_pages
+        self.pages = OrderedDict()  # key -> (version, RenderedPage)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, version):
+        """The page rendered for `key` from this version of the leaderboard, or None."""
+        with self.lock:
+            entry = self.pages.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self.pages.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, version, body, mimetype):
+        page = RenderedPage(body, mimetype)
+        with self.lock:
+            self.pages[key] = (version, page)
+            self.pages.move_to_end(key)
+            while len(self.pages) > self.max_pages:
+                self.pages.popitem(last=False)
+        return page
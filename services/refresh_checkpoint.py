@@ -0,0 +1,88 @@
+import json
+import os
+
+
+class RefreshCheckpoint:
+    """Append-only journal of a leaderboard refresh that has not been handed off yet.
+
+    Every projected match is appended as it arrives, so a refresh that crashes or is interrupted
+    resumes without requesting those matches again. Matches keep all their participants, so players
+    added to the leaderboard in between still find their games. Once the batch is built, its chunks, manifest key and
+    the watermarks it will move are recorded too: first as `uploading`, then as `uploaded`. The journal
+    is only deleted after the stats Lambda confirms every chunk, which is when the watermarks advance.
+
+    Lines are flushed as they are written and the batch record is fsynced. A line cut short by a
+    crash is dropped when the journal is loaded.
+    """
+    UPLOADING = "uploading"
+    UPLOADED = "uploaded"
+
+    def __init__(self, path):
+        self.path = path
+        self.matches = {}  # match_id -> match projected for all its participants
+        self.batch = None  # {key, state, watermarks, checked, chunks, sent_at, resends} of the batch being handed off
+        self.file = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        valid = 0
+        for line in data.splitlines(keepends=True):
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("truncated line")
+                record = json.loads(line)
+            except ValueError:
+                break
+            valid += len(line)
+            if "match" in record:
+                self.matches[record["match"]["matchId"]] = record["match"]
+            else:
+                self.batch = record["batch"]
+        if valid < len(data):
+            # Later appends must not be glued onto the partial line
+            with open(self.path, "r+b") as f:
+                f.truncate(valid)
+
+    def __bool__(self):
+        return bool(self.matches) or self.batch is not None
+
+    def _append(self, record, sync=False):
+        if self.file is None:
+            self.file = open(self.path, "a", encoding="utf-8")
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.file.flush()
+        if sync:
+            os.fsync(self.file.fileno())
+
+    def add_match(self, match):
+        self.matches[match["matchId"]] = match
+        self._append({"match": match})
+
+    def set_batch(self, key, state, watermarks, checked, chunks, sent_at=None, resends=0):
+        """Record the batch being handed off: its manifest key, its chunks ([{key, path}]), the
+        watermarks ({puuid: [match id, end time]}) it moves, when its chunks were last sent to S3 and
+        how many times unconfirmed chunks were sent again."""
+        self.batch = {
+            "key": key, "state": state, "watermarks": watermarks, "checked": list(checked), "chunks": chunks,
+            "sent_at": sent_at, "resends": resends,
+        }
+        self._append({"batch": self.batch}, sync=True)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def clear(self):
+        self.close()
+        self.matches = {}
+        self.batch = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,259 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from db.db_constants import DynamoDBTables
+from services.watermarks import WatermarkStore
+
+
+class RefreshLease:
+    """The DynamoDB lease a process must hold to crawl the Riot API.
+
+    Refreshes on one host share the watermarks, match cache and refresh checkpoints on its data
+    volume, so the web app's scheduler and the CLI take this lease before crawling and never refresh
+    at the same time.
+    """
+    def __init__(self, db, owner, duration):
+        self.db = db
+        self.owner = owner
+        self.duration = duration
+
+    def acquire(self):
+        """Take or renew the lease; False while another owner holds it."""
+        return self.db.acquire_lease(DynamoDBTables.LeaseTable.REFRESH_LEASE, self.owner, self.duration)
+
+    def release(self):
+        self.db.release_lease(DynamoDBTables.LeaseTable.REFRESH_LEASE, self.owner)
+
+    async def hold_while(self, awaitable):
+        """Await a crawl while renewing the lease in the background."""
+        heartbeat = asyncio.create_task(self._renew())
+        try:
+            return await awaitable
+        finally:
+            heartbeat.cancel()
+
+    async def _renew(self):
+        while True:
+            await asyncio.sleep(self.duration / 3)
+            if not await asyncio.to_thread(self.acquire):
+                print("Lost the refresh lease during a crawl; another worker may start refreshing.")
+
+
+class RefreshScheduler:
+    """Refreshes leaderboards from a background thread instead of inside HTTP requests.
+
+    Refreshes are jobs with an id that can be polled. Asking to refresh a leaderboard that already has
+    a queued or running job returns that job instead of starting another crawl. Besides manual
+    requests, every leaderboard is checked on a cadence: recently active players are refreshed every
+    `interval` seconds, inactive ones `inactive_interval_factor` times less often, and the most
+    recently active players are crawled first.
+
+    Only the holder of the refresh lease (see RefreshLease) crawls the Riot API, so several workers
+    of the web app on one host can run a scheduler each; the others keep their jobs queued until the
+    lease is free. The workers must share one data volume: watermarks and refresh checkpoints are
+    local files, so schedulers on separate hosts would each crawl from their own.
+    """
+    default_interval = 600             # Seconds between refreshes of a recently active player
+    default_lease_duration = 300       # Seconds a lease lasts unless it is renewed
+    inactive_interval_factor = 6       # Inactive players are refreshed this many times less often
+    active_window = 3 * 24 * 60 * 60   # Players who played within this many seconds count as active
+    manual_min_interval = 120          # Manual refreshes skip players checked this recently
+    poll_interval = 30                 # Seconds between checks for due players or a free lease
+    job_ttl = 24 * 60 * 60             # Seconds a job stays pollable
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    MANUAL = "manual"
+    SCHEDULED = "scheduled"
+    BACKFILL = "backfill"  # only the history of players who were just added
+
+    def __init__(self, db, services, interval=None, lease_duration=None, clock=time.time):
+        """`services` maps leaderboard names to their LeaderboardService; it may grow while running."""
+        self.db = db
+        self.services = services
+        self.interval = interval or int(os.getenv("REFRESH_INTERVAL", RefreshScheduler.default_interval))
+        self.lease_duration = lease_duration or int(os.getenv("REFRESH_LEASE_SECONDS", RefreshScheduler.default_lease_duration))
+        self.clock = clock
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease = RefreshLease(db, self.owner, self.lease_duration)
+        self.jobs = {}        # job_id -> job, for jobs created by this process
+        self.queue = deque()  # queued job ids, manual jobs first
+        self.condition = threading.Condition()
+        self.thread = None
+        self.stopped = False
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="refresh-scheduler", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def enqueue(self, leaderboard_name, reason=MANUAL, new_puuids=()):
+        """Queue a refresh of a leaderboard and return the job id.
+
+        `new_puuids` are players who were just added; the job backfills their recent history. Joins the
+        leaderboard's queued or running job, if there is one, except that players can only be added to a
+        job that has not started yet.
+        """
+        with self.condition:
+            for job in self.jobs.values():
+                if job["leaderboard_name"] == leaderboard_name and job["status"] in (RefreshScheduler.QUEUED, RefreshScheduler.RUNNING):
+                    if new_puuids and job["status"] == RefreshScheduler.RUNNING:
+                        continue
+                    if new_puuids:
+                        job["new_puuids"] = list(dict.fromkeys(job["new_puuids"] + list(new_puuids)))
+                    if reason == RefreshScheduler.MANUAL and job["status"] == RefreshScheduler.QUEUED and job["reason"] != reason:
+                        # Somebody is waiting on it now, so it jumps ahead of scheduled refreshes
+                        job["reason"] = reason
+                        self.queue.remove(job["job_id"])
+                        self.queue.appendleft(job["job_id"])
+                    elif reason == RefreshScheduler.BACKFILL and job["reason"] == RefreshScheduler.SCHEDULED:
+                        self.queue.remove(job["job_id"])
+                        self.queue.appendleft(job["job_id"])
+                    return job["job_id"]
+
+            job = {
+                "job_id": uuid.uuid4().hex,
+                "leaderboard_name": leaderboard_name,
+                "reason": reason,
+                "status": RefreshScheduler.QUEUED,
+                "created_at": self.clock(),
+                "started_at": None,
+                "finished_at": None,
+                "players": None,
+                "new_puuids": list(new_puuids),
+                "report": None,
+                "error": None,
+            }
+            self.jobs[job["job_id"]] = job
+            if reason in (RefreshScheduler.MANUAL, RefreshScheduler.BACKFILL):
+                self.queue.appendleft(job["job_id"])
+            else:
+                self.queue.append(job["job_id"])
+            self.condition.notify()
+        self._publish(job)
+        return job["job_id"]
+
+    def get_job(self, job_id):
+        """Return a job by id, asking DynamoDB for jobs created by other workers."""
+        with self.condition:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        return self.db.get_refresh_job(job_id)
+
+    def due_players(self, service, now, min_interval=None):
+        """Return the puuids of a leaderboard's players that are due for a refresh, most recently active first.
+
+        Without `min_interval` a player is due once their activity-based interval has passed since their
+        last check. Players who were never checked come first.
+        """
+        due = []
+        for puuid in service.refresh_roster():
+            watermark = service.watermarks.get(puuid) or {}
+            checked_at = watermark.get(WatermarkStore.CHECKED_AT)
+            last_played = watermark.get(WatermarkStore.END_TIMESTAMP, 0)
+            if min_interval is not None:
+                interval = min_interval
+            elif now - last_played < RefreshScheduler.active_window:
+                interval = self.interval
+            else:
+                interval = self.interval * RefreshScheduler.inactive_interval_factor
+            if checked_at is None or now - checked_at >= interval:
+                due.append((checked_at is not None, -last_played, puuid))
+        return [puuid for _, _, puuid in sorted(due)]
+
+    def _publish(self, job):
+        self.db.put_refresh_job(job, RefreshScheduler.job_ttl)
+
+    def _enqueue_due(self):
+        """Queue a scheduled refresh for every leaderboard with players due."""
+        now = self.clock()
+        for leaderboard_name, service in list(self.services.items()):
+            service.watermarks.reload()
+            if self.due_players(service, now):
+                self.enqueue(leaderboard_name, RefreshScheduler.SCHEDULED)
+
+    def _run(self):
+        next_check = 0
+        while not self.stopped:
+            try:
+                if self.clock() >= next_check:
+                    self._enqueue_due()
+                    next_check = self.clock() + RefreshScheduler.poll_interval
+
+                with self.condition:
+                    if not self.queue:
+                        self.condition.wait(RefreshScheduler.poll_interval)
+                        continue
+
+                if not self.lease.acquire():
+                    # Another worker is crawling; keep the jobs queued until it is done
+                    with self.condition:
+                        self.condition.wait(RefreshScheduler.poll_interval)
+                    continue
+                try:
+                    while not self.stopped:
+                        with self.condition:
+                            if not self.queue:
+                                break
+                            job_id = self.queue.popleft()
+                        self._run_job(self.jobs[job_id])
+                finally:
+                    self.lease.release()
+                self._prune_jobs()
+            except Exception as e:
+                # Keep the scheduler alive; the next poll tries again
+                print(f"An error occurred in the refresh scheduler: {e}")
+                traceback.print_exc()
+                with self.condition:
+                    self.condition.wait(RefreshScheduler.poll_interval)
+
+    def _run_job(self, job):
+        service = self.services[job["leaderboard_name"]]
+        with self.condition:
+            job["status"] = RefreshScheduler.RUNNING
+            job["started_at"] = self.clock()
+        self._publish(job)
+        try:
+            # The previous lease holder may have moved watermarks since they were loaded
+            service.watermarks.reload()
+            new_puuids = job.get("new_puuids", [])
+            if job["reason"] == RefreshScheduler.BACKFILL:
+                puuids = list(new_puuids)
+            else:
+                min_interval = RefreshScheduler.manual_min_interval if job["reason"] == RefreshScheduler.MANUAL else None
+                puuids = self.due_players(service, self.clock(), min_interval)
+            report = asyncio.run(self.lease.hold_while(service.combine_matches(new_puuids, puuids=puuids))) if puuids or new_puuids else None
+            error = report["error"] if report else None
+        except Exception as e:
+            traceback.print_exc()
+            puuids, report, error = None, None, str(e)
+        with self.condition:
+            job["status"] = RefreshScheduler.FAILED if error else RefreshScheduler.SUCCEEDED
+            job["finished_at"] = self.clock()
+            job["players"] = len(puuids) if puuids is not None else None
+            job["report"] = report
+            job["error"] = error
+        self._publish(job)
+
+    def _prune_jobs(self):
+        """Forget finished jobs older than job_ttl; DynamoDB expires its copies on its own."""
+        cutoff = self.clock() - RefreshScheduler.job_ttl
+        with self.condition:
+            for job_id in [job_id for job_id, job in self.jobs.items() if job["finished_at"] and job["finished_at"] < cutoff]:
+                del self.jobs[job_id]
@@ -0,0 +1,120 @@
+import contextlib
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class WatermarkStore:
+    """Per-player refresh watermarks (newest match id, its end time, and when the player was last
+    checked) persisted as JSON, along with the uploaded batch, if any, still waiting to advance them.
+
+    Writes go to a uniquely named temporary file that is fsynced and renamed over the old one, so a
+    crash never leaves a half-written file behind. Every update reloads, changes and saves the file
+    while holding a thread lock and an exclusive flock on `<path>.lock`, so refreshes in other threads
+    or processes sharing the file never overwrite each other's watermarks.
+    """
+    LAST_MATCH_ID = "last_match_id"
+    END_TIMESTAMP = "end_timestamp"
+    CHECKED_AT = "checked_at"
+    PENDING_BATCH = "pending_batch"
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.watermarks = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            # Refuse to guess: an empty watermark would re-count every player's games
+            raise RuntimeError(f"Watermark file {self.path} is corrupt: {e}")
+
+    def _save(self):
+        directory, name = os.path.split(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{name}.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.watermarks, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @contextlib.contextmanager
+    def _update(self):
+        """Reload the watermarks for a read-modify-write, holding the store against other threads and processes."""
+        with self.lock, open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self.reload()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def reload(self):
+        """Pick up watermarks written by other processes since this store was loaded."""
+        self.watermarks = self._load()
+
+    def get(self, puuid):
+        """Return {last_match_id, end_timestamp, checked_at} for a player, or None if they were never refreshed.
+
+        A player who was checked but has no matches yet only has checked_at.
+        """
+        return self.watermarks.get(puuid)
+
+    def pending_batch(self, puuid):
+        """Return the key of the unconfirmed batch holding a player's games, or None."""
+        return (self.watermarks.get(puuid) or {}).get(WatermarkStore.PENDING_BATCH)
+
+    def hold(self, puuids, batch_key):
+        """Mark players as having games in an uploaded batch whose watermarks have not advanced yet.
+
+        Leaderboards share watermarks, so another leaderboard refreshing a held player would crawl
+        the same games from the old watermark and send them to the stats Lambda a second time.
+        """
+        with self._update():
+            puuids = [puuid for puuid in puuids if self.pending_batch(puuid) != batch_key]
+            if not puuids:
+                return
+            for puuid in puuids:
+                self.watermarks.setdefault(puuid, {})[WatermarkStore.PENDING_BATCH] = batch_key
+            self._save()
+
+    def advance(self, updates, checked=(), batch_key=None):
+        """Persist new watermarks for several players in one atomic write.
+
+        Players in `updates` and in `checked` (refreshed, but without new matches) are stamped with the
+        current time as their last check. Players held by `batch_key` are released in the same write.
+        """
+        if not updates and not checked and batch_key is None:
+            return
+        # Other leaderboards' refreshes may have written watermarks since this store was loaded
+        with self._update():
+            if batch_key is not None:
+                for watermark in self.watermarks.values():
+                    if watermark.get(WatermarkStore.PENDING_BATCH) == batch_key:
+                        del watermark[WatermarkStore.PENDING_BATCH]
+            checked_at = int(time.time())
+            for puuid, (last_match_id, end_timestamp) in updates.items():
+                self.watermarks.setdefault(puuid, {}).update({
+                    WatermarkStore.LAST_MATCH_ID: last_match_id,
+                    WatermarkStore.END_TIMESTAMP: end_timestamp,
+                    WatermarkStore.CHECKED_AT: checked_at,
+                })
+            for puuid in checked:
+                self.watermarks.setdefault(puuid, {})[WatermarkStore.CHECKED_AT] = checked_at
+            self._save()
+
+    def remove(self, puuid):
+        with self._update():
+            if self.watermarks.pop(puuid, None) is not None:
+                self._save()
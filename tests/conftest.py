@@ -0,0 +1,36 @@
+import contextlib
+import os
+import sys
+
+import pytest
+
+# Tests import the app's packages the way the app does, from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_aws import BUCKET, create_resources
+
+
+@contextlib.contextmanager
+def fake_aws():
+    """The app's tables and bucket in moto's fake AWS; skips the test when moto is not installed."""
+    mock_aws = pytest.importorskip("moto").mock_aws
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        for name, value in {"AWS_DEFAULT_REGION": "us-east-1", "REGION_NAME": "us-east-1", "AWS_ACCESS_KEY_ID": "testing",
+                            "AWS_SECRET_ACCESS_KEY": "testing", "BUCKET_NAME": BUCKET}.items():
+            monkeypatch.setenv(name, value)
+        with mock_aws():
+            create_resources()
+            yield
+
+
+@pytest.fixture
+def aws():
+    with fake_aws():
+        yield
+
+
+@pytest.fixture(scope="module")
+def module_aws():
+    """Fake AWS shared by every test in a module, e.g. for the Flask app, which connects once on import."""
+    with fake_aws():
+        yield
@@ -0,0 +1,118 @@
+import boto3
+import pytest
+
+from db.db_constants import DynamoDBTables
+
+PLAYERS = 3
+
+
+def seed(leaderboard_name, players):
+    """Put players on a leaderboard; player i has a KDA of i + 1 over two games."""
+    dynamodb = boto3.resource("dynamodb")
+    for i in range(players):
+        dynamodb.Table(DynamoDBTables.PlayersTable.TABLE_NAME).put_item(Item={
+            DynamoDBTables.PlayersTable.LEADERBOARD_NAME: leaderboard_name,
+            DynamoDBTables.PlayersTable.PUUID: f"p{i}",
+            DynamoDBTables.PlayersTable.GAME_NAME: f"player{i}",
+            DynamoDBTables.PlayersTable.TAG_LINE: "NA1",
+        })
+        item = {DynamoDBTables.StatsTable.PUUID: f"p{i}", DynamoDBTables.StatsTable.NUMBER_OF_GAMES: 2,
+                DynamoDBTables.StatsTable.DAMAGE_RECORD: 1000 * (PLAYERS - i)}
+        for metric in DynamoDBTables.StatsTable.AVERAGED_METRICS:
+            item[metric + DynamoDBTables.StatsTable.SUM_SUFFIX] = 2 * (i + 1)
+        dynamodb.Table(DynamoDBTables.StatsTable.TABLE_NAME).put_item(Item=item)
+
+
+@pytest.fixture(scope="module")
+def web(module_aws, tmp_path_factory):
+    """The Flask app, imported once against fake AWS, with its data files in a temporary directory."""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(tmp_path_factory.mktemp("data"))
+        monkeypatch.setenv("RIOT_API_KEY", "test")
+        # The scheduler thread starts on import; let it notice the stop below without a full poll
+        from services.refresh_scheduler import RefreshScheduler
+        monkeypatch.setattr(RefreshScheduler, "poll_interval", 0.05)
+        seed(DynamoDBTables.PlayersTable.DEFAULT_LEADERBOARD, PLAYERS)
+        import app as web
+        # Jobs stay queued, so the tests see them as they were created
+        web.refresh_scheduler.stop()
+        yield web
+
+
+@pytest.fixture
+def client(web):
+    return web.app.test_client()
+
+
+def test_update_queues_a_job_that_can_be_polled(client):
+    response = client.post("/update_leaderboard", data={"leaderboard": "main_table"})
+    assert response.status_code == 302
+    job_id = response.headers["Location"].split("job_id=")[1].split("&")[0]
+
+    job = client.get(f"/jobs/{job_id}").get_json()
+    assert job["job_id"] == job_id
+    assert job["leaderboard_name"] == "main_table"
+    assert job["status"] == "queued"
+    # Asking again joins the same job
+    again = client.post("/update_leaderboard", data={"leaderboard": "main_table"})
+    assert job_id in again.headers["Location"]
+
+
+def test_unknown_job_is_404(client):
+    response = client.get("/jobs/nope")
+    assert response.status_code == 404
+    assert response.get_json() == {"error": "job not found"}
+
+
+def test_api_pages_through_the_ranking(client):
+    page = client.get("/api/leaderboard?metric=kda&limit=2").get_json()
+    assert page["total"] == PLAYERS
+    assert [(p["rank"], p["puuid"]) for p in page["players"]] == [(1, "p2"), (2, "p1")]
+    rest = client.get("/api/leaderboard?metric=kda&offset=2&limit=2").get_json()
+    assert [(p["rank"], p["puuid"]) for p in rest["players"]] == [(3, "p0")]
+
+
+@pytest.mark.parametrize("query", ["limit=0", "limit=100000", "offset=-1", "metric=nope"])
+def test_api_rejects_bad_pages(client, query):
+    response = client.get(f"/api/leaderboard?{query}")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_api_ranks_one_player_on_every_metric(client):
+    player = client.get("/api/leaderboard/players/p0").get_json()
+    assert player["puuid"] == "p0"
+    assert player["ranks"]["kda"] == PLAYERS
+    assert player["ranks"][DynamoDBTables.StatsTable.DAMAGE_RECORD] == 1
+    assert (player["game_name"], player["tag_line"]) == ("player0", "NA1")
+    assert client.get("/api/leaderboard/players/nobody").status_code == 404
+    assert client.get("/api/leaderboard/players/p0?window=nope").status_code == 400
+
+
+def test_pages_are_served_gzipped_with_an_etag(client):
+    response = client.get("/api/leaderboard?metric=kda", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    etag = response.headers["ETag"]
+
+    plain = client.get("/api/leaderboard?metric=kda")
+    assert "Content-Encoding" not in plain.headers
+    assert plain.headers["ETag"] != etag
+    assert plain.get_json()["total"] == PLAYERS
+
+
+def test_current_copy_gets_a_304(client):
+    etag = client.get("/", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+    response = client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": '"stale"'}).status_code == 200
+
+
+@pytest.mark.parametrize("path", ["/", "/api/leaderboard", "/api/leaderboard/players/p0"])
+def test_unknown_leaderboard_is_404(web, client, path):
+    response = client.get(f"{path}?leaderboard=nope")
+    assert response.status_code == 404
+    # No service is kept for a board that was only named in a request
+    assert "nope" not in web.leaderboard_services
@@ -0,0 +1,45 @@
+import asyncio
+
+import boto3
+import pytest
+
+from services.bucket_services import BucketService
+
+
+@pytest.fixture
+def bucket(aws, monkeypatch):
+    # The S3 client is shared by the process; make one inside this test's fake AWS
+    monkeypatch.setattr(BucketService, "_client", None)
+    return BucketService()
+
+
+def test_upload_runs_on_the_pool(bucket, tmp_path):
+    path = tmp_path / "batch.jsonl.gz"
+    path.write_bytes(b"matches")
+    assert asyncio.run(bucket.upload_file_async(str(path), "board/batch.jsonl.gz"))
+    body = boto3.client("s3").get_object(Bucket=bucket.bucket_name, Key="board/batch.jsonl.gz")["Body"].read()
+    assert body == b"matches"
+
+
+def test_put_object(bucket):
+    assert asyncio.run(bucket.put_object_async("board/batch/manifest.json", b"{}"))
+    assert boto3.client("s3").get_object(Bucket=bucket.bucket_name, Key="board/batch/manifest.json")["Body"].read() == b"{}"
+
+
+def test_services_share_one_client(bucket):
+    assert BucketService().s3_client is bucket.s3_client
+
+
+def test_processed_batches_are_the_tagged_ones(bucket, tmp_path):
+    path = tmp_path / "batch.jsonl.gz"
+    path.write_bytes(b"matches")
+    assert not bucket.object_exists("board/batch.jsonl.gz")
+    assert bucket.upload_file(str(path), "board/batch.jsonl.gz")
+    assert asyncio.run(bucket.object_exists_async("board/batch.jsonl.gz"))
+
+    assert not asyncio.run(bucket.is_processed_async("board/batch.jsonl.gz"))
+    boto3.client("s3").put_object_tagging(Bucket=bucket.bucket_name, Key="board/batch.jsonl.gz", Tagging={
+        "TagSet": [{"Key": BucketService.PROCESSED_TAG, "Value": "1"}]
+    })
+    assert bucket.is_processed("board/batch.jsonl.gz")
+    assert not bucket.is_processed("board/missing.jsonl.gz")
@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+from db.db_constants import DynamoDBTables
+from db.dynamo import DynamoClient
+from models.player import Player
+
+
+def put_stats(db, count):
+    with db.stats_table.batch_writer() as batch:
+        for i in range(count):
+            batch.put_item(Item={DynamoDBTables.StatsTable.PUUID: f"p{i}", DynamoDBTables.StatsTable.NUMBER_OF_GAMES: i})
+
+
+def test_stats_are_read_by_key_in_batch_get_chunks(aws):
+    db = DynamoClient()
+    count = DynamoClient.batch_get_limit + 20
+    put_stats(db, count)
+    puuids = [f"p{i}" for i in range(count)] + ["missing"]
+    items = asyncio.run(db.get_player_stats_async(puuids))
+    assert len(items) == count
+    assert {item[DynamoDBTables.StatsTable.PUUID] for item in items} == set(puuids) - {"missing"}
+
+
+def test_players_are_kept_per_leaderboard(aws):
+    db = DynamoClient()
+    db.add_player("board", Player("A", "NA1", "p1"))
+    db.add_player("board", Player("B", "NA1", "p2"))
+    db.add_player("other", Player("A", "NA1", "p1"))
+
+    players = db.get_all_players("board")
+    assert sorted(players) == ["p1", "p2"]
+    assert players["p2"].game_name == "B"
+    assert list(db.get_all_players("other")) == ["p1"]
+    assert sorted(db.get_player_leaderboards("p1")) == ["board", "other"]
+
+
+def test_stats_are_only_deleted_with_the_last_leaderboard(aws):
+    db = DynamoClient()
+    db.add_player("board", Player("A", "NA1", "p1"))
+    db.add_player("other", Player("A", "NA1", "p1"))
+    put_stats(db, 2)
+
+    assert not db.remove_player("board", "p1")
+    assert asyncio.run(db.get_player_stats_async(["p1"]))
+    assert db.remove_player("other", "p1")
+    assert asyncio.run(db.get_player_stats_async(["p1"])) == []
+    assert db.get_all_players("other") == {}
+
+
+def test_async_calls_run_on_the_pool(aws):
+    db = DynamoClient(pool_size=4)
+    count = 2 * DynamoClient.batch_get_limit + 5
+    put_stats(db, count)
+
+    async def run():
+        await db.add_player_async("board", Player("A", "NA1", "p1"))
+        # Every BatchGetItem chunk is in flight at once
+        return await asyncio.gather(db.get_all_players_async("board"), db.get_player_stats_async([f"p{i}" for i in range(count)]))
+
+    players, stats = asyncio.run(run())
+    assert list(players) == ["p1"]
+    assert len(stats) == count
+
+
+def test_a_leaderboard_exists_once_it_has_players(aws):
+    db = DynamoClient()
+    assert not db.leaderboard_exists("board")
+    db.add_player("board", Player("A", "NA1", "p1"))
+    assert db.leaderboard_exists("board")
+    db.remove_player("board", "p1")
+    assert not db.leaderboard_exists("board")
+
+
+def test_processing_status_follows_running_invocations(aws):
+    db = DynamoClient()
+    key = {DynamoDBTables.ProcessingStatusTable.LEADERBOARD_NAME: "board"}
+    assert db.check_processing_status("board") is None
+
+    running = f"{int(time.time())}:request"
+    db.processing_status_table.put_item(Item=dict(key, **{DynamoDBTables.ProcessingStatusTable.IN_FLIGHT: {running}}))
+    assert db.check_processing_status("board") is True
+
+    # An invocation killed before it removed its entry stops counting after the Lambda's maximum timeout
+    killed = f"{int(time.time()) - DynamoDBTables.ProcessingStatusTable.IN_FLIGHT_STALE_AFTER - 1}:killed"
+    db.processing_status_table.put_item(Item=dict(key, **{DynamoDBTables.ProcessingStatusTable.IN_FLIGHT: {killed}}))
+    assert db.check_processing_status("board") is False
+
+    # Rows written by the Lambda before in_flight
+    db.processing_status_table.put_item(Item=dict(key, **{DynamoDBTables.ProcessingStatusTable.PROCESSING: True}))
+    assert db.check_processing_status("board") is True
@@ -0,0 +1,59 @@
+from services.leaderboard_index import LeaderboardIndex
+
+
+def row(puuid, kda, damage):
+    return {"puuid": puuid, "kda": kda, "damage": damage}
+
+
+def make_index(*rows):
+    index = LeaderboardIndex({"kda": "kda", "damage": "damage"})
+    index.sync(rows)
+    return index
+
+
+def test_page_is_ranked_best_first_on_each_metric():
+    index = make_index(row("a", 1.0, 300), row("b", 3.0, 100), row("c", 2.0, 200))
+    assert [r["puuid"] for r in index.page("kda")] == ["b", "c", "a"]
+    assert [r["puuid"] for r in index.page("damage")] == ["a", "c", "b"]
+    assert [r["puuid"] for r in index.page("kda", offset=1, limit=1)] == ["c"]
+
+
+def test_ties_are_broken_by_puuid():
+    index = make_index(row("b", 1.0, 0), row("a", 1.0, 0))
+    assert [r["puuid"] for r in index.page("kda")] == ["a", "b"]
+
+
+def test_rank_is_zero_based_and_none_off_the_leaderboard():
+    index = make_index(row("a", 1.0, 300), row("b", 3.0, 100))
+    assert index.rank("kda", "b") == 0
+    assert index.rank("damage", "b") == 1
+    assert index.rank("kda", "nobody") is None
+
+
+def test_get_returns_a_players_row():
+    index = make_index(row("a", 1.0, 300))
+    assert index.get("a") == row("a", 1.0, 300)
+    assert index.get("nobody") is None
+
+
+def test_sync_only_touches_changed_players():
+    index = make_index(row("a", 1.0, 300), row("b", 3.0, 100))
+    version = index.version
+    assert index.sync([row("a", 1.0, 300), row("b", 3.0, 100)]) == 0
+    assert index.version == version
+
+    # b changes, c joins, a leaves
+    assert index.sync([row("b", 0.5, 100), row("c", 2.0, 50)]) == 3
+    assert len(index) == 2
+    assert [r["puuid"] for r in index.page("kda")] == ["c", "b"]
+    assert index.version > version
+
+
+def test_upsert_moves_a_player_and_remove_drops_them():
+    index = make_index(row("a", 1.0, 300), row("b", 3.0, 100))
+    assert index.upsert(row("a", 5.0, 300))
+    assert index.rank("kda", "a") == 0
+    assert not index.upsert(row("a", 5.0, 300))
+    assert index.remove("a")
+    assert not index.remove("a")
+    assert [r["puuid"] for r in index.page("kda")] == ["b"]
@@ -0,0 +1,153 @@
+import json
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+
+from benchmarks.fake_aws import BUCKET
+from benchmarks.riot_stub import RiotFixtures
+from db.db_constants import DynamoDBTables
+from db.dynamo import DynamoClient
+from services.match_batch import MatchBatchWriter, project_match
+
+KEY = "board/20260101T000000Z-test/00000.jsonl.gz"
+
+
+@pytest.fixture
+def stats_lambda(aws, monkeypatch):
+    """The stats Lambda, with clients made inside this test's fake AWS."""
+    from handlers import process_games_lambda
+    monkeypatch.setattr(process_games_lambda, "s3_client", boto3.client("s3"))
+    monkeypatch.setattr(process_games_lambda, "dynamodb", boto3.client("dynamodb"))
+    monkeypatch.setattr(process_games_lambda, "MAX_WRITE_RETRIES", 2)
+    return process_games_lambda
+
+
+@pytest.fixture
+def fixtures():
+    return RiotFixtures.synthesize(3, 2, seed=0)
+
+
+@pytest.fixture
+def batch(aws, fixtures, tmp_path):
+    """The fixtures' matches uploaded as one batch chunk."""
+    path = str(tmp_path / "chunk.jsonl.gz")
+    with MatchBatchWriter(path) as writer:
+        for match_id, match in fixtures.matches.items():
+            writer.write(project_match(match_id, match, set(fixtures.puuids)))
+    boto3.client("s3").upload_file(path, BUCKET, KEY)
+    return KEY
+
+
+def throttled():
+    return ClientError({"Error": {"Code": "ProvisionedThroughputExceededException", "Message": "slow down"}}, "UpdateItem")
+
+
+def invoke(stats_lambda, key):
+    event = {"Records": [{"s3": {"bucket": {"name": BUCKET}, "object": {"key": key}}}]}
+    return json.loads(stats_lambda.lambda_handler(event, None)["body"])
+
+
+def games_by_puuid(fixtures):
+    """Games per player of the leaderboard; the other participants are not in the batch."""
+    games = {}
+    for match in fixtures.matches.values():
+        for puuid in set(match["metadata"]["participants"]) & set(fixtures.puuids):
+            games[puuid] = games.get(puuid, 0) + 1
+    return games
+
+
+def counted_games():
+    items = boto3.resource("dynamodb").Table(DynamoDBTables.StatsTable.TABLE_NAME).scan()["Items"]
+    return {item[DynamoDBTables.StatsTable.PUUID]: int(item[DynamoDBTables.StatsTable.NUMBER_OF_GAMES]) for item in items}
+
+
+def is_tagged(key):
+    tags = boto3.client("s3").get_object_tagging(Bucket=BUCKET, Key=key)["TagSet"]
+    return any(tag["Key"] == "stats-processed" for tag in tags)
+
+
+def test_batch_is_counted_once(stats_lambda, batch, fixtures):
+    invoke(stats_lambda, batch)
+    assert is_tagged(batch)
+    assert DynamoClient().check_processing_status("board") is False
+    # S3 may deliver the same event twice
+    invoke(stats_lambda, batch)
+    assert counted_games() == games_by_puuid(fixtures)
+
+
+def test_failed_write_leaves_the_batch_unprocessed(stats_lambda, batch, fixtures, monkeypatch):
+    failing = fixtures.puuids[0]
+    write_player_stats = stats_lambda.write_player_stats
+
+    def flaky_write(puuid, chunk_key, totals):
+        if puuid == failing:
+            raise throttled()
+        write_player_stats(puuid, chunk_key, totals)
+    monkeypatch.setattr(stats_lambda, "write_player_stats", flaky_write)
+
+    with pytest.raises(RuntimeError):
+        invoke(stats_lambda, batch)
+    # Untagged, so the uploader keeps its watermarks and the batch is retried
+    assert not is_tagged(batch)
+    assert failing not in counted_games()
+
+
+def test_retried_writes_count_each_game_once(stats_lambda, batch, fixtures, monkeypatch):
+    failing = fixtures.puuids[0]
+    raise_records = stats_lambda.raise_records
+
+    def flaky_raise_records(table_name, key, totals):
+        # Fails after the player's games were added, on every attempt of the first invocation
+        if key["puuid"]["S"] == failing:
+            raise throttled()
+        raise_records(table_name, key, totals)
+    monkeypatch.setattr(stats_lambda, "raise_records", flaky_raise_records)
+    with pytest.raises(RuntimeError):
+        invoke(stats_lambda, batch)
+    assert not is_tagged(batch)
+
+    # S3 retries the invocation: the games added by the first one are not added again
+    monkeypatch.setattr(stats_lambda, "raise_records", raise_records)
+    invoke(stats_lambda, batch)
+    assert is_tagged(batch)
+    assert counted_games() == games_by_puuid(fixtures)
+    item = boto3.resource("dynamodb").Table(DynamoDBTables.StatsTable.TABLE_NAME).get_item(Key={"puuid": failing})["Item"]
+    assert item[DynamoDBTables.StatsTable.DAMAGE_RECORD] > 0
+
+
+def test_untagged_batch_is_retried_without_counting_it_again(stats_lambda, batch, fixtures, monkeypatch):
+    monkeypatch.setattr(stats_lambda, "mark_processed", lambda bucket, key: False)
+    with pytest.raises(RuntimeError):
+        invoke(stats_lambda, batch)
+    monkeypatch.undo()
+    invoke(stats_lambda, batch)
+    assert is_tagged(batch)
+    assert counted_games() == games_by_puuid(fixtures)
+
+
+def test_rows_forget_their_oldest_chunks(stats_lambda, aws, fixtures, tmp_path, monkeypatch):
+    monkeypatch.setattr(stats_lambda, "PROCESSED_CHUNKS_KEPT", 4)
+    match_id, match = next(iter(fixtures.matches.items()))
+    path = str(tmp_path / "chunk.jsonl.gz")
+    with MatchBatchWriter(path) as writer:
+        writer.write(project_match(match_id, match, set(fixtures.puuids)))
+    puuid = next(puuid for puuid in match["metadata"]["participants"] if puuid in fixtures.puuids)
+    keys = [f"board/2026010{day}T000000Z-test/00000.jsonl.gz" for day in range(1, 6)]
+    for key in keys:
+        boto3.client("s3").upload_file(path, BUCKET, key)
+        invoke(stats_lambda, key)
+
+    item = boto3.resource("dynamodb").Table(DynamoDBTables.StatsTable.TABLE_NAME).get_item(Key={"puuid": puuid})["Item"]
+    assert item["processed_chunks"] == set(keys[-2:])
+    assert item[DynamoDBTables.StatsTable.NUMBER_OF_GAMES] == len(keys)
+
+
+def test_invocations_in_flight_are_tracked_separately(stats_lambda, aws):
+    stats_lambda.set_in_flight("board", "1:first", True)
+    stats_lambda.set_in_flight("board", "2:second", True)
+    stats_lambda.set_in_flight("board", "1:first", False)
+    # The second invocation is still running although the first one finished
+    item = boto3.resource("dynamodb").Table(DynamoDBTables.ProcessingStatusTable.TABLE_NAME).get_item(
+        Key={DynamoDBTables.ProcessingStatusTable.LEADERBOARD_NAME: "board"})["Item"]
+    assert item[DynamoDBTables.ProcessingStatusTable.IN_FLIGHT] == {"2:second"}
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+
+from api.rate_limiter import RateLimiter, parse_rate_limit_header
+
+
+class FakeClock:
+    """A clock that only moves when the limiter sleeps, recording every sleep."""
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_limiter(app_limits, safety_margin=0):
+    clock = FakeClock()
+    return RateLimiter(app_limits, clock=clock, sleep=clock.sleep, safety_margin=safety_margin), clock
+
+
+def acquire(limiter, times, method=None):
+    async def run():
+        for _ in range(times):
+            await limiter.acquire(method)
+    asyncio.run(run())
+
+
+def test_parse_rate_limit_header():
+    assert parse_rate_limit_header("20:1,100:120") == [(20, 1), (100, 120)]
+    assert parse_rate_limit_header("") == []
+
+
+def test_requests_within_the_window_do_not_wait():
+    limiter, clock = make_limiter([(3, 1)])
+    acquire(limiter, 3)
+    assert clock.sleeps == []
+    assert limiter.requests_issued == 3
+
+
+def test_request_over_the_window_waits_for_the_oldest_to_expire():
+    limiter, clock = make_limiter([(3, 1)])
+    acquire(limiter, 4)
+    assert clock.sleeps == [1.0]
+    assert limiter.wait_time == 1.0
+
+
+def test_every_window_is_respected():
+    limiter, clock = make_limiter([(2, 1), (3, 10)])
+    acquire(limiter, 4)
+    # The third request waits out the short window, the fourth the long one
+    assert clock.sleeps == [1.0, 9.0]
+
+
+def test_safety_margin_leaves_room_for_other_clients():
+    limiter, clock = make_limiter([(3, 1)], safety_margin=1)
+    acquire(limiter, 3)
+    assert clock.sleeps == [1.0]
+
+
+def test_application_429_blocks_every_method():
+    limiter, clock = make_limiter([(100, 1)])
+    delay = limiter.backoff("match", {"Retry-After": "5", "X-Rate-Limit-Type": "application"})
+    assert delay == 5.0
+    acquire(limiter, 1, method="account")
+    assert clock.sleeps == [5.0]
+
+
+def test_method_429_only_blocks_that_method():
+    limiter, clock = make_limiter([(100, 1)])
+    limiter.backoff("match", {"Retry-After": "5", "X-Rate-Limit-Type": "method"})
+    acquire(limiter, 1, method="account")
+    assert clock.sleeps == []
+    acquire(limiter, 1, method="match")
+    assert clock.sleeps == [5.0]
+
+
+def test_429_without_a_usable_retry_after_backs_off_the_default():
+    limiter, _ = make_limiter([(100, 1)])
+    assert limiter.backoff("match", {}) == RateLimiter.default_retry_after
+    assert limiter.backoff("match", {"Retry-After": "soon"}) == RateLimiter.default_retry_after
+
+
+def test_headers_resize_windows_and_keep_history():
+    limiter, clock = make_limiter([(10, 1)])
+    acquire(limiter, 2)
+    limiter.update_from_headers(None, {"X-App-Rate-Limit": "2:1,50:60"})
+    assert [(w.limit, w.seconds) for w in limiter.app_windows] == [(2, 1), (50, 60)]
+    # The two requests already made count against the new limits
+    acquire(limiter, 1)
+    assert clock.sleeps == [1.0]
+
+
+def test_headers_learn_method_limits():
+    limiter, clock = make_limiter([(100, 1)])
+    limiter.update_from_headers("match", {"X-Method-Rate-Limit": "1:10"})
+    acquire(limiter, 2, method="match")
+    assert clock.sleeps == [10.0]
+
+
+def test_header_counts_catch_up_with_other_clients():
+    limiter, clock = make_limiter([(5, 1)])
+    limiter.update_from_headers(None, {"X-App-Rate-Limit": "5:1", "X-App-Rate-Limit-Count": "5:1"})
+    acquire(limiter, 1)
+    assert clock.sleeps == [1.0]
+
+
+def test_loops_on_several_threads_share_the_windows():
+    # Flask runs each async view on its own event loop, alongside the scheduler's
+    lock = threading.Lock()
+    clock = FakeClock()
+
+    async def sleep(seconds):
+        with lock:
+            clock.now += seconds
+        await asyncio.sleep(0)
+
+    limiter = RateLimiter([(5, 1), (1000, 1000)], clock=clock, sleep=sleep, safety_margin=0)
+
+    def worker():
+        async def run():
+            await asyncio.gather(*(limiter.acquire() for _ in range(5)))
+        asyncio.run(run())
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert limiter.requests_issued == 20
+    # The long window still holds every request; no second of it has more than five
+    times = list(limiter.app_windows[1].timestamps)
+    assert len(times) == 20
+    assert all(sum(start <= t < start + 1 for t in times) <= 5 for start in times)
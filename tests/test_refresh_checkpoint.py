@@ -0,0 +1,51 @@
+import json
+
+from services.refresh_checkpoint import RefreshCheckpoint
+
+
+def match(match_id):
+    return {"matchId": match_id, "gameEndTimestamp": 1, "participants": []}
+
+
+def test_matches_and_batch_survive_a_restart(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    checkpoint = RefreshCheckpoint(str(path))
+    assert not checkpoint
+    checkpoint.add_match(match("NA1_1"))
+    checkpoint.set_batch("board/b/manifest.json", RefreshCheckpoint.UPLOADING, {"p1": ["NA1_1", 1]}, ["p2"],
+                         [{"key": "board/b/00000.jsonl.gz", "path": "chunk"}])
+    checkpoint.close()
+
+    restored = RefreshCheckpoint(str(path))
+    assert list(restored.matches) == ["NA1_1"]
+    assert restored.batch["state"] == RefreshCheckpoint.UPLOADING
+    assert restored.batch["checked"] == ["p2"]
+    assert restored.batch["chunks"] == [{"key": "board/b/00000.jsonl.gz", "path": "chunk"}]
+    assert restored.batch["sent_at"] is None and restored.batch["resends"] == 0
+
+
+def test_a_truncated_last_line_is_dropped(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    checkpoint = RefreshCheckpoint(str(path))
+    checkpoint.add_match(match("NA1_1"))
+    checkpoint.close()
+    # A crash in the middle of writing the second match
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"match": match("NA1_2")})[:20])
+
+    restored = RefreshCheckpoint(str(path))
+    assert list(restored.matches) == ["NA1_1"]
+    # The partial line is cut off, so the next append starts on a line of its own
+    restored.add_match(match("NA1_3"))
+    restored.close()
+    assert list(RefreshCheckpoint(str(path)).matches) == ["NA1_1", "NA1_3"]
+
+
+def test_clear_deletes_the_journal(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    checkpoint = RefreshCheckpoint(str(path))
+    checkpoint.add_match(match("NA1_1"))
+    checkpoint.clear()
+    assert not path.exists()
+    assert not RefreshCheckpoint(str(path))
+    checkpoint.clear()
@@ -0,0 +1,226 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+import boto3
+import pytest
+
+from benchmarks.fake_aws import BUCKET
+from benchmarks.riot_stub import PRODUCTION_APP_LIMITS, RiotFixtures, RiotStubServer
+from db.db_constants import DynamoDBTables
+from models.player import Player
+from services.bucket_services import BucketService
+from services.watermarks import WatermarkStore
+
+LEADERBOARD = "board"
+
+
+@pytest.fixture
+def fixtures():
+    return RiotFixtures.synthesize(5, 4, seed=0)
+
+
+@pytest.fixture
+def service(aws, fixtures, tmp_path, monkeypatch):
+    """A leaderboard of the fixtures' players, refreshed from the stub Riot server, with its files in tmp_path."""
+    from api.riot_api import RiotAPI
+    from db.dynamo import DynamoClient
+    from services.leaderboard_service import LeaderboardService
+
+    monkeypatch.chdir(tmp_path)
+    # The Lambda is invoked by the test, after the refresh, so don't wait for it
+    monkeypatch.setenv("STATS_CONFIRM_TIMEOUT", "0")
+    monkeypatch.setattr(BucketService, "_client", None)
+    with RiotStubServer(fixtures, PRODUCTION_APP_LIMITS) as stub:
+        monkeypatch.setenv("RIOT_BASE_URL", stub.base_url)
+        monkeypatch.setenv("RIOT_API_KEY", "test")
+        db = DynamoClient()
+        for account in fixtures.accounts.values():
+            db.add_player(LEADERBOARD, Player(account["gameName"], account["tagLine"], account["puuid"]))
+        riot_api = RiotAPI()
+        try:
+            yield LeaderboardService(LEADERBOARD, riot_api, db)
+        finally:
+            riot_api.close()
+
+
+@pytest.fixture
+def stats_lambda(aws, monkeypatch):
+    """The stats Lambda, with clients made inside this test's fake AWS."""
+    from handlers import process_games_lambda
+    monkeypatch.setattr(process_games_lambda, "s3_client", boto3.client("s3"))
+    monkeypatch.setattr(process_games_lambda, "dynamodb", boto3.client("dynamodb"))
+    # moto does not isolate concurrent updates of one item, and every chunk adds to the same players' rows
+    monkeypatch.setattr(process_games_lambda, "write_executor", ThreadPoolExecutor(max_workers=1))
+
+    def invoke(keys):
+        event = {"Records": [{"s3": {"bucket": {"name": BUCKET}, "object": {"key": key}}} for key in keys]}
+        return json.loads(process_games_lambda.lambda_handler(event, None)["body"])
+    return invoke
+
+
+def games_by_puuid(fixtures):
+    games = {}
+    for match in fixtures.matches.values():
+        for puuid in match["metadata"]["participants"]:
+            games[puuid] = games.get(puuid, 0) + 1
+    return {puuid: games.get(puuid, 0) for puuid in fixtures.puuids}
+
+
+def checked_puuids(service):
+    """Players whose watermarks have advanced at least once."""
+    return {puuid for puuid, watermark in service.watermarks.watermarks.items() if WatermarkStore.CHECKED_AT in watermark}
+
+
+def counted_games(service):
+    items = asyncio.run(service.db.get_player_stats_async(list(service.db.get_all_players(LEADERBOARD))))
+    return {item[DynamoDBTables.StatsTable.PUUID]: int(item[DynamoDBTables.StatsTable.NUMBER_OF_GAMES]) for item in items}
+
+
+def test_watermarks_advance_only_after_the_lambda_counts_the_batch(service, fixtures, stats_lambda):
+    report = asyncio.run(service.combine_matches())
+    assert report["error"] is None and report["awaiting_stats"]
+    assert checked_puuids(service) == set()
+    assert os.path.exists(service.get_file_path(service.refresh_checkpoint))
+
+    # Until the batch is counted, a refresh fetches nothing new
+    waiting = asyncio.run(service.combine_matches())
+    assert waiting["awaiting_stats"] and waiting["requests_issued"] == 0
+
+    stats_lambda(report["chunk_keys"])
+    settled = asyncio.run(service.combine_matches())
+    assert not settled["awaiting_stats"] and settled["error"] is None
+    assert checked_puuids(service) == set(fixtures.puuids)
+    assert not os.path.exists(service.get_file_path(service.refresh_checkpoint))
+    assert counted_games(service) == {puuid: games for puuid, games in games_by_puuid(fixtures).items() if games}
+
+
+def test_settled_batch_is_on_the_leaderboard_without_waiting_for_its_ttl(service, fixtures, stats_lambda):
+    report = asyncio.run(service.combine_matches())
+    puuid = next(puuid for puuid, games in games_by_puuid(fixtures).items() if games)
+    # The leaderboard is built, and cached, before the Lambda has counted anything
+    assert asyncio.run(service.player_row(puuid)) is None
+
+    stats_lambda(report["chunk_keys"])
+    assert asyncio.run(service.combine_matches())["error"] is None
+    assert asyncio.run(service.player_row(puuid)) is not None
+
+
+def test_failed_upload_resumes_with_the_missing_chunks(service, fixtures, stats_lambda):
+    # One match per chunk
+    service.batch_chunk_bytes = 1
+    upload = service.bucket_service.upload_file_async
+    uploaded = []
+    failed = []
+
+    async def flaky_upload(path, key):
+        uploaded.append(key)
+        if key.endswith("/00001.jsonl.gz") and not failed:
+            failed.append(key)
+            return False
+        return await upload(path, key)
+    service.bucket_service.upload_file_async = flaky_upload
+
+    crashed = asyncio.run(service.combine_matches())
+    assert crashed["error"] and checked_puuids(service) == set()
+    assert len(crashed["chunk_keys"]) == len(fixtures.matches)
+
+    # Chunks already in S3 may have been counted, so only the failed one is sent again
+    uploaded.clear()
+    resumed = asyncio.run(service.combine_matches())
+    assert resumed["error"] is None and resumed["requests_issued"] == 0
+    assert resumed["chunk_keys"] == crashed["chunk_keys"]
+    assert uploaded == [crashed["chunk_keys"][1]]
+    assert boto3.client("s3").get_object(Bucket=BUCKET, Key=resumed["batch_key"])["Body"].read()
+
+    stats_lambda(resumed["chunk_keys"])
+    # A second delivery of the same events counts nothing
+    stats_lambda(resumed["chunk_keys"])
+    asyncio.run(service.combine_matches())
+    assert counted_games(service) == {puuid: games for puuid, games in games_by_puuid(fixtures).items() if games}
+
+
+def test_unconfirmed_chunks_are_resent_then_reported_as_stuck(service, fixtures, stats_lambda):
+    from services.leaderboard_service import refresh_stuck_batches_total
+    service.stats_max_resends = 1
+    upload = service.bucket_service.upload_file_async
+    uploaded = []
+
+    async def counting_upload(path, key):
+        uploaded.append(key)
+        return await upload(path, key)
+    service.bucket_service.upload_file_async = counting_upload
+
+    report = asyncio.run(service.combine_matches())
+    assert report["awaiting_stats"]
+    uploaded.clear()
+    service.stats_resend_interval = 0
+
+    # The Lambda never runs: the chunks are sent once more...
+    resent = asyncio.run(service.combine_matches())
+    assert resent["awaiting_stats"] and resent["requests_issued"] == 0
+    assert uploaded == report["chunk_keys"]
+
+    # ...then the batch is reported as stuck, and keeps its checkpoint and the old watermarks
+    stuck_before = refresh_stuck_batches_total.value(leaderboard=LEADERBOARD)
+    stuck = asyncio.run(service.combine_matches())
+    assert stuck["stats_failed_chunks"] == report["chunk_keys"]
+    assert stuck["awaiting_stats"] and stuck["requests_issued"] == 0
+    assert report["chunk_keys"][0] in stuck["error"]
+    assert refresh_stuck_batches_total.value(leaderboard=LEADERBOARD) == stuck_before + 1
+    assert checked_puuids(service) == set()
+    assert os.path.exists(service.get_file_path(service.refresh_checkpoint))
+
+    # Once the chunks are processed, the next refresh settles the batch
+    stats_lambda(report["chunk_keys"])
+    settled = asyncio.run(service.combine_matches())
+    assert settled["error"] is None and not settled["awaiting_stats"]
+    assert checked_puuids(service) == set(fixtures.puuids)
+    assert counted_games(service) == {puuid: games for puuid, games in games_by_puuid(fixtures).items() if games}
+
+
+def test_shared_player_waits_for_another_leaderboards_batch(service, fixtures, stats_lambda):
+    from services.leaderboard_service import LeaderboardService
+    shared = next(iter(fixtures.accounts.values()))
+    service.db.add_player("other", Player(shared["gameName"], shared["tagLine"], shared["puuid"]))
+    other = LeaderboardService("other", service.riot_api, service.db, match_cache=service.match_cache, watermarks=service.watermarks)
+
+    first = asyncio.run(service.combine_matches())
+    assert first["awaiting_stats"]
+    # The shared player's games are in the first board's unconfirmed batch, so they are not sent again
+    held = asyncio.run(other.combine_matches())
+    assert held["players_held"] == 1 and held["batch_key"] is None
+
+    stats_lambda(first["chunk_keys"])
+    asyncio.run(service.combine_matches())
+    released = asyncio.run(other.combine_matches())
+    assert released["players_held"] == 0 and released["batch_key"] is None
+    assert counted_games(service) == {puuid: games for puuid, games in games_by_puuid(fixtures).items() if games}
+
+
+def test_crawl_keeps_sqlite_and_dynamodb_off_the_event_loop(service, fixtures, monkeypatch):
+    loop_threads = set()
+    blocking_calls = []
+
+    def off_the_loop(name, call):
+        def wrapper(*args, **kwargs):
+            if threading.get_ident() in loop_threads:
+                blocking_calls.append(name)
+            return call(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(service, "refresh_roster", off_the_loop("refresh_roster", service.refresh_roster))
+    monkeypatch.setattr(service.match_cache, "get", off_the_loop("match_cache.get", service.match_cache.get))
+    monkeypatch.setattr(service.match_cache, "put", off_the_loop("match_cache.put", service.match_cache.put))
+
+    async def run():
+        loop_threads.add(threading.get_ident())
+        account = next(iter(fixtures.accounts.values()))
+        await service.register_player(account["gameName"], account["tagLine"])
+        await service.import_players([f"{account['gameName']}#{account['tagLine']}"], backfill=False)
+        return await service.combine_matches()
+
+    assert asyncio.run(run())["error"] is None
+    assert blocking_calls == []
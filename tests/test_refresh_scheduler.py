@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+import pytest
+
+from db.db_constants import DynamoDBTables
+from db.dynamo import DynamoClient
+from main import run_crawl
+from services.refresh_scheduler import RefreshScheduler
+from services.watermarks import WatermarkStore
+
+LEASE = DynamoDBTables.LeaseTable.REFRESH_LEASE
+
+
+class FakeService:
+    """Stands in for a LeaderboardService: a fixed roster and a crawl that only records who it was asked for."""
+    def __init__(self, name, puuids, path):
+        self.leaderboard_name = name
+        self.puuids = puuids
+        self.watermarks = WatermarkStore(str(path))
+        self.crawled = []
+
+    def refresh_roster(self):
+        return dict.fromkeys(self.puuids)
+
+    async def combine_matches(self, new_puuids=(), puuids=None):
+        self.crawled.append(list(puuids))
+        self.watermarks.advance({}, checked=puuids)
+        return {"error": None}
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_lease_is_held_by_one_owner_until_released_or_expired(aws):
+    db = DynamoClient()
+    assert db.acquire_lease(LEASE, "a", 60)
+    assert not db.acquire_lease(LEASE, "b", 60)
+    assert db.acquire_lease(LEASE, "a", 60)  # renewal
+
+    db.release_lease(LEASE, "b")  # not the holder: no effect
+    assert not db.acquire_lease(LEASE, "b", 60)
+    db.release_lease(LEASE, "a")
+    assert db.acquire_lease(LEASE, "b", -5)
+    # b's lease has already expired
+    assert db.acquire_lease(LEASE, "c", 60)
+
+
+def test_requests_for_a_queued_leaderboard_join_its_job(aws, tmp_path):
+    scheduler = RefreshScheduler(DynamoClient(), {"board": FakeService("board", ["p1"], tmp_path / "w.json")})
+    scheduled = scheduler.enqueue("board", RefreshScheduler.SCHEDULED)
+    other = scheduler.enqueue("other", RefreshScheduler.SCHEDULED)
+    assert list(scheduler.queue) == [scheduled, other]
+
+    # A manual request joins the scheduled job and moves it to the front
+    assert scheduler.enqueue("board") == scheduled
+    assert list(scheduler.queue) == [scheduled, other]
+    assert scheduler.get_job(scheduled)["reason"] == RefreshScheduler.MANUAL
+
+
+def test_jobs_of_other_workers_are_read_from_dynamodb(aws, tmp_path):
+    db = DynamoClient()
+    services = {"board": FakeService("board", ["p1"], tmp_path / "w.json")}
+    job_id = RefreshScheduler(db, services).enqueue("board")
+    assert RefreshScheduler(db, services).get_job(job_id)["status"] == RefreshScheduler.QUEUED
+    assert RefreshScheduler(db, services).get_job("missing") is None
+
+
+def test_jobs_wait_while_another_worker_holds_the_lease(aws, tmp_path, monkeypatch):
+    monkeypatch.setattr(RefreshScheduler, "poll_interval", 0.02)
+    db = DynamoClient()
+    service = FakeService("board", ["p1", "p2"], tmp_path / "w.json")
+    scheduler = RefreshScheduler(db, {"board": service})
+    assert db.acquire_lease(LEASE, "another worker", 60)
+    scheduler.start()
+    try:
+        job_id = scheduler.enqueue("board")
+        time.sleep(0.2)
+        assert scheduler.get_job(job_id)["status"] == RefreshScheduler.QUEUED
+        assert service.crawled == []
+
+        db.release_lease(LEASE, "another worker")
+        assert wait_for(lambda: scheduler.get_job(job_id)["status"] == RefreshScheduler.SUCCEEDED)
+        assert sorted(service.crawled[0]) == ["p1", "p2"]
+        # The lease is given back once the queue is empty
+        assert wait_for(lambda: db.acquire_lease(LEASE, "another worker", 60))
+    finally:
+        scheduler.stop()
+
+
+def test_a_failed_crawl_fails_its_job(aws, tmp_path):
+    class FailingService(FakeService):
+        async def combine_matches(self, new_puuids=(), puuids=None):
+            return {"error": "Riot is down"}
+
+    scheduler = RefreshScheduler(DynamoClient(), {"board": FailingService("board", ["p1"], tmp_path / "w.json")})
+    job_id = scheduler.enqueue("board")
+    scheduler._run_job(scheduler.jobs[job_id])
+    job = scheduler.get_job(job_id)
+    assert job["status"] == RefreshScheduler.FAILED
+    assert job["error"] == "Riot is down"
+
+
+def test_cli_crawls_only_while_no_one_else_holds_the_lease(aws, tmp_path):
+    db = DynamoClient()
+    service = FakeService("board", ["p1"], tmp_path / "w.json")
+    service.db = db
+    crawl = lambda: service.combine_matches(puuids=["p1"])
+
+    assert db.acquire_lease(LEASE, "web-worker", 60)
+    assert not asyncio.run(run_crawl(service, crawl))
+    assert service.crawled == []
+
+    db.release_lease(LEASE, "web-worker")
+    assert asyncio.run(run_crawl(service, crawl))
+    assert service.crawled == [["p1"]]
+    # The CLI gives the lease back when it is done
+    assert db.acquire_lease(LEASE, "web-worker", 60)
@@ -0,0 +1,33 @@
+from models.player import Player, normalize_riot_id
+from models.roster import Roster
+
+
+def test_find_ignores_case_and_surrounding_spaces():
+    roster = Roster({"p1": Player("Faker", "KR1", "p1")})
+    assert roster.find(" faker ", "kr1").puuid == "p1"
+    assert roster.find("Faker", "EUW") is None
+    assert normalize_riot_id("Faker", "KR1") == "faker#kr1"
+
+
+def test_renamed_player_is_found_under_the_new_name_only():
+    roster = Roster({"p1": Player("Old", "NA1", "p1")})
+    roster["p1"] = Player("New", "NA1", "p1")
+    assert roster.find("Old", "NA1") is None
+    assert roster.find("New", "NA1").puuid == "p1"
+    assert len(roster.by_riot_id) == 1
+
+
+def test_removals_keep_the_name_index_in_step():
+    roster = Roster([("p1", Player("A", "1", "p1")), ("p2", Player("B", "2", "p2")), ("p3", Player("C", "3", "p3"))])
+    del roster["p1"]
+    assert roster.find("A", "1") is None
+    assert roster.pop("p2").game_name == "B"
+    assert roster.pop("missing", None) is None
+    roster.popitem()
+    assert roster == {} and roster.by_riot_id == {}
+
+    roster.update({"p4": Player("D", "4", "p4")})
+    roster.setdefault("p4", Player("Other", "4", "p4"))
+    assert roster.find("D", "4").puuid == "p4"
+    roster.clear()
+    assert roster.by_riot_id == {}
@@ -0,0 +1,78 @@
+import pytest
+
+from handlers.stats_aggregator import (
+    AVERAGED_STAT_KEYS, DAMAGE_RECORD, PlayerTotals, StatsAggregator, legacy_migration_update, legacy_row_totals,
+)
+
+
+def participant(puuid, damage, kda=2.0, minions=120, time_played=600):
+    return {
+        "puuid": puuid,
+        "totalDamageDealtToChampions": damage,
+        "totalDamageTaken": 1000,
+        "goldEarned": 5000,
+        "totalMinionsKilled": minions,
+        "timePlayed": time_played,
+        "challenges": {"kda": kda, "soloKills": 1},
+    }
+
+
+def test_aggregate_sums_counts_and_maxima_per_player():
+    aggregator = StatsAggregator()
+    aggregator.add_participant(participant("a", 10000, kda=3.0))
+    aggregator.add_participant(participant("b", 5000))
+    aggregator.add_participant(participant("a", 30000, kda=1.0))
+    assert len(aggregator) == 3
+
+    totals = aggregator.aggregate()
+    assert set(totals) == {"a", "b"}
+    a = totals["a"]
+    assert a.number_of_games == 2
+    assert a.sums["totalDamageDealtToChampions"] == 40000
+    assert a.sums["kda"] == 4.0
+    assert a.sums["csPerMin"] == pytest.approx(24.0)
+    assert a.maxes[DAMAGE_RECORD] == 30000
+    assert totals["b"].number_of_games == 1
+
+
+def test_missing_stats_count_as_zero():
+    aggregator = StatsAggregator()
+    aggregator.add_participant({"puuid": "a"})
+    totals = aggregator.aggregate()["a"]
+    assert totals.number_of_games == 1
+    assert all(value == 0 for value in totals.sums.values())
+
+
+def test_aggregate_of_nothing_is_empty():
+    assert StatsAggregator().aggregate() == {}
+
+
+def test_merge_adds_sums_and_keeps_the_best_record():
+    first = PlayerTotals(2, {key: 1.0 for key in AVERAGED_STAT_KEYS}, {DAMAGE_RECORD: 300.0})
+    second = PlayerTotals(1, {key: 2.0 for key in AVERAGED_STAT_KEYS}, {DAMAGE_RECORD: 100.0})
+    merged = first.merge(second)
+    assert merged.number_of_games == 3
+    assert all(value == 3.0 for value in merged.sums.values())
+    assert merged.maxes[DAMAGE_RECORD] == 300.0
+    # Merging leaves both operands untouched
+    assert first.number_of_games == 2 and second.sums["kda"] == 2.0
+
+
+def test_averages_divide_sums_by_games():
+    totals = PlayerTotals(4, {key: 8.0 for key in AVERAGED_STAT_KEYS}, {DAMAGE_RECORD: 50.0})
+    averages = totals.averages()
+    assert averages["kda"] == 2.0
+    assert averages[DAMAGE_RECORD] == 50.0
+    assert PlayerTotals().averages()["kda"] == 0.0
+
+
+def test_legacy_row_is_migrated_to_running_sums():
+    item = {"numberOfGames": {"N": "4"}, "kda": {"N": "2.5"}, DAMAGE_RECORD: {"N": "900"}}
+    totals = legacy_row_totals(item)
+    assert totals.sums["kda"] == 10.0
+    assert totals.maxes[DAMAGE_RECORD] == 900.0
+
+    update = legacy_migration_update(item)
+    assert update["UpdateExpression"].startswith("SET ")
+    assert "numberOfGames = :expectedGames" in update["ConditionExpression"]
+    assert update["ExpressionAttributeValues"][":kdaSum"] == {"N": "10.0"}
@@ -0,0 +1,36 @@
+import os
+import threading
+
+from services.watermarks import WatermarkStore
+
+
+def test_advance_releases_the_players_its_batch_held(tmp_path):
+    store = WatermarkStore(str(tmp_path / "watermarks.json"))
+    store.hold(["p1", "p2"], "board/batch/manifest.json")
+    store.hold(["p3"], "other/batch/manifest.json")
+    assert store.pending_batch("p1") == "board/batch/manifest.json"
+
+    store.advance({"p1": ["m1", 100]}, checked=["p2"], batch_key="board/batch/manifest.json")
+    # Another store on the same file, e.g. in another process
+    reloaded = WatermarkStore(store.path)
+    assert reloaded.pending_batch("p1") is None and reloaded.pending_batch("p2") is None
+    assert reloaded.pending_batch("p3") == "other/batch/manifest.json"
+    assert reloaded.get("p1")[WatermarkStore.LAST_MATCH_ID] == "m1"
+
+
+def test_concurrent_advances_keep_every_watermark(tmp_path):
+    path = str(tmp_path / "watermarks.json")
+    # One store per thread, like refreshes in separate processes sharing the file
+    stores = [WatermarkStore(path) for _ in range(8)]
+
+    def advance(i):
+        for j in range(20):
+            stores[i].advance({f"p{i}-{j}": [f"m{j}", j]})
+
+    threads = [threading.Thread(target=advance, args=(i,)) for i in range(len(stores))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(WatermarkStore(path).watermarks) == 8 * 20
+    assert sorted(os.listdir(tmp_path)) == ["watermarks.json", "watermarks.json.lock"]